@@ -0,0 +1,145 @@
+import numpy as np
+import tensorflow as tf
+import dsn.util.np_moments as npm
+import dsn.util.tf_moments as tfm
+import dsn.util.tf_DMFT_solvers as solvers
+import time
+import sys
+
+# Compares fixed-order and adaptive-order Gauss-Hermite quadrature of the
+# moments used by rank1_input_chaotic_solve at fixed accuracy (the adaptive
+# orders match the fixed order to within tol).  The moments are evaluated at
+# the (mu, delta0, deltainf) iterates of the NumPy solver on the bistable
+# (BI) warm start lattice, g in [0, 5] and Mm, Mn in [-5, 5] with the
+# template's fixed parameters, sampled down to M evaluations.
+#   python adaptive_quadrature_benchmark.py <M> <num_steps> <solve_eps>
+M = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+num_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+solve_eps = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+moments = ["Phi", "Prime", "PrimSq", "IntPrimPrim", "IntPhiPhi"]
+tol = npm.ADAPTIVE_TOL
+
+# record the arguments of every moment evaluation of the solver
+iterates = []
+
+
+def recorded_moments(mu, delta0, deltainf, names, num_pts=50):
+    iterates.append(np.stack((mu, delta0, deltainf), axis=0))
+    return npm.gaussian_moments(mu, delta0, deltainf, names, num_pts=num_pts)
+
+
+solvers.NP_INTEGRALS["recorded"] = recorded_moments
+step = 0.5
+g, Mm, Mn = np.meshgrid(
+    np.arange(0.0, 5.0 + step, step),
+    np.arange(-5.0, 5.0 + step, step),
+    np.arange(-5.0, 5.0 + step, step),
+    indexing="ij",
+)
+g, Mm, Mn = g.flatten(), Mm.flatten(), Mn.flatten()
+m = g.shape[0]
+ones = np.ones((m,))
+fixed = {"MI": 2.0, "Sm": 1.0, "Sn": 1.0, "SmI": 0.0, "SnI": 1.0, "Sperp": 0.0}
+time1 = time.time()
+solvers.rank1_input_chaotic_solve_np(
+    5.0 * ones,
+    5.0 * ones,
+    5.0 * ones,
+    4.0 * ones,
+    g,
+    Mm,
+    Mn,
+    fixed["MI"] * ones,
+    fixed["Sm"] * ones,
+    fixed["Sn"] * ones,
+    fixed["SmI"] * ones,
+    fixed["SnI"] * ones,
+    fixed["Sperp"] * ones,
+    solvers.WS_ITS,
+    solve_eps,
+    integrals="recorded",
+    tol=solvers.WS_TOL,
+)
+iterates = np.concatenate(iterates, axis=1)
+num_evals = iterates.shape[1]
+print(
+    "%d solver moment evaluations for %d lattice points (%.1f s)"
+    % (num_evals, m, time.time() - time1)
+)
+
+np.random.seed(0)
+evals = np.random.choice(num_evals, min(M, num_evals), replace=False)
+_mu, _delta0, _deltainf = iterates[:, evals]
+
+
+def max_rel_error(ys, ys_ref):
+    return np.max(
+        [
+            np.max(np.abs(y - y_ref) / np.maximum(1.0, np.abs(y_ref)))
+            for y, y_ref in zip(ys, ys_ref)
+        ]
+    )
+
+
+def time_np(func, num_pts):
+    ys = func(_mu, _delta0, _deltainf, moments, num_pts)
+    time1 = time.time()
+    for i in range(num_steps):
+        func(_mu, _delta0, _deltainf, moments, num_pts)
+    return ys, (time.time() - time1) / num_steps
+
+
+def time_tf(func, num_pts):
+    tf.reset_default_graph()
+    mu = tf.placeholder(tf.float64, (None,))
+    delta0 = tf.placeholder(tf.float64, (None,))
+    deltainf = tf.placeholder(tf.float64, (None,))
+    ys = func(mu, delta0, deltainf, moments, num_pts)
+    grads = tf.gradients(tf.add_n([tf.reduce_sum(y) for y in ys]), [mu, delta0])
+    feed_dict = {mu: _mu, delta0: _delta0, deltainf: _deltainf}
+    with tf.Session() as sess:
+        _ys, _ = sess.run([ys, grads], feed_dict)
+        time1 = time.time()
+        for i in range(num_steps):
+            sess.run([ys, grads], feed_dict)
+        step_time = (time.time() - time1) / num_steps
+    return _ys, step_time
+
+
+print(
+    "M = %d, delta0 in [%.1E, %.1E], tol = %.0E"
+    % (M, np.min(_delta0), np.max(_delta0), tol)
+)
+print(
+    "%-6s %-8s %12s %12s %10s %12s"
+    % ("lib", "num_pts", "fixed (s)", "adaptive (s)", "speedup", "max error")
+)
+for num_pts in [50, 200]:
+    orders, order_inds = npm.quadrature_orders(
+        iterates[1], num_pts, tol, nested=True
+    )
+    counts = [np.sum(order_inds == k) for k in range(len(orders))]
+    print(
+        "orders %s"
+        % ", ".join(["%d: %d" % (order, count) for order, count in zip(orders, counts)])
+    )
+    print(
+        "%.1f%% of solver evaluations use a reduced order"
+        % (100.0 * np.mean(order_inds < len(orders) - 1))
+    )
+    orders, order_inds = npm.quadrature_orders(_delta0, num_pts, tol, nested=True)
+    for lib, time_fn, module in [("numpy", time_np, npm), ("tf", time_tf, tfm)]:
+        ys, fixed_time = time_fn(module.gaussian_moments, num_pts)
+        ys_ad, adaptive_time = time_fn(module.adaptive_gaussian_moments, num_pts)
+        print(
+            "%-6s %-8d %12.4f %12.4f %10.2f %12.2E"
+            % (
+                lib,
+                num_pts,
+                fixed_time,
+                adaptive_time,
+                fixed_time / adaptive_time,
+                max_rel_error(ys_ad, ys),
+            )
+        )
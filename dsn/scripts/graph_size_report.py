@@ -0,0 +1,66 @@
+import numpy as np
+import tensorflow as tf
+from dsn.util.dsn_util import get_system_from_template
+import dsn.util.tf_graph_util as tf_graph_util
+import sys, os
+
+os.chdir("../")
+
+# Compares the size of the serialized system graph when large arrays are
+# embedded as constants (before) vs. held in graph array variables (after).
+#   python graph_size_report.py [include_LowRankRNN]
+include_LRRNN = len(sys.argv) > 1 and bool(int(sys.argv[1]))
+
+templates = [
+    ("STGCircuit", {"freq": "med"}),
+    ("STGCircuit", {"freq": "high"}),
+    (
+        "SCCircuit",
+        {"behavior_type": "WTA", "p": 0.7, "var": 0.05**2, "inact_str": "NI", "N": 200},
+    ),
+]
+if include_LRRNN:
+    # Builds (or loads) the warm start grid on the first run.
+    templates.append(
+        (
+            "LowRankRNN",
+            {
+                "rank": 1,
+                "input_type": "input",
+                "behavior_type": "BI",
+                "solve_its": 25,
+                "solve_eps": 0.8,
+                "variance": 1.0,
+                "gauss_newton": False,
+            },
+        )
+    )
+
+
+def build_graph_sizes(sysname, param_dict, embed):
+    tf_graph_util.EMBED_GRAPH_ARRAYS = embed
+    np.random.seed(0)
+    system = get_system_from_template(sysname, param_dict)
+    tf.reset_default_graph()
+    Z = tf.placeholder(tf.float64, (1, None, system.D))
+    T_x = system.compute_suff_stats(Z)
+    graph_def_size = tf_graph_util.graph_def_size()
+    meta_size = tf.train.export_meta_graph().ByteSize()
+    return graph_def_size, meta_size
+
+
+print("%-40s %14s %14s %14s %14s" % ("system", "GraphDef", "GraphDef", "meta", "meta"))
+print("%-40s %14s %14s %14s %14s" % ("", "(before)", "(after)", "(before)", "(after)"))
+for sysname, param_dict in templates:
+    gd_before, meta_before = build_graph_sizes(sysname, param_dict, True)
+    gd_after, meta_after = build_graph_sizes(sysname, param_dict, False)
+    label = (
+        sysname
+        + " "
+        + " ".join(["%s=%s" % (k, str(v)) for k, v in param_dict.items()][:2])
+    )
+    print(
+        "%-40s %14d %14d %14d %14d"
+        % (label[:40], gd_before, gd_after, meta_before, meta_after)
+    )
+tf_graph_util.EMBED_GRAPH_ARRAYS = False
@@ -26,12 +26,11 @@ def compute_bistable_mu(Sini, ics_0, ics_1):
     eps = 0.2
 
     ParVec = [Mm, Mn, Mi, Sim, Sin, Sini, Sip]
-    ys0, count = mf.SolveStatic(ics_0, g, ParVec, eps, tol)
-    ys1, count = mf.SolveStatic(ics_1, g, ParVec, eps, tol)
+    ys, count = mf.SolveStaticBatch(
+        np.stack([ics_0, ics_1], axis=0), g, ParVec, eps, tol
+    )
 
-    ss0 = ys0[-1, 2]
-    ss1 = ys1[-1, 2]
-    mu = np.array([ss0, ss1])
+    mu = ys[:, 2]
     return mu
 
 
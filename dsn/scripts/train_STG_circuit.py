@@ -55,4 +55,5 @@ train_dsn(
     check_rate=check_rate,
     dir_str="STGCircuit_test",
     db=False,
+    cache_system_graph=True,
 )
@@ -0,0 +1,39 @@
+import numpy as np
+from dsn.util.systems import LowRankRNN
+from dsn.util.dmft_validation import rank1_params, validate_rank1_dmft, write_summary
+import sys, os
+
+# Validates DMFT solutions at posterior samples of a trained LowRankRNN DSN
+# against finite-size simulations.
+#   python validate_DMFT.py model_dir num_samples Ns [num_procs]
+# e.g. python validate_DMFT.py models/<dsn>/ 20 500,1000,2000,5000 16
+# (the simulation pool spawns processes that import this module)
+if __name__ == "__main__":
+    os.chdir("../")
+
+    model_dir = sys.argv[1]
+    num_samples = int(sys.argv[2])
+    Ns = [int(N) for N in sys.argv[3].split(",")]
+    num_procs = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    # system of train_LowRankRNN.py
+    fixed_params = {}
+    behavior_type = "struct_chaos"
+    means = np.array([0.5, 0.5, 0.5])
+    variances = np.array([0.01, 0.01, 0.01])
+    behavior = {"type": behavior_type, "means": means, "variances": variances}
+    model_opts = {"rank": 1, "input_type": "spont"}
+    system = LowRankRNN(
+        fixed_params, behavior, model_opts=model_opts, solve_its=25, solve_eps=0.5
+    )
+
+    # samples of the last diagnostic check
+    Zs = np.load(model_dir + "opt_info.npz")["Zs"]
+    checks = np.nonzero(np.any(Zs != 0.0, axis=(1, 2)))[0]
+    Z = Zs[checks[-1]]
+    np.random.seed(0)
+    Z = Z[np.random.choice(Z.shape[0], num_samples, replace=False)]
+
+    params = rank1_params(system, Z)
+    results = validate_rank1_dmft(params, Ns, num_reps=2, num_procs=num_procs)
+    write_summary(results, model_dir + "DMFT_validation.txt")
@@ -0,0 +1,82 @@
+import os
+
+# xla='auto' on CPU needs this flag before the first session is created (see
+# session_config), and the None mode runs a session before it.
+xla_flags = os.environ.get("TF_XLA_FLAGS", "")
+if "--tf_xla_cpu_global_jit" not in xla_flags:
+    os.environ["TF_XLA_FLAGS"] = (xla_flags + " --tf_xla_cpu_global_jit").strip()
+
+import numpy as np
+import tensorflow as tf
+from dsn.util.dsn_util import get_system_from_template
+from dsn.util.tf_graph_util import initialize_graph_arrays
+from dsn.util.tf_session_util import xla_suff_stats, session_config
+import time
+import sys
+
+os.chdir("../")
+
+# Times graph construction, the first run (which includes XLA compilation)
+# and the steady-state step time of T(x) and its gradient wrt z for each
+# system and XLA mode.
+#   python xla_benchmark.py <batch_size> <num_steps>
+M = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+num_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+templates = [
+    ("Linear2D", {"omega": 1.0, "d_std": 1.0, "omega_std": 1.0}),
+    ("STGCircuit", {"freq": "med"}),
+    ("V1Circuit", {"behavior_type": "ISN_coeff"}),
+    (
+        "SCCircuit",
+        {"behavior_type": "WTA", "p": 0.7, "var": 0.05**2, "inact_str": "NI", "N": 100},
+    ),
+]
+xla_modes = [None, "auto", "jit_scope", "compile"]
+
+
+def sample_Z(system):
+    if system.density_network_bounds is None:
+        return np.random.normal(0.0, 1.0, (1, M, system.D))
+    a, b = system.density_network_bounds
+    return np.random.uniform(
+        np.maximum(a, -10.0), np.minimum(b, 10.0), (1, M, system.D)
+    )
+
+
+def benchmark(sysname, param_dict, xla):
+    np.random.seed(0)
+    system = get_system_from_template(sysname, param_dict)
+    _Z = sample_Z(system)
+
+    tf.reset_default_graph()
+    time1 = time.time()
+    Z = tf.placeholder(tf.float64, (1, None, system.D))
+    T_x = xla_suff_stats(system, Z, xla)
+    grad_Z = tf.gradients(tf.reduce_sum(T_x), Z)[0]
+    build_time = time.time() - time1
+
+    with tf.Session(config=session_config(xla)) as sess:
+        initialize_graph_arrays(sess)
+        time1 = time.time()
+        sess.run([T_x, grad_Z], {Z: _Z})
+        first_run_time = time.time() - time1
+
+        time1 = time.time()
+        for i in range(num_steps):
+            sess.run([T_x, grad_Z], {Z: _Z})
+        step_time = (time.time() - time1) / num_steps
+    return build_time, first_run_time, step_time
+
+
+print(
+    "%-12s %-10s %12s %12s %12s"
+    % ("system", "xla", "build (s)", "first (s)", "step (s)")
+)
+for sysname, param_dict in templates:
+    for xla in xla_modes:
+        build_time, first_run_time, step_time = benchmark(sysname, param_dict, xla)
+        print(
+            "%-12s %-10s %12.3f %12.3f %12.4f"
+            % (sysname, str(xla), build_time, first_run_time, step_time)
+        )
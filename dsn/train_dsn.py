@@ -29,6 +29,20 @@ from dsn.util.dsn_util import (
     check_convergence,
 )
 from dsn.util.dsn_util import initialize_nf
+from dsn.util.tf_graph_util import (
+    initialize_graph_arrays,
+    cached_suff_stats,
+    save_graph_arrays,
+    GRAPH_ARRAYS_FILE,
+)
+from dsn.util.tf_precision import REDUCE_DTYPE
+from dsn.util.tf_session_util import (
+    xla_suff_stats,
+    session_config,
+    exec_profile_scope,
+    get_exec_profile,
+    autotune_exec_profile,
+)
 from dsn.util.plot_util import make_training_movie
 
 from tf_util.tf_util import density_network, mixture_density_network, log_grads, AL_cost
@@ -52,6 +66,9 @@ def train_dsn(
     savedir=None,
     entropy=True,
     db=False,
+    cache_system_graph=False,
+    xla=None,
+    exec_profile=None,
 ):
     """Trains a degenerate solution network (DSN).
 
@@ -69,8 +86,57 @@ def train_dsn(
             dir_str (str): Save directory name.
             entropy (bool): Include entropy in the cost function.
             db (bool): Record DSN samples on every diagnostic check.
+            cache_system_graph (bool): Import the system subgraph from the on-disk
+                system graph cache (see tf_graph_util.cached_suff_stats).
+            xla (str): XLA compilation of the system subgraph ("jit_scope" or
+                "compile") or auto-clustering of the whole training step ("auto").
+            exec_profile (dict): Thread counts, CPU pinning and autotuning for the
+                training session (see tf_session_util.set_exec_profile).  The
+                previous profile and CPU affinity are restored on return.
 
         """
+    with exec_profile_scope(exec_profile):
+        return _train_dsn(
+            system,
+            arch_dict,
+            n,
+            AL_it_max,
+            c_init_order,
+            AL_fac,
+            min_iters,
+            max_iters,
+            random_seed,
+            lr_order,
+            check_rate,
+            dir_str,
+            savedir,
+            entropy,
+            db,
+            cache_system_graph,
+            xla,
+        )
+
+
+def _train_dsn(
+    system,
+    arch_dict,
+    n,
+    AL_it_max,
+    c_init_order,
+    AL_fac,
+    min_iters,
+    max_iters,
+    random_seed,
+    lr_order,
+    check_rate,
+    dir_str,
+    savedir,
+    entropy,
+    db,
+    cache_system_graph,
+    xla,
+):
+    """train_dsn within its execution profile (see train_dsn)."""
     # set initialization of AL parameter c and learning rate
     lr = 10 ** lr_order
     c_init = 10 ** c_init_order
@@ -131,15 +197,15 @@ def train_dsn(
         support_mapping = None
 
     if mixture:
-        W = tf.placeholder(tf.float64, shape=(None, None, system.D), name="W")
+        W = tf.placeholder(REDUCE_DTYPE, shape=(None, None, system.D), name="W")
         np.random.seed(random_seed)
-        G = tf.placeholder(tf.float64, shape=(None, None, K), name="G")
+        G = tf.placeholder(REDUCE_DTYPE, shape=(None, None, K), name="G")
         # Z, sum_log_det_jacobian, log_base_density, flow_layers, alpha, Mu, Sigma, C = mixture_density_network(
         Z, sum_log_det_jacobian, log_base_density, flow_layers, alpha, C = mixture_density_network(
             G, W, arch_dict, support_mapping, initdirs=initdirs
         )
     else:  # mixture
-        W = tf.placeholder(tf.float64, shape=(1, None, system.D), name="W")
+        W = tf.placeholder(REDUCE_DTYPE, shape=(1, None, system.D), name="W")
         np.random.seed(random_seed)
         Z, sum_log_det_jacobian, flow_layers = density_network(
             W, arch_dict, support_mapping, initdir=initdirs[0]
@@ -197,17 +263,22 @@ def train_dsn(
 
     with tf.name_scope("system"):
         # Compute system-specific sufficient statistics and log base measure on samples.
-        T_x = system.compute_suff_stats(Z)
+        # The system runs in its simulation precision, while T(x) and the
+        # cost stay in REDUCE_DTYPE (see dsn.util.tf_precision).
+        if cache_system_graph:
+            T_x = cached_suff_stats(system, Z, xla=xla)
+        else:
+            T_x = xla_suff_stats(system, Z, xla)
         mu = system.compute_mu()
         T_x_mu_centered = system.center_suff_stats_by_mu(T_x)
         if "bounds" in system.behavior.keys():
-            I_x = system.compute_I_x(Z, T_x)
+            I_x = tf.cast(system.compute_I_x(Z, T_x), REDUCE_DTYPE)
         else:
             I_x = None
 
     # Compute inverse of dgm if known
     print("Getting inverse")
-    Z_input = tf.placeholder(tf.float64, (1, None, system.D))
+    Z_input = tf.placeholder(REDUCE_DTYPE, (1, None, system.D))
     if FIM and not mixture:
         if arch_dict["flow_type"] == "RealNVP":
             print("computing inverse of realNVP")
@@ -219,15 +290,15 @@ def train_dsn(
                 layer_ind -= 1
 
         else:
-            Z_INV = tf.placeholder(tf.float64, (1,))
+            Z_INV = tf.placeholder(REDUCE_DTYPE, (1,))
 
     print("Z_input", Z_input)
     print("Z_inv", Z_INV)
 
     # Declare ugmented Lagrangian optimization hyperparameter placeholders.
     with tf.name_scope("AugLagCoeffs"):
-        Lambda = tf.placeholder(dtype=tf.float64, shape=(system.num_suff_stats,))
-        c = tf.placeholder(dtype=tf.float64, shape=())
+        Lambda = tf.placeholder(dtype=REDUCE_DTYPE, shape=(system.num_suff_stats,))
+        c = tf.placeholder(dtype=REDUCE_DTYPE, shape=())
 
     # Augmented Lagrangian cost function.
     print("Setting up augmented lagrangian gradient graph.")
@@ -264,6 +335,8 @@ def train_dsn(
             )
 
     saver = tf.train.Saver(max_to_keep=MAX_TO_KEEP)
+    # graph arrays are not in the checkpoints (see restore_graph_arrays)
+    save_graph_arrays(savedir + GRAPH_ARRAYS_FILE)
 
     # Tensorboard logging
     summary_writer = tf.summary.FileWriter(savedir)
@@ -272,7 +345,33 @@ def train_dsn(
 
     summary_op = tf.summary.merge_all()
 
-    config = tf.ConfigProto()
+    # Try a few thread pool sizes on the cost gradient and keep the fastest.
+    if get_exec_profile()["autotune"]:
+        print("Autotuning thread pools.")
+        rng_state = np.random.get_state()
+        tune_feed_dict = {
+            W: np.random.normal(np.zeros((1, n, system.D)), 1.0),
+            Lambda: np.zeros((system.num_suff_stats,)),
+            c: c_init,
+        }
+        if batch_norm:
+            for j in range(len(batch_norm_mus)):
+                tune_feed_dict.update({batch_norm_mus[j]: _batch_norm_mus[j]})
+                tune_feed_dict.update({batch_norm_sigmas[j]: _batch_norm_sigmas[j]})
+        if mixture:
+            tune_feed_dict.update({G: np.expand_dims(sample_gumbel(n, K), 0)})
+        tune_init_op = tf.global_variables_initializer()
+
+        def tune_init_fn(sess):
+            sess.run(tune_init_op)
+            initialize_graph_arrays(sess)
+
+        autotune_exec_profile(
+            [cost, cost_grads], tune_feed_dict, init_fn=tune_init_fn, xla=xla
+        )
+        np.random.set_state(rng_state)
+
+    config = session_config(xla)
     # Allow the full trace to be stored at run time.
     run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
 
@@ -341,6 +440,7 @@ def train_dsn(
         print("training DSN for %s" % system.name)
         init_op = tf.global_variables_initializer()
         sess.run(init_op)
+        initialize_graph_arrays(sess)
         summary_writer.add_graph(sess.graph)
 
         # Log initial state of the DSN.
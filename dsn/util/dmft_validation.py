@@ -0,0 +1,332 @@
+# Copyright 2019 Sean Bittner, Columbia University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# ==============================================================================
+import numpy as np
+import multiprocessing
+import os
+from dsn.util.tf_DMFT_solvers import rank1_input_chaotic_solve_np
+from dsn.util.np_lrrnn import (
+    sample_LRRNN,
+    sim_RNN,
+    sim_RNN_batch,
+    blas_threads,
+    rnn_accumulators,
+    measure_accumulated,
+)
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Validation of rank-1 DMFT solutions against finite-size RNN simulations
+# Each parameter vector is solved once with the batched NumPy DMFT solver and
+# simulated at several network sizes N (num_reps networks each) on a process
+# pool.  The error of the simulated statistics is fit as a + b/N.  The pool
+# uses the "spawn" start method, since forking a process that has imported
+# tensorflow (through tf_DMFT_solvers) is not safe.
+
+RANK1_PARAMS = ["g", "Mm", "Mn", "MI", "Sm", "Sn", "SmI", "SnI", "Sperp"]
+# parameters of the no-input network within the input model
+RANK1_DEFAULTS = {"MI": 0.0, "Sn": 1.0, "SmI": 0.0, "SnI": 0.0, "Sperp": 0.0}
+VALIDATION_STATS = ["mu", "kappa", "delta_inf", "delta_T"]
+
+
+def rank1_params(system, Z):
+    """(M, 9) rank-1 network parameters of LowRankRNN samples.
+
+    # Arguments
+        system (obj): Rank-1 LowRankRNN.
+        Z (np.array): (M, D) samples of the free parameters.
+
+    # Returns
+        params (np.array): (M, 9) values of RANK1_PARAMS.
+
+    """
+    M = Z.shape[0]
+    params = np.zeros((M, len(RANK1_PARAMS)))
+    for i, name in enumerate(RANK1_PARAMS):
+        if name in system.free_params:
+            params[:, i] = Z[:, system.free_params.index(name)]
+        elif name in system.fixed_params.keys():
+            params[:, i] = system.fixed_params[name]
+        else:
+            params[:, i] = RANK1_DEFAULTS[name]
+    return params
+
+
+def dmft_rank1(params, num_its=5000, eps=0.2, tol=1e-10):
+    """Batched DMFT statistics of (M, 9) rank-1 network parameters.
+
+    # Returns
+        stats (np.array): (M, 4) values of VALIDATION_STATS.
+
+    """
+    M = params.shape[0]
+    inits = [5.0 * np.ones((M,)), 5.0 * np.ones((M,))]
+    inits += [5.0 * np.ones((M,)), 4.0 * np.ones((M,))]
+    param_list = [params[:, i] for i in range(len(RANK1_PARAMS))]
+    mu, kappa, delta_0, delta_inf = rank1_input_chaotic_solve_np(
+        *(inits + param_list), num_its, eps, tol=tol
+    )
+    return np.stack([mu, kappa, delta_inf, delta_0 - delta_inf], axis=1)
+
+
+def simulate_rank1(args):
+    """Statistics of finite-size networks (a process pool job).
+
+    Each network is W = g*xi + m n^T / N with xi regenerated from its seed
+    (see np_lrrnn.MatrixFreeConnectivity).  Below N = matrix_free_N the
+    networks of the job are held dense and simulated together with
+    sim_RNN_batch, otherwise one at a time without storing W.  Activity
+    starts near the DMFT solution so that the simulation settles on the same
+    branch.
+
+    # Arguments
+        args (tuple): (job, params, dmft_stats, N, seeds, T, t_start, dt,
+                      matrix_free_N, num_threads)
+
+    # Returns
+        job (tuple): Sample, size and (list of) repetition indices.
+        stats (np.array): (len(seeds), 4) simulated values of
+                          VALIDATION_STATS.
+
+    """
+    job, params, dmft_stats, N, seeds, T, t_start, dt = args[:8]
+    matrix_free_N, num_threads = args[8:]
+    net_params = dict(zip(RANK1_PARAMS, params))
+    net_params["nettype"] = "rank1_input"
+    mu, kappa, delta_inf, delta_T = dmft_stats
+
+    nets = []
+    x0s = []
+    for seed in seeds:
+        np.random.seed(seed)
+        net = sample_LRRNN(N, net_params, matrix_free=True, seed=seed)
+        x0 = kappa * net["m"][:, 0] + net["I"][:, 0]
+        x0 = x0 + np.sqrt(max(delta_inf, 0.0)) * np.random.normal(0.0, 1.0, (N,))
+        nets.append(net)
+        x0s.append(x0)
+
+    accumulators = rnn_accumulators()
+    if N < matrix_free_N:
+        g = net_params["g"] * np.ones((len(seeds),))
+        xi = np.stack([net["W"].xi() for net in nets], axis=0)
+        m = np.stack([net["m"] for net in nets], axis=0)
+        n = np.stack([net["n"] for net in nets], axis=0)
+        I = np.stack([net["I"][:, 0] for net in nets], axis=0)
+        sim_RNN_batch(
+            np.stack(x0s, axis=0),
+            g,
+            xi,
+            m,
+            n,
+            I,
+            dt,
+            1.0,
+            T,
+            num_threads=num_threads,
+            accumulators=accumulators,
+            t_start=t_start,
+        )
+        kappa, delta_inf, delta_T = measure_accumulated(accumulators, n)
+        mu = np.mean(accumulators["x"].mean, axis=1)
+        return job, np.stack([mu, kappa[:, 0], delta_inf, delta_T], axis=1)
+
+    stats = []
+    for net, x0 in zip(nets, x0s):
+        accumulators = rnn_accumulators()
+        with blas_threads(num_threads):
+            sim_RNN(
+                x0,
+                net["W"],
+                net["I"][:, 0],
+                dt,
+                1.0,
+                T,
+                accumulators=accumulators,
+                t_start=t_start,
+            )
+        kappa, delta_inf, delta_T = measure_accumulated(accumulators, net["n"])
+        mu = np.mean(accumulators["x"].mean)
+        stats.append([mu, kappa[0], delta_inf, delta_T])
+    return job, np.array(stats)
+
+
+def max_dense_N(num_networks, mem_fraction=0.5):
+    """Largest N whose dense networks fit in the available memory.
+
+    # Arguments
+        num_networks (int): (N,N) float64 arrays held at once.
+        mem_fraction (float): Fraction of the available memory to use.
+
+    # Returns
+        N (int): Network size.
+
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            meminfo = dict([line.split(":") for line in f.read().splitlines()])
+        avail = int(meminfo["MemAvailable"].split()[0]) * 1024
+    except (IOError, KeyError):
+        avail = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    return int(np.sqrt(mem_fraction * avail / (8.0 * num_networks)))
+
+
+def fit_inverse_N(Ns, errs):
+    """Least squares fit of errs = a + b/N.
+
+    # Arguments
+        Ns (list): Network sizes.
+        errs (np.array): (..., len(Ns)) errors.
+
+    # Returns
+        coeffs (np.array): (..., 2) intercepts a and slopes b.
+        r2 (np.array): (...) coefficients of determination.
+
+    """
+    X = np.stack([np.ones((len(Ns),)), 1.0 / np.array(Ns, dtype=np.float64)], 1)
+    y = np.reshape(errs, (-1, len(Ns))).T
+    coeffs = np.linalg.lstsq(X, y, rcond=None)[0]
+    RSS = np.sum(np.square(y - np.dot(X, coeffs)), axis=0)
+    TSS = np.sum(np.square(y - np.mean(y, axis=0)), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = 1.0 - RSS / TSS
+    coeffs = np.reshape(coeffs.T, errs.shape[:-1] + (2,))
+    return coeffs, np.reshape(r2, errs.shape[:-1])
+
+
+def validate_rank1_dmft(
+    params,
+    Ns,
+    num_reps=2,
+    T=2000,
+    t_start=1000,
+    dt=0.1,
+    num_procs=None,
+    matrix_free_N=None,
+    num_threads=None,
+    seed=0,
+):
+    """Compares DMFT solutions with finite-size simulations across a pool.
+
+    # Arguments
+        params (np.array): (M, 9) rank-1 network parameters (see rank1_params).
+        Ns (list): Network sizes.
+        num_reps (int): Networks simulated per parameter vector and size.
+        T (int): Simulation time steps.
+        t_start (int): First time step of the measurements.
+        dt (float): Simulation time step (tau = 1).
+        num_procs (int): Number of processes (defaults to the available CPUs).
+        matrix_free_N (int): Smallest N simulated without storing W.  By
+                             default, the largest N whose dense networks
+                             (num_reps + 1 per process, see max_dense_N)
+                             fit in half of the available memory.
+        num_threads (int): BLAS threads per process (requires threadpoolctl).
+        seed (int): Seed of the network seeds.
+
+    # Returns
+        results (dict): dmft (M,4), sims (M,len(Ns),num_reps,4), errs
+                        (M,len(Ns),4) errors of the mean over reps, and the
+                        a + b/N fits of the mean errors over samples.
+
+    """
+    M = params.shape[0]
+    num_Ns = len(Ns)
+    dmft = dmft_rank1(params)
+
+    rng = np.random.RandomState(seed)
+    seeds = rng.randint(2 ** 31, size=(M, num_Ns, num_reps))
+    if num_procs is None:
+        num_procs = len(os.sched_getaffinity(0))
+    if matrix_free_N is None:
+        matrix_free_N = max_dense_N(min(num_procs, M * num_Ns) * (num_reps + 1))
+    print("Simulating networks of N >= %d matrix-free." % matrix_free_N)
+    # the repetitions of dense networks are simulated together
+    args = []
+    for m in range(M):
+        for j in range(num_Ns):
+            if Ns[j] < matrix_free_N:
+                reps = [list(range(num_reps))]
+            else:
+                reps = [[k] for k in range(num_reps)]
+            for ks in reps:
+                args.append(
+                    (
+                        (m, j, ks),
+                        params[m],
+                        dmft[m],
+                        Ns[j],
+                        seeds[m, j, ks],
+                        T,
+                        t_start,
+                        dt,
+                        matrix_free_N,
+                        num_threads,
+                    )
+                )
+    # largest networks first, so they do not finish last
+    args.sort(key=lambda job_args: -job_args[3])
+
+    sims = np.zeros((M, num_Ns, num_reps, len(VALIDATION_STATS)))
+    num_procs = max(1, min(num_procs, len(args)))
+    if num_procs > 1:
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(num_procs) as pool:
+            for i, (job, stats) in enumerate(pool.imap_unordered(simulate_rank1, args)):
+                sims[job] = stats
+                print("%d/%d sample %d N=%d" % (i + 1, len(args), job[0], Ns[job[1]]))
+    else:
+        for i, job_args in enumerate(args):
+            job, stats = simulate_rank1(job_args)
+            sims[job] = stats
+            print("%d/%d sample %d N=%d" % (i + 1, len(args), job[0], Ns[job[1]]))
+
+    errs = np.abs(np.mean(sims, axis=2) - np.expand_dims(dmft, 1))
+    mean_errs = np.transpose(np.mean(errs, axis=0))
+    fit, r2 = fit_inverse_N(Ns, mean_errs)
+    results = {
+        "params": params,
+        "Ns": np.array(Ns),
+        "dmft": dmft,
+        "sims": sims,
+        "errs": errs,
+        "mean_errs": mean_errs,
+        "fit": fit,
+        "r2": r2,
+    }
+    return results
+
+
+def summary_table(results):
+    """Text table of the mean errors and their a + b/N fits."""
+    Ns = results["Ns"]
+    header = "%-10s" % "stat"
+    header += "".join(["%12s" % ("N=%d" % N) for N in Ns])
+    header += "%12s %12s %8s" % ("a", "b", "r2")
+    lines = [header]
+    for i, stat in enumerate(VALIDATION_STATS):
+        line = "%-10s" % stat
+        line += "".join(["%12.4g" % err for err in results["mean_errs"][i]])
+        a, b = results["fit"][i]
+        line += "%12.4g %12.4g %8.3f" % (a, b, results["r2"][i])
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def write_summary(results, fname):
+    """Writes the summary table to fname and the results to fname.npz."""
+    table = summary_table(results)
+    with open(fname, "w") as f:
+        f.write(table)
+    np.savez(fname + ".npz", **results)
+    print(table)
+    return table
@@ -14,6 +14,8 @@ from tf_util.tf_util import (
 )
 import scipy.linalg
 from dsn.util.systems import Linear2D, V1Circuit, SCCircuit, STGCircuit, LowRankRNN
+from dsn.util.tf_graph_util import initialize_graph_arrays, cached_suff_stats
+from dsn.util.tf_session_util import xla_suff_stats, session_config
 from tf_util.stat_util import approx_equal
 from tf_util.families import family_from_str
 from efn.train_nf import train_nf
@@ -654,19 +656,68 @@ def get_grid_search_bounds(system):
     return Z_a, Z_b, T_x_a, T_x_b
 
 
-def grid_search(system, n=10000, Z=None, T_x=None):
+def build_suff_stats(system, Z, cache=False, xla=None):
+    """Builds the system sufficient statistics graph on Z.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        Z (tf.tensor): [1, M, D] system parameter samples.
+        cache (bool): Import the system subgraph from the on-disk cache.
+        xla (str): XLA mode (see tf_session_util.XLA_MODES).
+
+    # Returns
+        T_x (tf.tensor): Sufficient statistics of samples.
+
+    """
+    if cache:
+        return cached_suff_stats(system, Z, xla=xla)
+    else:
+        return xla_suff_stats(system, Z, xla)
+
+
+def run_suff_stats(system, _Z, Z=None, T_x=None, cache=False, xla=None, backend="tf"):
+    """Evaluates the sufficient statistics of parameter samples.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        _Z (np.array): (1, M, D) system parameter samples.
+        Z (tf.tensor): (1, M, D) system parameter placeholder (built if None).
+        T_x (tf.tensor): Sufficient statistics of Z (built if None).
+        cache (bool): Import the system subgraph from the on-disk cache.
+        xla (str): XLA mode (see tf_session_util.XLA_MODES).
+        backend (str): "tf" runs the system graph in a session, and "np" the
+                       NumPy reference system.compute_suff_stats_np without
+                       building a graph.
+
+    # Returns
+        _T_x (np.array): (1, M, num_suff_stats) sufficient statistics.
+
+    """
+    if backend == "np":
+        return np.expand_dims(system.compute_suff_stats_np(_Z[0]), 0)
+    elif backend != "tf":
+        print('Error: backend must be "tf" or "np".')
+        raise NotImplementedError
+
     if Z is None and T_x is None:
         Z = tf.placeholder(tf.float64, (1, None, system.D))
-        T_x = system.compute_suff_stats(Z)
+        T_x = build_suff_stats(system, Z, cache, xla)
+    with tf.Session(config=session_config(xla)) as sess:
+        initialize_graph_arrays(sess)
+        _T_x = sess.run(T_x, {Z: _Z})
+    return _T_x
 
+
+def grid_search(
+    system, n=10000, Z=None, T_x=None, cache=False, xla=None, backend="tf"
+):
     # get bounds
     Z_a, Z_b, T_x_a, T_x_b = get_grid_search_bounds(system)
     _Z = np.zeros((1, n, system.D))
     for i in range(system.D):
         _Z[0, :, i] = np.random.uniform(Z_a[i], Z_b[i], (n,))
 
-    with tf.Session() as sess:
-        _T_x = sess.run(T_x, {Z: _Z})
+    _T_x = run_suff_stats(system, _Z, Z, T_x, cache, xla, backend)
     inds = []
     for j in range(system.num_suff_stats):
         inds_j = np.logical_and(T_x_a[j] <= _T_x[0, :, j], _T_x[0, :, j] <= T_x_b[j])
@@ -678,12 +729,19 @@ def grid_search(system, n=10000, Z=None, T_x=None):
     return Z_thresh, mu, Sigma
 
 
-def abc_sample(system, n=10000, sigma=1.0, inds=None, Z=None, T_x=None):
+def abc_sample(
+    system,
+    n=10000,
+    sigma=1.0,
+    inds=None,
+    Z=None,
+    T_x=None,
+    cache=False,
+    xla=None,
+    backend="tf",
+):
     if inds is None:
         inds = np.array(system.num_suff_stats * [True])
-    if Z is None and T_x is None:
-        Z = tf.placeholder(tf.float64, (1, None, system.D))
-        T_x = system.compute_suff_stats(Z)
 
     # get bounds
     Z_a, Z_b = system.density_network_bounds
@@ -692,8 +750,7 @@ def abc_sample(system, n=10000, sigma=1.0, inds=None, Z=None, T_x=None):
     for i in range(system.D):
         _Z[0, :, i] = np.random.uniform(Z_a[i], Z_b[i], (n,))
 
-    with tf.Session() as sess:
-        _T_x = sess.run(T_x, {Z: _Z})
+    _T_x = run_suff_stats(system, _Z, Z, T_x, cache, xla, backend)
 
     u = np.sqrt(np.sum(np.square(_T_x[:, :, inds] - mu[:, :, inds]), axis=2))[0]
     k_u = np.exp(-0.5 * u ** 2 / (2.0 * sigma ** 2)) / np.sqrt(2.0 * np.pi)
@@ -755,7 +812,7 @@ def load_DSNs(model_dirs, load_its):
         model_dir = model_dirs[i]
         load_it = load_its[i]
 
-        sess = tf.Session()
+        sess = tf.Session(config=session_config())
         if i == 0:
             load_time1 = time.time()
         collection, has_Z_inv, has_Z_input = load_dgm(sess, model_dir, load_it)
@@ -1241,30 +1298,300 @@ def get_perturb_bounds(system, v, z0):
     return -alpha, alpha
 
 
-def get_perturbs(system, V, z0, n, d, Z=None, T_x=None):
+def get_perturbs(
+    system, V, z0, n, d, Z=None, T_x=None, cache=False, xla=None, backend="tf"
+):
+    """Evaluates T_x along the lines z0 + delta*V[:,j], delta in [-d, d].
+
+    See continuation_perturbs for solving the lines by continuation.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        V (np.array): (D, num_vs) perturbation directions.
+        z0 (np.array): (1, 1, D) center of the lines.
+        n (int): Number of points per line.
+        d (float): Half length of the lines.
+        Z (tf.tensor): [1, M, D] system parameter placeholder (built if None).
+        T_x (tf.tensor): Sufficient statistics of Z (built if None).
+        cache (bool): Import the system subgraph from the on-disk cache.
+        xla (str): XLA mode (see tf_session_util.XLA_MODES).
+        backend (str): "tf" or "np" (see run_suff_stats).
+
+    # Returns
+        T_x_perturbs (np.array): (num_vs, n, num_suff_stats) T_x on the lines.
+        delta_perturbs (np.array): (num_vs, n) line coordinates.
+        Z_perturbs (np.array): (num_vs, n, D) parameters on the lines.
+
+    """
     num_vs = V.shape[1]
-    if Z is None and T_x is None:
+    if backend == "tf" and Z is None and T_x is None:
         Z = tf.placeholder(tf.float64, (1, None, system.D))
         print("creating graph")
-        T_x = system.compute_suff_stats(Z)
+        T_x = build_suff_stats(system, Z, cache, xla)
         print("graph ready")
 
-    Z_perturbs = np.zeros((num_vs, n, system.D))
-    delta_perturbs = np.zeros((num_vs, n))
+    delta_perturbs, Z_perturbs = perturb_lines(V, z0, n, d)
     T_x_perturbs = np.zeros((num_vs, n, system.num_suff_stats))
-    with tf.Session() as sess:
+    if backend == "np":
         for j in range(num_vs):
-            v = V[:, j]
+            T_x_perturbs[j] = system.compute_suff_stats_np(Z_perturbs[j])
+        return T_x_perturbs, delta_perturbs, Z_perturbs
 
-            delta = np.linspace(-d, d, n)
-            for i in range(system.D):
-                Z_perturbs[j, :, i] = delta * v[i] + z0[0, 0, i]
+    with tf.Session(config=session_config(xla)) as sess:
+        initialize_graph_arrays(sess)
+        for j in range(num_vs):
             T_x_perturbs[j] = sess.run(T_x, {Z: np.expand_dims(Z_perturbs[j, :, :], 0)})
-            delta_perturbs[j] = delta
 
     return T_x_perturbs, delta_perturbs, Z_perturbs
 
 
+def perturb_lines(V, z0, n, d):
+    """Points of the lines z0 + delta*V[:,j], delta in [-d, d].
+
+    # Arguments
+        V (np.array): (D, num_vs) perturbation directions.
+        z0 (np.array): (1, 1, D) center of the lines.
+        n (int): Number of points per line.
+        d (float): Half length of the lines.
+
+    # Returns
+        delta_perturbs (np.array): (num_vs, n) line coordinates.
+        Z_perturbs (np.array): (num_vs, n, D) parameters on the lines.
+
+    """
+    D, num_vs = V.shape
+    Z_perturbs = np.zeros((num_vs, n, D))
+    delta_perturbs = np.zeros((num_vs, n))
+    delta = np.linspace(-d, d, n)
+    for j in range(num_vs):
+        v = V[:, j]
+        for i in range(D):
+            Z_perturbs[j, :, i] = delta * v[i] + z0[0, 0, i]
+        delta_perturbs[j] = delta
+    return delta_perturbs, Z_perturbs
+
+
+def solver_state_tangents(system, Z):
+    """Directional derivatives of the solver solutions of a system graph.
+
+    The Jacobian-vector products are taken with the double gradient trick,
+    and are zero for solutions without a gradient path to Z.  Solver states
+    may also hold an (M,) "residual" tensor of the consistency equations.
+
+    # Arguments
+        system (obj): System with solver_states, built on Z.
+        Z (tf.tensor): [1, M, D] system parameter samples.
+
+    # Returns
+        V (tf.tensor): [1, M, D] direction placeholder.
+        states (list): (init, solution, tangent, residual) tf.tensors of each
+                       solver (residual is None if the state has none).
+
+    """
+    V = tf.placeholder(Z.dtype, Z.shape)
+    states = []
+    for name in sorted(system.solver_states.keys()):
+        init = system.solver_states[name]["init"]
+        x = system.solver_states[name]["solution"]
+        u = tf.zeros_like(x)
+        vjp = tf.gradients(x, Z, grad_ys=u)[0]
+        tangent = None
+        if vjp is not None:
+            tangent = tf.gradients(vjp, u, grad_ys=V)[0]
+        if tangent is None:
+            tangent = tf.zeros_like(x)
+        residual = system.solver_states[name].get("residual", None)
+        states.append((init, x, tangent, residual))
+    return V, states
+
+
+def continuation_perturbs(
+    system,
+    V,
+    z0,
+    n,
+    d,
+    Z=None,
+    T_x=None,
+    xla=None,
+    jump_tol=0.1,
+    max_halvings=4,
+    residual_tol=1e-6,
+):
+    """Evaluates T_x along the lines z0 + delta*V[:,j] by continuation.
+
+    The points of each line are solved in order, each solve initialized at
+    the previous solution plus a tangent predictor (the directional
+    derivative of the solver solutions along the line, exact with
+    model_opts["implicit_grad"]).  A step whose corrected solution jumps more
+    than jump_tol (relative) from the prediction is halved, and if it still
+    jumps after max_halvings halvings, the solution branch ended at a fold
+    and the line continues on the branch it jumped to.  Solver states with a
+    residual (see solver_state_tangents) also halve steps whose solve did not
+    converge to residual_tol, and a fold whose last solve did not converge
+    is solved again from the default inits.  Continuation needs the systems'
+    solver_states (see LowRankRNN.cached_solver_inits), so it builds the
+    uncached graph.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        V (np.array): (D, num_vs) perturbation directions.
+        z0 (np.array): (1, 1, D) center of the lines.
+        n (int): Number of points per line.
+        d (float): Half length of the lines.
+        Z (tf.tensor): [1, M, D] system parameter placeholder (built if None).
+        T_x (tf.tensor): Sufficient statistics of Z (built if None).
+        xla (str): XLA mode (see tf_session_util.XLA_MODES).
+        jump_tol (float): Largest relative corrector jump of a step.
+        max_halvings (int): Step halvings before declaring a fold.
+        residual_tol (float): Largest residual of a converged solve.
+
+    # Returns
+        T_x_perturbs (np.array): (num_vs, n, num_suff_stats) T_x on the lines.
+        delta_perturbs (np.array): (num_vs, n) line coordinates.
+        Z_perturbs (np.array): (num_vs, n, D) parameters on the lines.
+        folds (np.array): (num_vs, n) fold before each point.
+        num_solves (np.array): (num_vs, n) solves per point.
+
+    """
+    if Z is None and T_x is None:
+        Z = tf.placeholder(tf.float64, (1, None, system.D))
+        print("creating graph")
+        T_x = build_suff_stats(system, Z, False, xla)
+        print("graph ready")
+    V_tangent, states = solver_state_tangents(system, Z)
+    delta_perturbs, Z_perturbs = perturb_lines(V, z0, n, d)
+
+    with tf.Session(config=session_config(xla)) as sess:
+        initialize_graph_arrays(sess)
+        T_x_perturbs, folds, num_solves = continuation_solve(
+            sess,
+            Z,
+            T_x,
+            V_tangent,
+            states,
+            V,
+            z0,
+            delta_perturbs[0],
+            jump_tol,
+            max_halvings,
+            residual_tol,
+        )
+    return T_x_perturbs, delta_perturbs, Z_perturbs, folds, num_solves
+
+
+def continuation_solve(
+    sess,
+    Z,
+    T_x,
+    V_tangent,
+    states,
+    V,
+    z0,
+    delta,
+    jump_tol=0.1,
+    max_halvings=4,
+    residual_tol=1e-6,
+):
+    """Solves the lines z0 + delta*V[:,j] by natural-parameter continuation.
+
+    All lines step together, each with its own step size.  Solver states
+    are handled as (C, num_vs, d) arrays, where the C blocks of M solver
+    rows are the conditions tiled by the system.
+
+    # Arguments
+        sess (tf.Session): Session with initialized graph arrays.
+        Z (tf.tensor): [1, M, D] system parameter placeholder.
+        T_x (tf.tensor): Sufficient statistics of Z.
+        V_tangent (tf.tensor): Direction placeholder of the tangents.
+        states (list): see solver_state_tangents.
+        V (np.array): (D, num_vs) perturbation directions.
+        z0 (np.array): (1, 1, D) center of the lines.
+        delta (np.array): (n,) increasing line coordinates.
+        jump_tol (float): Largest relative corrector jump of a step.
+        max_halvings (int): Step halvings before declaring a fold.
+        residual_tol (float): Largest residual of a converged solve.
+
+    # Returns
+        T_x_perturbs (np.array): (num_vs, n, num_suff_stats) T_x on the lines.
+        folds (np.array): (num_vs, n) fold before each point.
+        num_solves (np.array): (num_vs, n) solves per point.
+
+    """
+    num_vs = V.shape[1]
+    n = delta.shape[0]
+
+    def solve(inds, s, x_inits=None):
+        v = V[:, inds].T
+        _Z = z0[0] + np.expand_dims(s, 1) * v
+        feed_dict = {Z: np.expand_dims(_Z, 0), V_tangent: np.expand_dims(v, 0)}
+        if x_inits is not None:
+            for state, x_init in zip(states, x_inits):
+                feed_dict[state[0]] = np.reshape(x_init, (-1, x_init.shape[2]))
+        fetches = [T_x, [state[1] for state in states], [state[2] for state in states]]
+        fetches.append([state[3] for state in states if state[3] is not None])
+        _T_x, xs, tangents, residuals = sess.run(fetches, feed_dict)
+        xs = [np.reshape(x, (-1, len(inds), x.shape[1])) for x in xs]
+        tangents = [np.reshape(t, x.shape) for t, x in zip(tangents, xs)]
+        # largest residual of each line
+        residual = np.zeros((len(inds),))
+        for r in residuals:
+            residual = np.maximum(residual, np.max(np.reshape(r, (-1, len(inds))), 0))
+        return _T_x[0], xs, tangents, residual
+
+    inds = np.arange(num_vs)
+    s = delta[0] * np.ones((num_vs,))
+    _T_x, xs, tangents, _ = solve(inds, s)
+    T_x_perturbs = np.zeros((num_vs, n, _T_x.shape[1]))
+    T_x_perturbs[:, 0] = _T_x
+    folds = np.zeros((num_vs, n), dtype=bool)
+    num_solves = np.zeros((num_vs, n), dtype=np.int64)
+    num_solves[:, 0] = 1
+
+    for i in range(1, n):
+        h_max = delta[i] - delta[i - 1]
+        h_min = h_max / 2 ** max_halvings
+        h = h_max * np.ones((num_vs,))
+        active = inds
+        while active.size > 0:
+            s_try = np.minimum(s[active] + h[active], delta[i])
+            ds = np.expand_dims(np.expand_dims(s_try - s[active], 0), 2)
+            x_preds = [x[:, active] + ds * t[:, active] for x, t in zip(xs, tangents)]
+            _T_x, xs_try, tangents_try, residual = solve(active, s_try, x_preds)
+            num_solves[active, i] += 1
+            converged = residual < residual_tol
+
+            # relative jump of the corrector from the predictor
+            jump = np.zeros((active.size,))
+            for x_pred, x_try in zip(x_preds, xs_try):
+                rel_diff = np.abs(x_try - x_pred) / (1.0 + np.abs(x_pred))
+                jump = np.maximum(jump, np.max(rel_diff, axis=(0, 2)))
+            accept = np.logical_and(jump < jump_tol, converged)
+            fold = np.logical_and(~accept, h[active] <= h_min)
+            folds[active[fold], i] = True
+            # a branch that ended without the solve converging on another one
+            restart = np.logical_and(fold, ~converged)
+            if np.any(restart):
+                _T_x_r, xs_r, tangents_r, _ = solve(active[restart], s_try[restart])
+                num_solves[active[restart], i] += 1
+                _T_x[restart] = _T_x_r
+                for x_try, x_r in zip(xs_try + tangents_try, xs_r + tangents_r):
+                    x_try[:, restart] = x_r
+            accept = np.logical_or(accept, fold)
+
+            acc = active[accept]
+            s[acc] = s_try[accept]
+            for x, x_try, t, t_try in zip(xs, xs_try, tangents, tangents_try):
+                x[:, acc] = x_try[:, accept]
+                t[:, acc] = t_try[:, accept]
+            T_x_perturbs[acc, i] = _T_x[accept]
+            h[acc] = np.minimum(2.0 * h[acc], h_max)
+            h[active[~accept]] /= 2.0
+            active = active[s[active] < delta[i]]
+
+    return T_x_perturbs, folds, num_solves
+
+
 def compute_r2(y, X, beta):
     y_mean = np.mean(y)
     TSS = np.sum(np.square(y - y_mean))
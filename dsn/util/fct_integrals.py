@@ -1,6 +1,7 @@
 # Francesca Mastrogiuseppe 2018
 
 import numpy as np
+from dsn.util.gauss_quadrature import gauss_hermite
 
 #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
 #### Computing Gaussian integrals through Gauss-Hermite quadrature
@@ -10,10 +11,8 @@ import numpy as np
 
 
 def get_quadrature(num_pts):
-    gaussian_norm = 1 / np.sqrt(np.pi)
-    gauss_points, gauss_weights = np.polynomial.hermite.hermgauss(num_pts)
-    gauss_points = gauss_points * np.sqrt(2)
-    return gaussian_norm, gauss_points, gauss_weights
+    gaussian_norm, gauss_points, gauss_weights = gauss_hermite(num_pts)
+    return gaussian_norm, gauss_points[0], gauss_weights
 
 
 #### Single Gaussian intergrals
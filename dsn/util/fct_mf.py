@@ -135,3 +135,284 @@ def SolveStatic2(
 
     ys = np.array(ys)
     return ys, count
+
+
+### Batched versions of the iterations above, over [M] parameter sets
+
+
+def static_integrals(mu, delta0, num_pts=200):
+    # Phi, PhiSq and Prime of (M,) arrays from a single tanh evaluation
+    gaussian_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    x = np.expand_dims(mu, 1) + np.sqrt(np.expand_dims(delta0, 1)) * gauss_points
+    tanh_x = np.tanh(x)
+    tanh_x_sq = tanh_x ** 2
+    phi = gaussian_norm * np.dot(tanh_x, gauss_weights)
+    phi_sq = gaussian_norm * np.dot(tanh_x_sq, gauss_weights)
+    prime = gaussian_norm * np.dot(1 - tanh_x_sq, gauss_weights)
+    return phi, phi_sq, prime
+
+
+def SolveStaticBatch(
+    y0,
+    g,
+    VecPar,
+    eps,
+    tolerance=1e-10,
+    backwards=1,
+    max_its=None,
+    history=False,
+    num_pts=200,
+):
+    """Solves SolveStatic for M parameter sets at once.
+
+    Every row runs the iteration and stopping rules of SolveStatic, and rows
+    leave the iteration as soon as they stop.  Parameters may be scalars or
+    (M,) arrays.
+
+    # Arguments
+        y0 (np.array): (3,) or (M, 3) initial [mu, delta0, K].
+        g (float or np.array): Random connectivity strength.
+        VecPar (list): [Mm, Mn, Mi, Sim, Sin, Sini, Sip].
+        eps (float): Step size.
+        tolerance (float): Convergence tolerance.
+        backwards (int or np.array): -1 to iterate towards unstable solutions.
+        max_its (int): Maximum number of steps per row (None for no limit).
+        history (bool): Also return the iterates of every row.
+        num_pts (int): Number of Gauss-Hermite quadrature points.
+
+    # Returns
+        y (np.array): (M, 3) last iterate of each row (ys[-1] of SolveStatic).
+        count (np.array): (M,) count of SolveStatic for each row.
+        ys (np.array): (M, 3, T) iterates, padded with the last (if history).
+
+    """
+    Mm, Mn, Mi, Sim, Sin, Sini, Sip = VecPar
+    y0 = np.array(y0, dtype=np.float64)
+    M = np.broadcast(y0[..., 0], g, backwards, *VecPar).shape
+    M = M[0] if len(M) > 0 else 1
+    params = [g, backwards, Mm, Mn, Mi, Sim, Sin, Sini, Sip]
+    g, backwards, Mm, Mn, Mi, Sim, Sin, Sini, Sip = [
+        np.broadcast_to(np.array(param, dtype=np.float64), (M,)) for param in params
+    ]
+    Sii = np.sqrt((Sini / Sin) ** 2 + Sip ** 2)
+
+    y = np.array(np.broadcast_to(y0, (M, 3)))
+    count = np.ones((M,), dtype=np.int64)
+    active = np.arange(M)
+    ys = [y.copy()]
+    i = 0
+    while active.size > 0 and (max_its is None or i < max_its):
+        y_a = y[active]
+        a = active
+
+        # Take a step
+        mu = Mm[a] * y_a[:, 2] + Mi[a]
+        phi, phi_sq, prime = static_integrals(mu, y_a[:, 1], num_pts)
+        new1 = g[a] ** 2 * phi_sq + Sim[a] ** 2 * y_a[:, 2] ** 2 + Sii[a] ** 2
+        new2 = Mn[a] * phi + Sini[a] * prime
+
+        y_new = np.zeros_like(y_a)
+        y_new[:, 0] = Mm[a] * new2 + Mi[a]
+        y_new[:, 1] = (1 - eps) * y_a[:, 1] + eps * new1
+        y_new[:, 2] = (1 - backwards[a] * eps) * y_a[:, 2] + backwards[a] * eps * new2
+
+        # Stop if the variables converge to a number, or zero
+        # If it becomes nan, or explodes
+        diff = np.fabs(y_a[:, 1:] - y_new[:, 1:])
+        with np.errstate(invalid="ignore"):
+            converged = np.all(diff < tolerance * np.fabs(y_a[:, 1:]), axis=1)
+            converged = np.logical_or(converged, np.all(diff < tolerance, axis=1))
+            failed = np.logical_or(
+                np.isnan(y_new[:, 0]), np.fabs(y_a[:, 2]) > 1 / tolerance
+            )
+        y_new[failed] = 0.0
+        stop = np.logical_or(converged, failed)
+
+        # Stopped rows keep the last iterate SolveStatic records
+        y[a[~stop]] = y_new[~stop]
+        count[a] += 1
+        active = a[~stop]
+        i += 1
+        if history:
+            ys.append(y.copy())
+
+    if history:
+        # the final append of a finished batch repeats the last iterates
+        if active.size == 0 and len(ys) > 1:
+            ys = ys[:-1]
+        return y, count, np.stack(ys, axis=2)
+    return y, count
+
+
+def SolveStatic2Batch(
+    y0,
+    g,
+    rho,
+    VecPar,
+    eps,
+    tolerance=1e-10,
+    backwards=1,
+    max_its=None,
+    history=False,
+    num_pts=200,
+):
+    # As in SolveStatic2, rho does not enter the iteration
+    return SolveStaticBatch(
+        y0, g, VecPar, eps, tolerance, backwards, max_its, history, num_pts
+    )
+
+
+### Multi-start enumeration of the static solutions
+
+
+def static_map(y, g, VecPar, num_pts=200):
+    # consistency map [delta0, K] -> [new1, new2] of SolveStatic on (M, 3) y
+    Mm, Mn, Mi, Sim, Sin, Sini, Sip = VecPar
+    Sii = np.sqrt((Sini / Sin) ** 2 + Sip ** 2)
+    mu = Mm * y[:, 2] + Mi
+    phi, phi_sq, prime = static_integrals(mu, y[:, 1], num_pts)
+    new1 = g ** 2 * phi_sq + Sim ** 2 * y[:, 2] ** 2 + Sii ** 2
+    new2 = Mn * phi + Sini * prime
+    return np.stack([new1, new2], axis=1)
+
+
+def static_jacobian(y, g, VecPar, num_pts=200):
+    """Jacobian of the SolveStatic consistency map at (M, 3) states.
+
+    Derivatives in delta0 follow from d/dD E[f(mu + sqrt(D) z)] = E[f'']/2.
+
+    # Arguments
+        y (np.array): (M, 3) states [mu, delta0, K].
+        g (float or np.array): Random connectivity strength.
+        VecPar (list): [Mm, Mn, Mi, Sim, Sin, Sini, Sip].
+        num_pts (int): Number of Gauss-Hermite quadrature points.
+
+    # Returns
+        J (np.array): (M, 2, 2) d[new1, new2]/d[delta0, K].
+
+    """
+    Mm, Mn, Mi, Sim, Sin, Sini, Sip = VecPar
+    gaussian_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    mu = np.expand_dims(Mm * y[:, 2] + Mi, 1)
+    delta0 = np.expand_dims(y[:, 1], 1)
+    tanh_x = np.tanh(mu + np.sqrt(delta0) * gauss_points)
+    prime_x = 1 - tanh_x ** 2
+    sec_x = -2 * tanh_x * prime_x
+    third_x = 2 * (3 * tanh_x ** 2 - 1) * prime_x
+
+    def E(integrand):
+        return gaussian_norm * np.dot(integrand, gauss_weights)
+
+    prime = E(prime_x)
+    sec = E(sec_x)
+    third = E(third_x)
+    J = np.zeros((y.shape[0], 2, 2))
+    J[:, 0, 0] = g ** 2 * E(prime_x ** 2 + tanh_x * sec_x)
+    J[:, 0, 1] = 2 * g ** 2 * Mm * E(tanh_x * prime_x) + 2 * Sim ** 2 * y[:, 2]
+    J[:, 1, 0] = (Mn * sec + Sini * third) / 2
+    J[:, 1, 1] = Mm * (Mn * prime + Sini * sec)
+    return J
+
+
+def SolveStaticMultiStart(
+    Y0,
+    g,
+    VecPar,
+    eps,
+    tolerance=1e-10,
+    backwards=1,
+    k_max=4,
+    dedup_tol=1e-6,
+    max_its=None,
+    num_pts=200,
+):
+    """Enumerates the static solutions of M parameter sets from S starts each.
+
+    All M*S starts run in one SolveStaticBatch call.  Starts that end on a
+    fixed point of the consistency map are deduplicated (max abs difference
+    below dedup_tol*(1 + |y|)) in start order.  A solution is stable if all
+    eigenvalues of the consistency map Jacobian have real part below 1.
+
+    # Arguments
+        Y0 (np.array): (S, 3) or (M, S, 3) initial [mu, delta0, K].
+        g (float or np.array): Random connectivity strength.
+        VecPar (list): [Mm, Mn, Mi, Sim, Sin, Sini, Sip] (scalars or (M,)).
+        eps (float): Step size.
+        tolerance (float): Convergence tolerance.
+        backwards (int or np.array): Scalar, (S,) or (M, S) iteration
+                                     directions (-1 reaches unstable solutions).
+        k_max (int): Maximum number of distinct solutions returned.
+        dedup_tol (float): Relative tolerance for identifying solutions.
+        max_its (int): Maximum number of steps per start (None for no limit).
+        num_pts (int): Number of Gauss-Hermite quadrature points.
+
+    # Returns
+        solutions (np.array): (M, k_max, 3) distinct solutions (nan padded).
+        num_solutions (np.array): (M,) number of distinct solutions found
+                                  (may exceed k_max).
+        stable (np.array): (M, k_max) stability of the solutions.
+        hits (np.array): (M, k_max) number of starts reaching each solution.
+
+    """
+    Y0 = np.array(Y0, dtype=np.float64)
+    params = [g] + list(VecPar)
+    M = np.broadcast(*params).shape
+    M = M[0] if len(M) > 0 else 1
+    if Y0.ndim == 3:
+        M = max(M, Y0.shape[0])
+    S = Y0.shape[-2]
+    Y0 = np.reshape(np.broadcast_to(Y0, (M, S, 3)), (M * S, 3))
+    backwards = np.reshape(
+        np.broadcast_to(np.array(backwards, dtype=np.float64), (M, S)), (M * S,)
+    )
+    params = [
+        np.repeat(np.broadcast_to(np.array(param, dtype=np.float64), (M,)), S)
+        for param in params
+    ]
+    g, VecPar = params[0], params[1:]
+    y, count = SolveStaticBatch(
+        Y0, g, VecPar, eps, tolerance, backwards, max_its, num_pts=num_pts
+    )
+
+    # keep the starts that ended on a fixed point
+    x = y[:, 1:]
+    with np.errstate(invalid="ignore"):
+        residual = np.max(np.fabs(static_map(y, g, VecPar, num_pts) - x), axis=1)
+        valid = residual < 10 * tolerance / eps * (1 + np.max(np.fabs(x), axis=1))
+    y = np.reshape(y, (M, S, 3))
+    valid = np.reshape(valid, (M, S))
+
+    # start s represents a new solution if no earlier valid start matches it
+    diff = np.max(np.fabs(y[:, :, None, :] - y[:, None, :, :]), axis=3)
+    scale = 1 + np.max(np.fabs(y), axis=2)
+    with np.errstate(invalid="ignore"):
+        same = diff < dedup_tol * scale[:, :, None]
+    same = np.logical_and(same, valid[:, :, None])
+    same = np.logical_and(same, valid[:, None, :])
+    earlier = np.tril(np.ones((S, S), dtype=bool), -1)
+    rep = np.logical_and(valid, ~np.any(np.logical_and(same, earlier), axis=2))
+    num_solutions = np.sum(rep, axis=1)
+
+    # each valid start counts towards the first solution it matches
+    first = np.argmax(np.logical_and(same, rep[:, None, :]), axis=2)
+    k_of_start = np.cumsum(rep, axis=1) - 1
+    k_first = np.take_along_axis(k_of_start, first, axis=1)
+
+    m_inds, s_inds = np.nonzero(np.logical_and(rep, k_of_start < k_max))
+    k_inds = k_of_start[m_inds, s_inds]
+    solutions = np.nan * np.ones((M, k_max, 3))
+    solutions[m_inds, k_inds] = y[m_inds, s_inds]
+
+    stable = np.zeros((M, k_max), dtype=bool)
+    J = static_jacobian(
+        y[m_inds, s_inds],
+        np.reshape(g, (M, S))[m_inds, s_inds],
+        [np.reshape(param, (M, S))[m_inds, s_inds] for param in VecPar],
+        num_pts,
+    )
+    stable[m_inds, k_inds] = np.max(np.real(np.linalg.eigvals(J)), axis=1) < 1.0
+
+    hits = np.zeros((M, k_max), dtype=np.int64)
+    m_inds, s_inds = np.nonzero(np.logical_and(valid, k_first < k_max))
+    np.add.at(hits, (m_inds, k_first[m_inds, s_inds]), 1)
+    return solutions, num_solutions, stable, hits
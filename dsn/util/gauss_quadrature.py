@@ -0,0 +1,44 @@
+# Sean Bittner 2019
+
+import numpy as np
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Gauss-Hermite quadrature tables shared by the integral backends
+# (tf_integrals, np_integrals and fct_integrals).
+
+# (num_pts, double, dtype name) -> quadrature tuple
+_quadrature_tables = {}
+
+
+def gauss_hermite(num_pts, double=False, dtype=np.float64):
+    """Memoized Gauss-Hermite quadrature for E_{x ~ N(0,1)}[f(x)].
+
+    The returned arrays are shared between all callers and are read-only.
+
+    # Arguments
+        num_pts (int): Number of quadrature points.
+        double (bool): Also return points shaped for nested integrals.
+        dtype (np.dtype): Dtype of the points and weights.
+
+    # Returns
+        gauss_norm (float): Normalization 1/sqrt(pi).
+        gauss_points (np.array): (1, num_pts) points scaled by sqrt(2).
+        gauss_weights (np.array): (num_pts,) weights.
+        gauss_points_inner (np.array): (1, 1, num_pts) points (if double).
+        gauss_points_outer (np.array): (1, num_pts, 1) points (if double).
+
+    """
+    key = (num_pts, double, np.dtype(dtype).name)
+    if key not in _quadrature_tables:
+        gauss_norm = 1 / np.sqrt(np.pi)
+        gauss_points, gauss_weights = np.polynomial.hermite.hermgauss(num_pts)
+        gauss_points = np.expand_dims(gauss_points * np.sqrt(2), 0).astype(dtype)
+        gauss_weights = gauss_weights.astype(dtype)
+        quadrature = [gauss_norm, gauss_points, gauss_weights]
+        if double:
+            quadrature.append(np.expand_dims(gauss_points, 1))
+            quadrature.append(np.expand_dims(gauss_points, 2))
+        for array in quadrature[1:]:
+            array.setflags(write=False)
+        _quadrature_tables[key] = tuple(quadrature)
+    return _quadrature_tables[key]
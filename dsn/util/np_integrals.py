@@ -2,6 +2,7 @@
 # more generally vectorized as in tf code for warm-starting
 
 import numpy as np
+from dsn.util.gauss_quadrature import gauss_hermite
 
 #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
 #### Computing Gaussian integrals through Gauss-Hermite quadrature
@@ -11,22 +12,7 @@ import numpy as np
 
 
 def get_quadrature(num_pts, double=False):
-    gauss_norm = 1 / np.sqrt(np.pi)
-    gauss_points, gauss_weights = np.polynomial.hermite.hermgauss(num_pts)
-    gauss_points = np.expand_dims(gauss_points * np.sqrt(2), 0)
-
-    if double:
-        gauss_points_inner = np.expand_dims(gauss_points, 1)
-        gauss_points_outer = np.expand_dims(gauss_points, 2)
-        return (
-            gauss_norm,
-            gauss_points,
-            gauss_weights,
-            gauss_points_inner,
-            gauss_points_outer,
-        )
-    else:
-        return gauss_norm, gauss_points, gauss_weights
+    return gauss_hermite(num_pts, double)
 
 
 #### Single Gaussian intergrals
@@ -1,8 +1,87 @@
 import numpy as np
+from contextlib import contextmanager
 
 
-def sample_LRRNN(N, params):
+class MatrixFreeConnectivity:
+    """Connectivity W = g*xi + m n^T / N that never stores xi.
+
+    Row block k of xi is regenerated whenever it is needed from a Philox
+    counter-based generator keyed by [seed, k], so W is a function of
+    (seed, block_rows, N) and only O(N r) memory is held.
+
+    # Arguments
+        N (int): Number of neurons.
+        g (float): Random connectivity strength.
+        m (np.array): (N,r) left connectivity vectors.
+        n (np.array): (N,r) right connectivity vectors.
+        seed (int): Seed of xi.
+        block_rows (int): Rows of xi generated at a time.
+        dtype (np.dtype): Dtype of xi.
+
+    """
+
+    def __init__(self, N, g, m, n, seed, block_rows=256, dtype=np.float64):
+        self.N = N
+        self.g = g
+        self.m = m
+        self.n = n
+        self.seed = seed
+        self.block_rows = block_rows
+        self.dtype = dtype
+        self.num_blocks = (N + block_rows - 1) // block_rows
+        self.shape = (N, N)
+
+    def xi_block(self, k):
+        """Rows [k*block_rows, (k+1)*block_rows) of xi."""
+        rows = min(self.block_rows, self.N - k * self.block_rows)
+        rng = np.random.Generator(np.random.Philox(key=[self.seed, k]))
+        xi_k = rng.standard_normal((rows, self.N), dtype=self.dtype)
+        return xi_k / np.sqrt(self.N, dtype=self.dtype)
+
+    def matvec(self, r):
+        """W r for (N,) or (N,K) r."""
+        rec = np.dot(self.m, np.dot(self.n.T, r)) / self.N
+        xi_r = np.concatenate(
+            [np.dot(self.xi_block(k), r) for k in range(self.num_blocks)], axis=0
+        )
+        return self.g * xi_r + rec
+
+    def xi(self,):
+        """xi as an (N,N) np.array (for small N)."""
+        return np.concatenate(
+            [self.xi_block(k) for k in range(self.num_blocks)], axis=0
+        )
+
+    def dense(self,):
+        """W as an (N,N) np.array (for small N)."""
+        return self.g * self.xi() + np.dot(self.m, self.n.T) / self.N
+
+
+def sample_LRRNN(N, params, matrix_free=False, seed=None):
+    """Samples a low-rank RNN W = g*xi + m n^T / N.
+
+    With matrix_free, W is a MatrixFreeConnectivity regenerating xi from
+    seed (drawn from np.random if None), and xi is not returned.
+
+    """
     nettype = params["nettype"]
+    if matrix_free:
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        if nettype not in ["rank1_spont", "rank1_input"]:
+            raise ValueError("unsupported nettype %s" % nettype)
+        x1 = np.random.normal(0.0, 1.0, (N, 1))
+        x2 = np.random.normal(0.0, 1.0, (N, 1))
+        m = params["Mm"] + params["Sm"] * x1
+        n = params["Mn"] + params["Sn"] * x2
+        W = MatrixFreeConnectivity(N, params["g"], m, n, seed)
+        LRRNN = {"W": W, "m": m, "n": n}
+        if nettype == "rank1_input":
+            h = np.random.normal(0.0, 1.0, (N, 1))
+            I = params["MI"] + (params["SmI"] / params["Sm"]) * x1
+            I = I + (params["SnI"] / params["Sn"]) * x2 + params["Sperp"] * h
+            LRRNN["I"] = I
+        return LRRNN
     if nettype == "rank1_spont":
         g = params["g"]
         Mm = params["Mm"]
@@ -44,18 +123,231 @@ def sample_LRRNN(N, params):
     return LRRNN
 
 
-def sim_RNN(x0, W, I, dt, tau, T):
+def sim_RNN(x0, W, I, dt, tau, T, accumulators=None, t_start=0):
+    """Simulates dx/dt = (-x + W tanh(x) + I) / tau with Euler steps.
+
+    With accumulators, the states x[:, t] for t >= t_start are only passed
+    to the accumulators (see RunningMean), and the trajectory is not stored.
+
+    # Returns
+        x (np.array): (N,T+1) trajectory, or (N,) final state if accumulators.
+
+    """
     N = x0.shape[0]
-    x = np.zeros((N, T + 1))
-    x[:, 0] = x0
+    store = accumulators is None
+    if store:
+        x = np.zeros((N, T + 1))
+        x[:, 0] = x0
+    else:
+        accumulate(accumulators, x0, 0, t_start)
     fac = dt / tau
+    # W may be matrix-free (see MatrixFreeConnectivity)
+    matvec = W.matvec if hasattr(W, "matvec") else lambda r: np.dot(W, r)
     x_i = x0
     for i in range(T):
-        dx = fac * (-x_i + np.dot(W, np.tanh(x_i)) + I)
+        dx = fac * (-x_i + matvec(np.tanh(x_i)) + I)
         x_i = x_i + dx
-        x[:, i + 1] = x_i
+        if store:
+            x[:, i + 1] = x_i
+        else:
+            accumulate(accumulators, x_i, i + 1, t_start)
+
+    if store:
+        return x
+    return x_i
+
+
+#### Online statistics of simulated states
+
+
+class RunningMean:
+    """Running mean of fn(x) over time, updated in place."""
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.count = 0
+        self.mean = None
+
+    def update(self, x):
+        y = x if self.fn is None else self.fn(x)
+        self.count += 1
+        if self.mean is None:
+            self.mean = np.array(y, dtype=np.float64)
+        else:
+            self.mean += (y - self.mean) / self.count
+
+
+class RunningVar(RunningMean):
+    """Welford running mean and (population) variance of x over time."""
+
+    def __init__(self,):
+        super().__init__()
+        self.M2 = None
+
+    def update(self, x):
+        if self.mean is None:
+            super().update(x)
+            self.M2 = np.zeros_like(self.mean)
+        else:
+            delta = x - self.mean
+            super().update(x)
+            self.M2 += delta * (x - self.mean)
+
+    @property
+    def var(self,):
+        return self.M2 / self.count
+
+
+def rnn_accumulators():
+    """Accumulators of the states needed by measure_accumulated."""
+    return {"x": RunningVar(), "phi": RunningMean(np.tanh)}
+
+
+def accumulate(accumulators, x_t, t, t_start):
+    if t >= t_start:
+        for acc in accumulators.values():
+            acc.update(x_t)
+    return None
+
+
+def measure_accumulated(accumulators, n):
+    """kappa, delta_inf and delta_T from rnn_accumulators.
+
+    kappa is n^T [phi] / N with [phi] the time average of tanh(x), and the
+    variances are those of measure_vars.  States may be (N,) or batched
+    (B,N) with (B,N,r) n.
+
+    """
+    N = n.shape[-2]
+    kappa = np.einsum("...i,...ir->...r", accumulators["phi"].mean, n) / N
+    delta_inf = np.var(accumulators["x"].mean, axis=-1)
+    delta_T = np.mean(accumulators["x"].var, axis=-1)
+    return kappa, delta_inf, delta_T
+
+
+def sample_LRRNN_batch(N, params, dtype=np.float64):
+    """Samples B networks in the factored form W = g*xi + m n^T / N.
+
+    # Arguments
+        N (int): Number of neurons.
+        params (dict): nettype and (B,) arrays (or scalars) of the parameters.
+        dtype (np.dtype): Dtype of the networks.
+
+    # Returns
+        LRRNN (dict): g (B,), xi (B,N,N), m (B,N,1), n (B,N,1) and I (B,N).
+
+    """
+    nettype = params["nettype"]
+    g = np.array(params["g"], dtype=dtype)
+    B = g.shape[0]
+
+    def param(name):
+        return np.reshape(np.broadcast_to(params[name], (B,)).astype(dtype), (B, 1, 1))
+
+    x1 = np.random.normal(0.0, 1.0, (B, N, 1))
+    x2 = np.random.normal(0.0, 1.0, (B, N, 1))
+    m = param("Mm") + param("Sm") * x1
+    n = param("Mn") + param("Sn") * x2
+    if nettype == "rank1_spont":
+        I = np.zeros((B, N, 1))
+    elif nettype == "rank1_input":
+        h = np.random.normal(0.0, 1.0, (B, N, 1))
+        I = param("MI") + (param("SmI") / param("Sm")) * x1
+        I = I + (param("SnI") / param("Sn")) * x2 + param("Sperp") * h
+    else:
+        raise ValueError("unsupported nettype %s" % nettype)
+
+    xi = np.random.normal(0.0, 1.0 / np.sqrt(N), (B, N, N)).astype(dtype)
+    LRRNN = {
+        "g": g,
+        "xi": xi,
+        "m": m.astype(dtype),
+        "n": n.astype(dtype),
+        "I": I[:, :, 0].astype(dtype),
+    }
+    return LRRNN
+
+
+@contextmanager
+def blas_threads(num_threads=None):
+    # threadpoolctl is only needed to limit the BLAS threads
+    if num_threads is None:
+        yield
+    else:
+        from threadpoolctl import threadpool_limits
+
+        with threadpool_limits(limits=num_threads, user_api="blas"):
+            yield
+
+
+def sim_RNN_batch(
+    x0,
+    g,
+    xi,
+    m,
+    n,
+    I,
+    dt,
+    tau,
+    T,
+    record_stride=None,
+    num_threads=None,
+    accumulators=None,
+    t_start=0,
+):
+    """Simulates B networks W = g*xi + m n^T / N at once.
+
+    The random part is applied with a batched matrix product, and the rank r
+    part as two O(N r) products, in the dtype of x0.
+
+    # Arguments
+        x0 (np.array): (B,N) initial states.
+        g (np.array): (B,) random connectivity strengths.
+        xi (np.array): (B,N,N) random connectivity.
+        m (np.array): (B,N,r) left connectivity vectors.
+        n (np.array): (B,N,r) right connectivity vectors.
+        I (np.array): (B,N) inputs.
+        dt (float): Time step.
+        tau (float): Time constant.
+        T (int): Number of time steps.
+        record_stride (int): Record the states every record_stride steps.
+        num_threads (int): BLAS threads (requires threadpoolctl).
+        accumulators (dict): Accumulators of the states x[:, :, t], t >= t_start.
+        t_start (int): First time step accumulated.
+
+    # Returns
+        x (np.array): (B,N) final states.
+        xs (np.array): (B,N,T//record_stride+1) recorded states (if record_stride).
+
+    """
+    dtype = x0.dtype
+    N = x0.shape[1]
+    g = np.reshape(g, (-1, 1)).astype(dtype)
+    xi = xi.astype(dtype, copy=False)
+    m = m.astype(dtype, copy=False)
+    n_N = n.astype(dtype) / N
+    I = I.astype(dtype, copy=False)
+    fac = dtype.type(dt / tau)
+
+    x_i = x0.copy()
+    xs = [x0.copy()]
+    if accumulators is not None:
+        accumulate(accumulators, x0, 0, t_start)
+    with blas_threads(num_threads):
+        for i in range(T):
+            phi = np.tanh(x_i)
+            kappa = np.matmul(np.expand_dims(phi, 1), n_N)
+            rec = g * np.matmul(xi, np.expand_dims(phi, 2))[:, :, 0]
+            rec += np.matmul(m, np.transpose(kappa, [0, 2, 1]))[:, :, 0]
+            x_i = x_i + fac * (-x_i + rec + I)
+            if accumulators is not None:
+                accumulate(accumulators, x_i, i + 1, t_start)
+            if record_stride is not None and (i + 1) % record_stride == 0:
+                xs.append(x_i)
 
-    return x
+    if record_stride is not None:
+        return x_i, np.stack(xs, axis=2)
+    return x_i
 
 
 def measure_mu(kappa, m, I, t_start):
@@ -0,0 +1,346 @@
+# Sean Bittner 2019
+
+import numpy as np
+import os
+import inspect
+import hashlib
+import dsn.util.np_moments as np_moments
+from dsn.util.gauss_quadrature import gauss_hermite
+from dsn.util.np_moments import gaussian_moments as quadrature_moments
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Tabulated Gaussian moments of phi(x) = tanh(x)
+# The moments used by the DMFT solvers are precomputed by quadrature on a
+# grid and evaluated by Catmull-Rom (C1 cubic) interpolation.  The grid is
+# uniform in stretched coordinates, so it is dense where the moments change
+# quickly (small |mu| and delta0) and sparse where tanh saturates:
+#   u = asinh(mu)
+#   v = asinh(delta0)
+#   r = deltainf / delta0 (nested moments only)
+# Points outside the grid are clamped to its boundary.
+
+MOMENT_TABLES_DIR = "data/moment_tables/"
+
+SINGLE_TABLE_MOMENTS = ["Phi", "Prime", "PhiSq", "PrimSq"]
+NESTED_TABLE_MOMENTS = ["IntPhiPhi", "IntPrimPrim"]
+
+# grid range and number of nodes of each coordinate
+MU_MAX = 150.0
+DELTA0_MAX = 300.0
+TABLE_GRID = {"u": 201, "v": 121, "r": 41}
+
+# samples per chunk when building the nested table
+BUILD_CHUNK = 1000
+
+# num_pts -> loaded tables
+_moment_tables = {}
+
+
+def table_baseline(moment, mu, delta0, deltainf):
+    """Quadratic growth of PrimSq and IntPrimPrim, which is not tabulated.
+
+    log(cosh(h)) ~ |h| - log(2), so the tables hold the moments minus
+    E[h^2] = mu^2 + delta0 and E_z[E_x[h]^2] = mu^2 + deltainf.
+
+    """
+    if moment == "PrimSq":
+        return mu ** 2 + delta0
+    elif moment == "IntPrimPrim":
+        return mu ** 2 + deltainf
+    return 0.0
+
+
+def table_axes():
+    """Node coordinates of the table grid.
+
+    # Returns
+        axes (dict): Nodes of u, v and r.
+
+    """
+    u_max = np.arcsinh(MU_MAX)
+    v_max = np.arcsinh(DELTA0_MAX)
+    return {
+        "u": np.linspace(-u_max, u_max, TABLE_GRID["u"]),
+        "v": np.linspace(0.0, v_max, TABLE_GRID["v"]),
+        "r": np.linspace(0.0, 1.0, TABLE_GRID["r"]),
+    }
+
+
+def table_coords(mu, delta0, deltainf=None, eps=1e-12):
+    """Stretched table coordinates of mu, delta0 (and deltainf)."""
+    u = np.arcsinh(mu)
+    v = np.arcsinh(delta0)
+    if deltainf is None:
+        return [u, v]
+    r = deltainf / (delta0 + eps)
+    return [u, v, r]
+
+
+def pad_table(table, num_axes):
+    """Adds a quadratically extrapolated node on both ends of each grid axis."""
+    for axis in range(num_axes):
+        head = np.take(table, [0, 1, 2], axis=axis)
+        tail = np.take(table, [-1, -2, -3], axis=axis)
+        pads = []
+        for nodes in [head, tail]:
+            f0, f1, f2 = np.split(nodes, 3, axis=axis)
+            pads.append(3 * f0 - 3 * f1 + f2)
+        table = np.concatenate((pads[0], table, pads[1]), axis=axis)
+    return table
+
+
+def catmull_rom_weights(t):
+    """(M, 4) weights of the nodes i-1, i, i+1, i+2 at t in [0, 1)."""
+    t2 = t ** 2
+    t3 = t ** 3
+    return np.stack(
+        [
+            (-t3 + 2 * t2 - t) / 2.0,
+            (3 * t3 - 5 * t2 + 2) / 2.0,
+            (-3 * t3 + 4 * t2 + t) / 2.0,
+            (t3 - t2) / 2.0,
+        ],
+        axis=1,
+    )
+
+
+def build_moment_tables(num_pts=50):
+    """Tabulates the single and nested moments by quadrature.
+
+    # Arguments
+        num_pts (int): Number of quadrature points.
+
+    # Returns
+        tables (dict): Padded "single" (U, V, 4) and "nested" (U, V, R, 2)
+                       tables and the grid axes.
+
+    """
+    axes = table_axes()
+    mu = np.sinh(axes["u"])
+    delta0 = np.sinh(axes["v"])
+    ratio = axes["r"]
+    num_u, num_v, num_r = mu.shape[0], delta0.shape[0], ratio.shape[0]
+
+    _mu, _delta0 = np.meshgrid(mu, delta0, indexing="ij")
+    _mu = np.reshape(_mu, (num_u * num_v,))
+    _delta0 = np.reshape(_delta0, (num_u * num_v,))
+    values = quadrature_moments(_mu, _delta0, None, SINGLE_TABLE_MOMENTS, num_pts)
+    single = []
+    for moment, value in zip(SINGLE_TABLE_MOMENTS, values):
+        value = value - table_baseline(moment, _mu, _delta0, None)
+        single.append(np.reshape(value, (num_u, num_v)))
+    single = np.stack(single, axis=2)
+
+    _mu, _delta0, _ratio = np.meshgrid(mu, delta0, ratio, indexing="ij")
+    _mu = np.reshape(_mu, (num_u * num_v * num_r,))
+    _delta0 = np.reshape(_delta0, (num_u * num_v * num_r,))
+    _deltainf = np.reshape(_ratio, (num_u * num_v * num_r,)) * _delta0
+    nested = np.zeros((num_u * num_v * num_r, len(NESTED_TABLE_MOMENTS)))
+    for i in range(0, _mu.shape[0], BUILD_CHUNK):
+        inds = slice(i, i + BUILD_CHUNK)
+        values = quadrature_moments(
+            _mu[inds], _delta0[inds], _deltainf[inds], NESTED_TABLE_MOMENTS, num_pts
+        )
+        for j, moment in enumerate(NESTED_TABLE_MOMENTS):
+            baseline = table_baseline(moment, _mu[inds], _delta0[inds], _deltainf[inds])
+            nested[inds, j] = values[j] - baseline
+    nested = np.reshape(nested, (num_u, num_v, num_r, len(NESTED_TABLE_MOMENTS)))
+
+    return {
+        "single": pad_table(single, 2),
+        "nested": pad_table(nested, 3),
+        "u": axes["u"],
+        "v": axes["v"],
+        "r": axes["r"],
+    }
+
+
+def table_errors(tables, num_pts=50, delta0_max=DELTA0_MAX, num_samples=2000, seed=0):
+    """Max absolute interpolation error against quadrature.
+
+    Errors are measured at random points of the tabulated domain with
+    delta0 and mu drawn log-uniformly.  For large delta0 the quadrature
+    itself is coarse (tanh is close to a step on the scale of the points),
+    and the error is dominated by its jitter rather than by interpolation.
+
+    # Arguments
+        tables (dict): Tables from build_moment_tables.
+        num_pts (int): Number of quadrature points.
+        delta0_max (float): Largest delta0 of the random points.
+        num_samples (int): Number of random points.
+        seed (int): Random seed.
+
+    # Returns
+        errors (dict): Max absolute error of each moment.
+
+    """
+    rs = np.random.RandomState(seed)
+    mu = rs.choice([-1.0, 1.0], num_samples) * np.exp(
+        rs.uniform(np.log(1e-3), np.log(MU_MAX), num_samples)
+    )
+    delta0 = np.exp(rs.uniform(np.log(1e-4), np.log(delta0_max), num_samples))
+    deltainf = rs.uniform(0.0, 1.0, num_samples) * delta0
+    moments = SINGLE_TABLE_MOMENTS + NESTED_TABLE_MOMENTS
+    y_true = quadrature_moments(mu, delta0, deltainf, moments, num_pts)
+    y = interp_moments(tables, mu, delta0, deltainf, moments)
+    return {
+        moment: np.max(np.abs(y[i] - y_true[i])) for i, moment in enumerate(moments)
+    }
+
+
+def get_moment_tables_hash():
+    """sha1 of everything the tables depend on besides num_pts.
+
+    Covers the grid and the source of the quadrature and tabulation code, so
+    that changing either builds new tables rather than reusing stale ones.
+
+    """
+    funcs = [
+        build_moment_tables,
+        table_axes,
+        table_baseline,
+        pad_table,
+        quadrature_moments,
+        np_moments.split_moments,
+        np_moments.transcendentals,
+        gauss_hermite,
+    ]
+    for integrands in [np_moments.SINGLE_INTEGRANDS, np_moments.NESTED_INTEGRANDS]:
+        funcs += [integrands[moment][1] for moment in sorted(integrands)]
+    h = hashlib.sha1()
+    for func in funcs:
+        h.update(inspect.getsource(func).encode("utf-8"))
+    grid = (MU_MAX, DELTA0_MAX, TABLE_GRID["u"], TABLE_GRID["v"], TABLE_GRID["r"])
+    h.update(repr(grid).encode("utf-8"))
+    return h.hexdigest()
+
+
+def get_moment_tables_file(num_pts):
+    return MOMENT_TABLES_DIR + "moment_tables_P=%d_%s.npz" % (
+        num_pts,
+        get_moment_tables_hash()[:16],
+    )
+
+
+def load_moment_tables(num_pts=50):
+    """Loads the moment tables, building and saving them if needed.
+
+    # Arguments
+        num_pts (int): Number of quadrature points of the tabulated moments.
+
+    # Returns
+        tables (dict): See build_moment_tables.
+
+    """
+    if num_pts in _moment_tables:
+        return _moment_tables[num_pts]
+    fname = get_moment_tables_file(num_pts)
+    if not os.path.isfile(fname):
+        print("Building moment tables %s." % fname)
+        tables = build_moment_tables(num_pts)
+        errors = table_errors(tables, num_pts)
+        for moment, error in errors.items():
+            print("%s max abs error: %.2E" % (moment, error))
+        if not os.path.isdir(MOMENT_TABLES_DIR):
+            os.makedirs(MOMENT_TABLES_DIR)
+        # concurrent jobs or an interruption never leave a partial file
+        tmp_file = fname[:-4] + "_%d_tmp.npz" % os.getpid()
+        np.savez(
+            tmp_file, errors=np.array([errors[moment] for moment in errors]), **tables
+        )
+        os.replace(tmp_file, fname)
+    npzfile = np.load(fname)
+    tables = {key: npzfile[key] for key in ["single", "nested", "u", "v", "r"]}
+    _moment_tables[num_pts] = tables
+    return tables
+
+
+def interp_indices(coord, nodes):
+    """Cell index and position in the cell of coordinates on a uniform grid."""
+    num_nodes = nodes.shape[0]
+    h = nodes[1] - nodes[0]
+    s = np.clip((coord - nodes[0]) / h, 0.0, num_nodes - 1)
+    i = np.minimum(np.floor(s), num_nodes - 2).astype(np.int64)
+    return i, s - i
+
+
+def interp_table(table, coords, axes):
+    """Catmull-Rom interpolation of a padded table.
+
+    # Arguments
+        table (np.array): Padded (N_1+2, ..., N_d+2, K) table.
+        coords (list): d (M,) coordinates.
+        axes (list): d node arrays.
+
+    # Returns
+        values (np.array): (M, K) interpolated values.
+
+    """
+    num_dims = len(coords)
+    shape = table.shape[:num_dims]
+    flat_table = np.reshape(table, (-1, table.shape[-1]))
+    flat_inds = 0
+    weights = 1.0
+    for d in range(num_dims):
+        i, t = interp_indices(coords[d], axes[d])
+        # stencil i-1, ..., i+2 is i, ..., i+3 in the padded table
+        stencil = np.expand_dims(i, 1) + np.arange(4)
+        w = catmull_rom_weights(t)
+        expand = [1] * num_dims
+        expand[d] = 4
+        stencil = np.reshape(stencil, [-1] + expand)
+        w = np.reshape(w, [-1] + expand)
+        flat_inds = flat_inds * shape[d] + stencil
+        weights = weights * w
+    values = flat_table[np.reshape(flat_inds, (flat_inds.shape[0], -1))]
+    weights = np.reshape(weights, (weights.shape[0], -1, 1))
+    return np.sum(weights * values, axis=1)
+
+
+def interp_moments(tables, mu, delta0, deltainf, moments):
+    """Interpolates moments from loaded tables (see gaussian_moments)."""
+    values = {}
+    single = [moment for moment in moments if moment in SINGLE_TABLE_MOMENTS]
+    nested = [moment for moment in moments if moment in NESTED_TABLE_MOMENTS]
+    if len(single) + len(nested) < len(moments):
+        raise ValueError(
+            "Only %s are tabulated."
+            % ", ".join(SINGLE_TABLE_MOMENTS + NESTED_TABLE_MOMENTS)
+        )
+    mu, delta0 = np.broadcast_arrays(mu, delta0)
+    if len(single) > 0:
+        coords = table_coords(mu, delta0)
+        y = interp_table(tables["single"], coords, [tables["u"], tables["v"]])
+        for moment in single:
+            k = SINGLE_TABLE_MOMENTS.index(moment)
+            values[moment] = y[:, k] + table_baseline(moment, mu, delta0, deltainf)
+    if len(nested) > 0:
+        if deltainf is None:
+            raise ValueError("Nested Gaussian moments require deltainf.")
+        coords = table_coords(mu, delta0, deltainf)
+        axes = [tables["u"], tables["v"], tables["r"]]
+        y = interp_table(tables["nested"], coords, axes)
+        for moment in nested:
+            k = NESTED_TABLE_MOMENTS.index(moment)
+            values[moment] = y[:, k] + table_baseline(moment, mu, delta0, deltainf)
+    return [values[moment] for moment in moments]
+
+
+def gaussian_moments(mu, delta0, deltainf, moments, num_pts=50):
+    """Tabulated version of np_moments.gaussian_moments.
+
+    Only SINGLE_TABLE_MOMENTS and NESTED_TABLE_MOMENTS are available.
+
+    # Arguments
+        mu (np.array): (M,) means.
+        delta0 (np.array): (M,) variances.
+        deltainf (np.array): (M,) delta_inf (None if no nested moments).
+        moments (list): Moment names.
+        num_pts (int): Number of quadrature points of the tables.
+
+    # Returns
+        values (list): (M,) value of each moment in the order requested.
+
+    """
+    tables = load_moment_tables(num_pts)
+    return interp_moments(tables, mu, delta0, deltainf, moments)
@@ -0,0 +1,263 @@
+# Sean Bittner 2019
+
+import numpy as np
+from dsn.util.gauss_quadrature import gauss_hermite
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Fused Gaussian moments of phi(x) = tanh(x)
+# Each moment matches the function of the same name in np_integrals and
+# tf_integrals.  The transcendental functions of the quadrature grid are
+# evaluated once and shared by all moments requested in a call.
+
+# moment -> (transcendentals, integrand)
+#   "tanh" - tanh(h)
+#   "logcosh" - log(cosh(h))
+#   "prime" - 1 - tanh(h)^2
+SINGLE_INTEGRANDS = {
+    "Prim": (["logcosh"], lambda u: u["logcosh"]),
+    "Phi": (["tanh"], lambda u: u["tanh"]),
+    "Prime": (["prime"], lambda u: u["prime"]),
+    "Sec": (["tanh", "prime"], lambda u: -2 * u["tanh"] * u["prime"]),
+    "Third": (["tanh", "prime"], lambda u: -2 * (3 * u["tanh"] ** 2 - 1) * u["prime"]),
+    "PrimSq": (["logcosh"], lambda u: u["logcosh"] ** 2),
+    "PhiSq": (["tanh"], lambda u: u["tanh"] ** 2),
+    "PrimeSq": (["prime"], lambda u: u["prime"] ** 2),
+    "PhiPrime": (["tanh", "prime"], lambda u: u["tanh"] * u["prime"]),
+    "PrimPrime": (["logcosh", "prime"], lambda u: u["prime"] * u["logcosh"]),
+    "PhiSec": (["tanh", "prime"], lambda u: -2 * u["tanh"] ** 2 * u["prime"]),
+    "PrimPhi": (["logcosh", "tanh"], lambda u: u["logcosh"] * u["tanh"]),
+}
+
+# nested moment -> (transcendentals, inner integrand)
+NESTED_INTEGRANDS = {
+    "IntPrimPrim": (["logcosh"], lambda u: u["logcosh"]),
+    "IntPhiPhi": (["tanh"], lambda u: u["tanh"]),
+    "IntPrimePrime": (["prime"], lambda u: u["prime"]),
+}
+
+
+def split_moments(moments, deltainf=None):
+    """Splits requested moments into single and nested Gaussian integrals.
+
+    # Arguments
+        moments (list): Moment names.
+        deltainf: Delta_inf (nested moments require it).
+
+    # Returns
+        single (list): Single Gaussian integral moment names.
+        nested (list): Nested Gaussian integral moment names.
+        transcendentals (tuple): Transcendentals needed on each grid.
+
+    """
+    single = []
+    nested = []
+    single_trans = set()
+    nested_trans = set()
+    for moment in moments:
+        if moment in SINGLE_INTEGRANDS:
+            single.append(moment)
+            single_trans.update(SINGLE_INTEGRANDS[moment][0])
+        elif moment in NESTED_INTEGRANDS:
+            nested.append(moment)
+            nested_trans.update(NESTED_INTEGRANDS[moment][0])
+        else:
+            raise ValueError("Unknown Gaussian moment %s." % moment)
+    if len(nested) > 0 and deltainf is None:
+        raise ValueError("Nested Gaussian moments require deltainf.")
+    return single, nested, (single_trans, nested_trans)
+
+
+def transcendentals(h, names):
+    u = {}
+    if "tanh" in names or "prime" in names:
+        u["tanh"] = np.tanh(h)
+    if "prime" in names:
+        u["prime"] = 1 - u["tanh"] ** 2
+    if "logcosh" in names:
+        u["logcosh"] = np.log(np.cosh(h))
+    return u
+
+
+def gaussian_moments(mu, delta0, deltainf, moments, num_pts=200):
+    """Evaluates several Gaussian moments of tanh in one pass.
+
+    # Arguments
+        mu (np.array): (M,) means.
+        delta0 (np.array): (M,) variances.
+        deltainf (np.array): (M,) delta_inf (None if no nested moments).
+        moments (list): Moment names (see SINGLE_INTEGRANDS, NESTED_INTEGRANDS).
+        num_pts (int): Number of quadrature points.
+
+    # Returns
+        values (list): (M,) value of each moment in the order requested.
+
+    """
+    single, nested, trans = split_moments(moments, deltainf)
+    values = {}
+    if len(single) > 0:
+        gauss_norm, gauss_points, gauss_weights = gauss_hermite(num_pts)
+        h = np.expand_dims(mu, 1) + np.sqrt(np.expand_dims(delta0, 1)) * gauss_points
+        u = transcendentals(h, trans[0])
+        for moment in single:
+            integrand = SINGLE_INTEGRANDS[moment][1](u)
+            values[moment] = gauss_norm * np.dot(integrand, gauss_weights)
+
+    if len(nested) > 0:
+        gauss_norm, gauss_points, gauss_weights, gauss_points_inner, gauss_points_outer = gauss_hermite(
+            num_pts, double=True
+        )
+        mu = np.expand_dims(np.expand_dims(mu, 1), 2)
+        delta0 = np.expand_dims(np.expand_dims(delta0, 1), 2)
+        deltainf = np.expand_dims(np.expand_dims(deltainf, 1), 2)
+        h = (
+            mu
+            + np.sqrt(delta0 - deltainf) * gauss_points_inner
+            + np.sqrt(deltainf) * gauss_points_outer
+        )
+        u = transcendentals(h, trans[1])
+        for moment in nested:
+            inner_integrand = NESTED_INTEGRANDS[moment][1](u)
+            outer_integrand = gauss_norm * np.dot(inner_integrand, gauss_weights)
+            values[moment] = gauss_norm * np.dot(outer_integrand ** 2, gauss_weights)
+    return [values[moment] for moment in moments]
+
+
+#### Adaptive quadrature order
+# For small delta0 the integrand is nearly polynomial on the scale of the
+# quadrature points and a few points are exact to machine precision.
+# Samples are grouped into buckets of quadrature order chosen from delta0.
+
+ADAPTIVE_ORDERS = [4, 8, 16, 32, 64, 128]
+ADAPTIVE_TOL = 1e-8
+
+# (num_pts, tol, nested) -> (orders, delta0 thresholds)
+_order_thresholds = {}
+
+
+def calibrate_orders(num_pts, tol=ADAPTIVE_TOL, nested=False):
+    """Largest delta0 at which each order matches num_pts quadrature.
+
+    The error of each order against num_pts points is measured over a grid
+    of mu, delta0 (and deltainf / delta0 if nested).  The error is relative
+    to the magnitude of moments above 1 (e.g. PrimSq).
+
+    # Arguments
+        num_pts (int): Quadrature order being approximated.
+        tol (float): Error tolerance.
+        nested (bool): Calibrate the nested moments.
+
+    # Returns
+        orders (list): Quadrature orders, ending with num_pts.
+        thresholds (np.array): Largest delta0 of each order (inf for num_pts).
+
+    """
+    key = (num_pts, tol, nested)
+    if key in _order_thresholds:
+        return _order_thresholds[key]
+
+    orders = [order for order in ADAPTIVE_ORDERS if order < num_pts] + [num_pts]
+    delta0s = np.logspace(-6, np.log10(300.0), 43)
+    mus = np.linspace(-20.0, 20.0, 21)
+    if nested:
+        moments = ["IntPhiPhi", "IntPrimPrim"]
+        ratios = np.linspace(0.0, 1.0, 5)
+    else:
+        moments = ["Phi", "Prime", "PhiSq", "PrimSq"]
+        ratios = np.zeros((1,))
+    delta0, mu, ratio = np.meshgrid(delta0s, mus, ratios, indexing="ij")
+    delta0 = np.reshape(delta0, (-1,))
+    mu = np.reshape(mu, (-1,))
+    deltainf = np.reshape(ratio, (-1,)) * delta0
+
+    def chunked_moments(order, chunk=500):
+        ys = []
+        for k in range(0, mu.shape[0], chunk):
+            inds = slice(k, k + chunk)
+            ys.append(
+                gaussian_moments(mu[inds], delta0[inds], deltainf[inds], moments, order)
+            )
+        return [np.concatenate(y) for y in zip(*ys)]
+
+    y_ref = chunked_moments(num_pts)
+    thresholds = np.inf * np.ones((len(orders),))
+    for i, order in enumerate(orders[:-1]):
+        y = chunked_moments(order)
+        errs = np.max(
+            [
+                np.abs(y[j] - y_ref[j]) / np.maximum(1.0, np.abs(y_ref[j]))
+                for j in range(len(moments))
+            ],
+            axis=0,
+        )
+        errs = np.max(np.reshape(errs, (delta0s.shape[0], -1)), axis=1)
+        # order is used up to the first delta0 where it exceeds tol
+        fails = np.where(errs > tol)[0]
+        num_ok = delta0s.shape[0] if fails.shape[0] == 0 else fails[0]
+        thresholds[i] = delta0s[num_ok - 1] if num_ok > 0 else -1.0
+
+    _order_thresholds[key] = (orders, thresholds)
+    return orders, thresholds
+
+
+def quadrature_orders(delta0, num_pts, tol=ADAPTIVE_TOL, nested=False):
+    """Index of the quadrature order used for each sample.
+
+    # Arguments
+        delta0 (np.array): (M,) variances.
+        num_pts (int): Largest quadrature order.
+        tol (float): Error tolerance.
+        nested (bool): Orders of the nested moments.
+
+    # Returns
+        orders (list): Quadrature orders.
+        order_inds (np.array): (M,) index into orders.
+
+    """
+    orders, thresholds = calibrate_orders(num_pts, tol, nested)
+    # thresholds are increasing (orders that are never sufficient are -1)
+    thresholds = np.maximum.accumulate(thresholds)
+    order_inds = np.searchsorted(thresholds, delta0, side="left")
+    return orders, order_inds
+
+
+def adaptive_gaussian_moments(
+    mu, delta0, deltainf, moments, num_pts=200, tol=ADAPTIVE_TOL
+):
+    """gaussian_moments with the quadrature order chosen per sample.
+
+    Samples are bucketed by order (see calibrate_orders), each bucket is
+    evaluated batched, and the results are scattered back.
+
+    # Arguments
+        mu (np.array): (M,) means.
+        delta0 (np.array): (M,) variances.
+        deltainf (np.array): (M,) delta_inf (None if no nested moments).
+        moments (list): Moment names.
+        num_pts (int): Largest quadrature order.
+        tol (float): Error tolerance relative to num_pts quadrature.
+
+    # Returns
+        values (list): (M,) value of each moment in the order requested.
+
+    """
+    single, nested, _ = split_moments(moments, deltainf)
+    if deltainf is None:
+        mu, delta0 = np.broadcast_arrays(mu, delta0)
+    else:
+        mu, delta0, deltainf = np.broadcast_arrays(mu, delta0, deltainf)
+    values = {}
+    for group, is_nested in [(single, False), (nested, True)]:
+        if len(group) == 0:
+            continue
+        orders, order_inds = quadrature_orders(delta0, num_pts, tol, is_nested)
+        for moment in group:
+            values[moment] = np.zeros(delta0.shape)
+        for k, order in enumerate(orders):
+            inds = order_inds == k
+            if not np.any(inds):
+                continue
+            _deltainf = deltainf[inds] if is_nested else None
+            y = gaussian_moments(mu[inds], delta0[inds], _deltainf, group, order)
+            for moment, y_k in zip(group, y):
+                values[moment][inds] = y_k
+    return [values[moment] for moment in moments]
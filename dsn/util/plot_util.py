@@ -9,6 +9,7 @@ import time
 from matplotlib import animation
 from tf_util.stat_util import approx_equal
 from dsn.util.dsn_util import assess_constraints
+from dsn.util.tf_graph_util import initialize_graph_arrays
 
 
 def plot_opt(
@@ -304,6 +305,7 @@ def coloring_from_str(c_str, system, npzfile, AL_final_it):
         Z = tf.placeholder(dtype=tf.float64, shape=(1, n, system.D))
         r_t = system.simulate(Z)
         with tf.Session() as sess:
+            initialize_graph_arrays(sess)
             _r_t = sess.run(r_t, {Z: np.expand_dims(_Z, 0)})
 
         assert system.behavior["type"] == "difference"
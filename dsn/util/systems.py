@@ -10,8 +10,16 @@ from dsn.util.tf_DMFT_solvers import (
     rank1_input_chaotic_solve,
     rank2_CDD_chaotic_solve,
     rank2_CDD_static_solve,
+    rank1_spont_chaotic_solve_np,
+    rank1_input_chaotic_solve_np,
+    rank2_CDD_static_solve_np,
     warm_start,
+    solver_state_cache,
+    cached_solver_inits,
+    update_solver_state_cache,
 )
+from dsn.util.tf_graph_util import graph_array
+from dsn.util.tf_precision import get_sim_dtype, REDUCE_DTYPE
 import os
 
 DTYPE = tf.float64
@@ -42,6 +50,7 @@ class system:
         density_network_bounds (list): List of np.arrays of lower and upper bounds.
                                        None if no bounds.
         has_support_map (bool): True if there is a support transformation.
+        dtype (tf.dtype): Simulation precision (see dsn.util.tf_precision).
     """
 
     def __init__(self, fixed_params, behavior):
@@ -54,6 +63,7 @@ class system:
 		"""
         self.fixed_params = fixed_params
         self.behavior = behavior
+        self.dtype = get_sim_dtype()
         self.all_params, self.all_param_labels = self.get_all_sys_params()
         self.free_params = self.get_free_params()
         self.z_labels = self.get_z_labels()
@@ -130,6 +140,86 @@ class system:
         """
         raise NotImplementedError
 
+    def compute_suff_stats_np(self, Z, chunk_size=1000):
+        """NumPy reference of compute_suff_stats, without a tf graph or session.
+
+        The samples are processed chunk_size at a time (see suff_stats_np), so
+        the memory of the vectorized simulations stays bounded for large Z.
+        Systems the NumPy backend does not support (see np_unsupported) raise
+        a ValueError.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+            chunk_size (int): Number of samples per chunk.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        unsupported = self.np_unsupported()
+        if unsupported is not None:
+            raise ValueError(
+                "The NumPy backend does not support %s %s." % (self.name, unsupported)
+            )
+        Z = np.asarray(Z, dtype=np.float64)
+        M = Z.shape[0]
+        T_x = np.zeros((M, self.num_suff_stats))
+        for start in range(0, M, chunk_size):
+            stop = min(start + chunk_size, M)
+            T_x[start:stop] = self.suff_stats_np(Z[start:stop])
+        return T_x
+
+    def suff_stats_np(self, Z):
+        """Compute sufficient statistics of a chunk of samples in NumPy.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        raise NotImplementedError
+
+    def np_unsupported(self,):
+        """Describes what suff_stats_np does not support in this system.
+
+        # Returns
+            unsupported (str): e.g. "behavior 'ND'", or None if supported.
+
+        """
+        return None
+
+    def filter_Z_np(self, Z):
+        """Returns the values of all system parameters for (M, D) samples.
+
+        Free parameters are read from the columns of Z in `free_params` order,
+        and fixed parameters are broadcast over the samples.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            params (dict): (M,) np.array of each parameter, (M, k) for
+                           parameters with k elements.
+
+        """
+        M = Z.shape[0]
+        params = {}
+        ind = 0
+        for param in self.all_params:
+            labels = self.all_param_labels[param]
+            k = len(labels) if isinstance(labels, list) else 1
+            if param in self.fixed_params.keys():
+                value = np.reshape(np.array(self.fixed_params[param], np.float64), -1)
+                params[param] = np.tile(np.expand_dims(value, 0), [M, 1])
+            else:
+                params[param] = Z[:, ind : (ind + k)]
+                ind += k
+            if k == 1:
+                params[param] = params[param][:, 0]
+        return params
+
     def compute_mu(self,):
         """Calculate expected moment constraints given system paramterization.
 
@@ -290,11 +380,10 @@ class Linear2D(system):
             c3 = tf.divide(a3, tau)
             c4 = tf.divide(a4, tau)
 
-            beta = tf.complex(
-                tf.square(c1 + c4) - 4 * (c1 * c4 - c2 * c3), np.float64(0.0)
-            )
+            zero = tf.constant(0.0, dtype=self.dtype)
+            beta = tf.complex(tf.square(c1 + c4) - 4 * (c1 * c4 - c2 * c3), zero)
             beta_sqrt = tf.sqrt(beta)
-            real_common = tf.complex(0.5 * (c1 + c4), np.float64(0.0))
+            real_common = tf.complex(0.5 * (c1 + c4), zero)
 
             lambda_1 = real_common + 0.5 * beta_sqrt
             lambda_1_real = tf.real(lambda_1)
@@ -310,6 +399,40 @@ class Linear2D(system):
             raise NotImplementedError
         return T_x
 
+    def suff_stats_np(self, Z):
+        """NumPy version of compute_suff_stats (see system.compute_suff_stats_np).
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        if self.behavior["type"] == "oscillation":
+            params = self.filter_Z_np(Z)
+            mu_means = self.behavior["means"]
+
+            # C = A / tau are the effective linear dynamics
+            C = params["A"] / np.expand_dims(params["tau"], 1)
+            c1, c2, c3, c4 = C[:, 0], C[:, 1], C[:, 2], C[:, 3]
+
+            beta = np.square(c1 + c4) - 4 * (c1 * c4 - c2 * c3)
+            beta_sqrt = np.sqrt(beta.astype(np.complex128))
+            lambda_1 = 0.5 * (c1 + c4) + 0.5 * beta_sqrt
+            lambda_1_real = np.real(lambda_1)
+            lambda_1_imag = np.imag(lambda_1)
+            T_x_list = [
+                lambda_1_real,
+                lambda_1_imag,
+                np.square(lambda_1_real - mu_means[0]),
+                np.square(lambda_1_imag - mu_means[1]),
+            ]
+            T_x = np.stack(T_x_list, 1)
+        else:
+            raise NotImplementedError
+        return T_x
+
     def compute_mu(self,):
         """Calculate expected moment constraints given system paramterization.
 
@@ -505,11 +628,15 @@ class STGCircuit(system):
         # load fixed parameters
         for fixed_param in self.fixed_params.keys():
             if fixed_param == "g_el":
-                g_el = self.fixed_params[fixed_param] * tf.ones((M,), dtype=DTYPE)
+                g_el = self.fixed_params[fixed_param] * tf.ones((M,), dtype=self.dtype)
             elif fixed_param == "g_synA":
-                g_synA = self.fixed_params[fixed_param] * tf.ones((M,), dtype=DTYPE)
+                g_synA = self.fixed_params[fixed_param] * tf.ones(
+                    (M,), dtype=self.dtype
+                )
             elif fixed_param == "g_synB":
-                g_synB = self.fixed_params[fixed_param] * tf.ones((M,), dtype=DTYPE)
+                g_synB = self.fixed_params[fixed_param] * tf.ones(
+                    (M,), dtype=self.dtype
+                )
             else:
                 print("Error: unknown fixed parameter: %s." % fixed_param)
                 raise NotImplementedError
@@ -579,7 +706,7 @@ class STGCircuit(system):
         # obtain weights and inputs from parameterization
         g_el, g_synA, g_synB = self.filter_Z(z)
 
-        _zeros = tf.zeros((M,), dtype=DTYPE)
+        _zeros = tf.zeros((M,), dtype=self.dtype)
 
         def f(x, g_el, g_synA, g_synB):
             # x contains
@@ -662,7 +789,7 @@ class STGCircuit(system):
             ]
         )
 
-        x0 = tf.tile(tf.expand_dims(x0_np, 0), [M, 1])
+        x0 = tf.tile(tf.constant(np.expand_dims(x0_np, 0), dtype=self.dtype), [M, 1])
 
         x = x0
         if db:
@@ -721,29 +848,14 @@ class STGCircuit(system):
         """
 
         M = tf.shape(z)[1]
-        # sampling frequency
-        Fs = 1.0 / self.dt
-        # num samples for freq measurement
-        N = self.T - self.fft_start + 1 - (self.w - 1)
-
-        min_freq = 0.0
-        max_freq = 1.0
-        num_freqs = 101
-        freqs = np.linspace(min_freq, max_freq, num_freqs)
-
-        ns = np.arange(0, N)
-        phis = []
-        for i in range(num_freqs):
-            k = N * freqs[i] / Fs
-            phi = np.cos(2 * np.pi * k * ns / N) - 1j * np.sin(2 * np.pi * k * ns / N)
-            phis.append(phi)
+        freqs, Phi = self.get_freq_basis()
 
         # [T, K]
-        Phi = tf.constant(np.array(phis).T, dtype=tf.complex128)
+        Phi = graph_array(Phi, "Phi", dtype=tf.complex128)
 
         alpha = 100
 
-        avg_filter = (1.0 / self.w) * tf.ones((self.w, 1, 1), dtype=DTYPE)
+        avg_filter = (1.0 / self.w) * tf.ones((self.w, 1, 1), dtype=self.dtype)
 
         # [T+1, M, 5]
         x_t = self.simulate(z, db=False)
@@ -755,6 +867,8 @@ class STGCircuit(system):
             v_rect_LPF = tf.nn.conv1d(v_rect, avg_filter, stride=1, padding="VALID")[
                 :, :, 0
             ]
+            # The power normalization with alpha=100 needs double precision.
+            v_rect_LPF = tf.cast(v_rect_LPF, REDUCE_DTYPE)
 
             v_rect_LPF = v_rect_LPF - tf.expand_dims(tf.reduce_mean(v_rect_LPF, 1), 1)
 
@@ -772,6 +886,189 @@ class STGCircuit(system):
 
         return T_x
 
+    def get_freq_basis(self,):
+        """Returns the frequencies and DFT basis of the frequency statistics.
+
+        # Returns
+            freqs (np.array): (K,) frequencies.
+            Phi (np.array): (N, K) complex DFT basis of the filtered voltages.
+
+        """
+        # sampling frequency
+        Fs = 1.0 / self.dt
+        # num samples for freq measurement
+        N = self.T - self.fft_start + 1 - (self.w - 1)
+
+        min_freq = 0.0
+        max_freq = 1.0
+        num_freqs = 101
+        freqs = np.linspace(min_freq, max_freq, num_freqs)
+
+        ns = np.arange(0, N)
+        phis = []
+        for i in range(num_freqs):
+            k = N * freqs[i] / Fs
+            phi = np.cos(2 * np.pi * k * ns / N) - 1j * np.sin(2 * np.pi * k * ns / N)
+            phis.append(phi)
+
+        return freqs, np.array(phis).T
+
+    def simulate_np(self, Z):
+        """NumPy version of simulate, vectorized over the samples.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            v_t (np.array): (T+1, M, 5) simulated membrane potentials.
+
+        """
+        M = Z.shape[0]
+
+        # same constants as simulate
+        C_m = 1.0e-9
+        V_leak = -40.0e-3
+        V_Ca = 100.0e-3
+        V_k = -80.0e-3
+        V_h = -20.0e-3
+        V_syn = -75.0e-3
+        v_1 = 0.0
+        v_2 = 20.0e-3
+        v_3 = 0.0
+        v_4 = 15.0e-3
+        v_5 = 78.3e-3
+        v_6 = 10.5e-3
+        v_7 = -42.2e-3
+        v_8 = 87.3e-3
+        v_9 = 5.0e-3
+        v_th = -25.0e-3
+        g_Ca = 1e-6 * np.array([1.9e-2, 1.9e-2, 1.7e-2, 8.5e-3, 8.5e-3])
+        g_k = 1e-6 * np.array([3.9e-2, 3.9e-2, 1.9e-2, 1.5e-2, 1.5e-2])
+        g_h = 1e-6 * np.array([2.5e-2, 2.5e-2, 8.0e-3, 1.0e-2, 1.0e-2])
+        g_leak = 1.0e-4 * (1e-6)
+        phi_N = 2
+
+        # convert DSN emissions to nS
+        params = self.filter_Z_np(Z)
+        g_el, g_synA, g_synB = [
+            1e-9 * params[param] if param in self.free_params else params[param]
+            for param in ["g_el", "g_synA", "g_synB"]
+        ]
+        _zeros = np.zeros((M,))
+
+        def f(x):
+            V_m = x[:, :5]
+            N = x[:, 5:10]
+            H = x[:, 10:]
+
+            M_inf = 0.5 * (1.0 + np.tanh((V_m - v_1) / v_2))
+            N_inf = 0.5 * (1.0 + np.tanh((V_m - v_3) / v_4))
+            H_inf = 1.0 / (1.0 + np.exp((V_m + v_5) / v_6))
+
+            S_inf = 1.0 / (1.0 + np.exp((v_th - V_m) / v_9))
+
+            I_leak = g_leak * (V_m - V_leak)
+            I_Ca = g_Ca * M_inf * (V_m - V_Ca)
+            I_k = g_k * N * (V_m - V_k)
+            I_h = g_h * H * (V_m - V_h)
+
+            I_elec = np.stack(
+                [
+                    _zeros,
+                    g_el * (V_m[:, 1] - V_m[:, 2]),
+                    g_el * (V_m[:, 2] - V_m[:, 1] + V_m[:, 2] - V_m[:, 4]),
+                    _zeros,
+                    g_el * (V_m[:, 4] - V_m[:, 2]),
+                ],
+                axis=1,
+            )
+
+            I_syn = np.stack(
+                [
+                    g_synB * S_inf[:, 1] * (V_m[:, 0] - V_syn),
+                    g_synB * S_inf[:, 0] * (V_m[:, 1] - V_syn),
+                    g_synA * S_inf[:, 0] * (V_m[:, 2] - V_syn)
+                    + g_synA * S_inf[:, 3] * (V_m[:, 2] - V_syn),
+                    g_synB * S_inf[:, 4] * (V_m[:, 3] - V_syn),
+                    g_synB * S_inf[:, 3] * (V_m[:, 4] - V_syn),
+                ],
+                axis=1,
+            )
+
+            I_total = I_leak + I_Ca + I_k + I_h + I_elec + I_syn
+
+            lambda_N = (phi_N) * np.cosh((V_m - v_3) / (2 * v_4))
+            tau_h = (272.0 - (-1499.0 / (1.0 + np.exp((-V_m + v_7) / v_8)))) / 1000.0
+
+            dVmdt = (1.0 / C_m) * (-I_total)
+            dNdt = lambda_N * (N_inf - N)
+            dHdt = (H_inf - H) / tau_h
+
+            return np.concatenate((dVmdt, dNdt, dHdt), axis=1)
+
+        x0_np = np.array(
+            [
+                -0.04169771,
+                -0.04319491,
+                0.00883992,
+                -0.06879824,
+                0.03048103,
+                0.00151316,
+                0.19784773,
+                0.56514935,
+                0.12214069,
+                0.35290397,
+                0.08614699,
+                0.04938177,
+                0.05568701,
+                0.07007949,
+                0.05790969,
+            ]
+        )
+
+        x = np.tile(np.expand_dims(x0_np, 0), [M, 1])
+        v_t = np.zeros((self.T + 1, M, 5))
+        v_t[0] = x[:, :5]
+        for i in range(self.T):
+            x = x + f(x) * self.dt
+            v_t[i + 1] = x[:, :5]
+        return v_t
+
+    def np_unsupported(self,):
+        """See system.np_unsupported."""
+        if self.behavior["type"] != "freq":
+            return "behavior '%s'" % self.behavior["type"]
+        return None
+
+    def suff_stats_np(self, Z):
+        """NumPy version of compute_suff_stats (see system.compute_suff_stats_np).
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        M = Z.shape[0]
+        freqs, Phi = self.get_freq_basis()
+        N = Phi.shape[0]
+        alpha = 100
+
+        # (M5, T-fft+1)
+        v_t = self.simulate_np(Z)[self.fft_start :]
+        v = np.reshape(np.transpose(v_t, [1, 2, 0]), (M * 5, -1))
+        v_rect = np.maximum(v, 0.0)
+        v_rect_LPF = sum([v_rect[:, i : (i + N)] for i in range(self.w)]) / self.w
+        v_rect_LPF = v_rect_LPF - np.mean(v_rect_LPF, axis=1, keepdims=True)
+
+        V_pow = np.power(np.abs(np.dot(v_rect_LPF, Phi)), alpha)
+        freq_id = V_pow / np.sum(V_pow, axis=1, keepdims=True)
+
+        f_h = np.reshape(np.dot(freq_id, freqs), (M, 5))
+        T_x = np.concatenate((f_h, np.square(f_h - self.mu[:5])), axis=1)
+        return T_x
+
     def compute_mu(self,):
         """Calculate expected moment constraints given system paramterization.
 
@@ -1216,97 +1513,123 @@ class V1Circuit(system):
         for fixed_param in self.fixed_params.keys():
             if fixed_param == "W_EE":
                 W_EE = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_XE":
                 W_XE = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_PE":
                 W_PE = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_SE":
                 W_SE = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_VE":
                 W_VE = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_EP":
                 W_EP = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_PP":
                 W_PP = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_VP":
                 W_VP = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
 
             elif fixed_param == "W_ES":
                 W_ES = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_PS":
                 W_PS = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
             elif fixed_param == "W_VS":
                 W_VS = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
 
             elif fixed_param == "W_SV":
                 W_SV = self.fixed_params[fixed_param] * tf.ones(
-                    (self.C, M), dtype=DTYPE
+                    (self.C, M), dtype=self.dtype
                 )
 
             elif fixed_param == "b_E":
-                b_E = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                b_E = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=self.dtype)
             elif fixed_param == "b_P":
-                b_P = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                b_P = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=self.dtype)
             elif fixed_param == "b_S":
-                b_S = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                b_S = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=self.dtype)
             elif fixed_param == "b_V":
-                b_V = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                b_V = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=self.dtype)
 
             elif fixed_param == "h_FFE":
-                h_FFE = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_FFE = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_FFP":
-                h_FFP = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_FFP = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
 
             elif fixed_param == "h_LATE":
-                h_LATE = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_LATE = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_LATP":
-                h_LATP = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_LATP = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_LATS":
-                h_LATS = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_LATS = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_LATV":
-                h_LATV = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_LATV = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
 
             elif fixed_param == "h_RUNE":
-                h_RUNE = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_RUNE = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_RUNP":
-                h_RUNP = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_RUNP = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_RUNS":
-                h_RUNS = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_RUNS = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
             elif fixed_param == "h_RUNV":
-                h_RUNV = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                h_RUNV = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
 
             elif fixed_param == "tau":
-                tau = self.fixed_params[fixed_param] * tf.ones((self.C, M), dtype=DTYPE)
+                tau = self.fixed_params[fixed_param] * tf.ones(
+                    (self.C, M), dtype=self.dtype
+                )
             elif fixed_param == "n":
-                n = self.fixed_params[fixed_param] * tf.ones((self.C, M), dtype=DTYPE)
+                n = self.fixed_params[fixed_param] * tf.ones(
+                    (self.C, M), dtype=self.dtype
+                )
             elif fixed_param == "s_0":
-                s_0 = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                s_0 = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=self.dtype)
             elif fixed_param == "a":
-                a = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                a = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=self.dtype)
             elif fixed_param == "c_50":
-                c_50 = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                c_50 = self.fixed_params[fixed_param] * tf.ones(
+                    (1, M), dtype=self.dtype
+                )
 
             else:
                 print("Error: unknown fixed parameter: %s." % fixed_param)
@@ -1314,39 +1637,39 @@ class V1Circuit(system):
 
         # Gather weights into the dynamics matrix W [C,M,4,4]
         W_EX = tf.stack(
-            [W_EE, -W_EP, -W_ES, tf.zeros((self.C, M), dtype=DTYPE)], axis=2
+            [W_EE, -W_EP, -W_ES, tf.zeros((self.C, M), dtype=self.dtype)], axis=2
         )
         if self.model_opts["XE"]:
             W_PX = tf.stack(
-                [W_XE, -W_PP, -W_PS, tf.zeros((self.C, M), dtype=DTYPE)], axis=2
+                [W_XE, -W_PP, -W_PS, tf.zeros((self.C, M), dtype=self.dtype)], axis=2
             )
             W_SX = tf.stack(
                 [
                     W_XE,
-                    tf.zeros((self.C, M), dtype=DTYPE),
-                    tf.zeros((self.C, M), dtype=DTYPE),
+                    tf.zeros((self.C, M), dtype=self.dtype),
+                    tf.zeros((self.C, M), dtype=self.dtype),
                     -W_SV,
                 ],
                 axis=2,
             )
             W_VX = tf.stack(
-                [W_XE, -W_VP, -W_VS, tf.zeros((self.C, M), dtype=DTYPE)], axis=2
+                [W_XE, -W_VP, -W_VS, tf.zeros((self.C, M), dtype=self.dtype)], axis=2
             )
         else:
             W_PX = tf.stack(
-                [W_PE, -W_PP, -W_PS, tf.zeros((self.C, M), dtype=DTYPE)], axis=2
+                [W_PE, -W_PP, -W_PS, tf.zeros((self.C, M), dtype=self.dtype)], axis=2
             )
             W_SX = tf.stack(
                 [
                     W_SE,
-                    tf.zeros((self.C, M), dtype=DTYPE),
-                    tf.zeros((self.C, M), dtype=DTYPE),
+                    tf.zeros((self.C, M), dtype=self.dtype),
+                    tf.zeros((self.C, M), dtype=self.dtype),
                     -W_SV,
                 ],
                 axis=2,
             )
             W_VX = tf.stack(
-                [W_VE, -W_VP, -W_VS, tf.zeros((self.C, M), dtype=DTYPE)], axis=2
+                [W_VE, -W_VP, -W_VS, tf.zeros((self.C, M), dtype=self.dtype)], axis=2
             )
         W = tf.stack([W_EX, W_PX, W_SX, W_VX], axis=2)
 
@@ -1357,8 +1680,8 @@ class V1Circuit(system):
                 [
                     h_FFE,
                     h_FFP,
-                    tf.zeros((1, M), dtype=DTYPE),
-                    tf.zeros((1, M), dtype=DTYPE),
+                    tf.zeros((1, M), dtype=self.dtype),
+                    tf.zeros((1, M), dtype=self.dtype),
                 ],
                 axis=2,
             ),
@@ -1433,7 +1756,7 @@ class V1Circuit(system):
         # but convenient modularization for now
         t = 1.0
         bounds = self.behavior["bounds"]
-        r_ss = self.r_t[-1, :, :, :, 0]  # (C x M x 4)
+        r_ss = tf.cast(self.r_t[-1, :, :, :, 0], REDUCE_DTYPE)  # (C x M x 4)
 
         barriers = []
         ind = 0
@@ -1466,7 +1789,7 @@ class V1Circuit(system):
 
         # initial conditions
         r0 = tf.constant(
-            np.expand_dims(np.expand_dims(self.init_conds, 0), 0), dtype=DTYPE
+            np.expand_dims(np.expand_dims(self.init_conds, 0), 0), dtype=self.dtype
         )
         r0 = tf.tile(r0, [self.C, M, 1, 1])
         # [K,M,4,1]
@@ -1492,7 +1815,7 @@ class V1Circuit(system):
         # going to 1e45 doesnt work for some reason?
 
         # time axis
-        t = np.arange(0, self.T * self.dt, self.dt)
+        t = tf.constant(np.arange(0, self.T * self.dt, self.dt), dtype=self.dtype)
 
         # simulate ODE
         r_t = tf.contrib.integrate.odeint_fixed(f, r0, t, method="rk4")
@@ -1619,6 +1942,145 @@ class V1Circuit(system):
 
         return T_x
 
+    def compute_h_np(self, params):
+        """NumPy version of compute_h.
+
+        # Arguments
+            params (dict): (M,) parameter values (see system.filter_Z_np).
+
+        # Returns
+            h (np.array): (C, M, 4) inputs of each condition.
+
+        """
+        M = params["b_E"].shape[0]
+        zeros = np.zeros((M,))
+        b = np.stack([params["b_%s" % pop] for pop in ["E", "P", "S", "V"]], 1)
+        h_FF = np.stack([params["h_FFE"], params["h_FFP"], zeros, zeros], 1)
+        h_LAT = np.stack([params["h_LAT%s" % pop] for pop in ["E", "P", "S", "V"]], 1)
+        h_RUN = np.stack([params["h_RUN%s" % pop] for pop in ["E", "P", "S", "V"]], 1)
+        s_0 = params["s_0"]
+
+        hs = []
+        for c in self.behavior["c_vals"]:
+            # compute g_FF for this condition
+            if self.model_opts["g_FF"] == "c":
+                g_FF = c * np.ones((M,))
+            elif self.model_opts["g_FF"] == "saturate":
+                a = params["a"]
+                g_FF = np.power(c, a) / (np.power(params["c_50"], a) + np.power(c, a))
+            else:
+                raise NotImplementedError
+
+            for s in self.behavior["s_vals"]:
+                # compute g_LAT for this condition
+                if self.model_opts["g_LAT"] == "linear":
+                    g_LAT = c * np.maximum(s - s_0, 0.0)
+                elif self.model_opts["g_LAT"] == "square":
+                    g_LAT = c * np.maximum(np.square(s) - np.square(s_0), 0.0)
+                else:
+                    raise NotImplementedError
+
+                for r in self.behavior["r_vals"]:
+                    if self.model_opts["g_RUN"] != "r":
+                        raise NotImplementedError
+                    g_RUN = r
+                    h_csr = (
+                        b
+                        + np.expand_dims(g_FF, 1) * h_FF
+                        + np.expand_dims(g_LAT, 1) * h_LAT
+                        + g_RUN * h_RUN
+                    )
+                    hs.append(h_csr)
+        return np.stack(hs, axis=0)
+
+    def simulate_np(self, Z):
+        """NumPy version of simulate, vectorized over samples and conditions.
+
+        Only the final rates are kept.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            r_ss (np.array): (C, M, 4) final rates of each condition.
+            W (np.array): (M, 4, 4) dynamics matrices.
+
+        """
+        M = Z.shape[0]
+        params = self.filter_Z_np(Z)
+        zeros = np.zeros((M,))
+        if self.model_opts["XE"]:
+            W_PE = W_SE = W_VE = params["W_XE"]
+        else:
+            W_PE, W_SE, W_VE = params["W_PE"], params["W_SE"], params["W_VE"]
+        W_EX = [params["W_EE"], -params["W_EP"], -params["W_ES"], zeros]
+        W_PX = [W_PE, -params["W_PP"], -params["W_PS"], zeros]
+        W_SX = [W_SE, zeros, zeros, -params["W_SV"]]
+        W_VX = [W_VE, -params["W_VP"], -params["W_VS"], zeros]
+        W = np.stack([np.stack(W_row, 1) for W_row in [W_EX, W_PX, W_SX, W_VX]], 1)
+
+        h = self.compute_h_np(params)
+        # (1, M, 1)
+        tau = np.expand_dims(np.expand_dims(params["tau"], 0), 2)
+        n = np.expand_dims(np.expand_dims(params["n"], 0), 2)
+        pow_eps = 1e-16
+
+        def f(r):
+            Wr = np.einsum("mij,cmj->cmi", W, r)
+            drdt = (-r + np.power(np.maximum(Wr + h, 0.0) + pow_eps, n)) / tau
+            return np.clip(drdt, -1e30, 1e30)
+
+        # the fixed grid rk4 steps of simulate
+        t = np.arange(0, self.T * self.dt, self.dt)
+        r = np.tile(np.reshape(self.init_conds, (1, 1, 4)), [self.C, M, 1])
+        for i in range(t.shape[0] - 1):
+            dt = t[i + 1] - t[i]
+            k1 = f(r)
+            k2 = f(r + dt * k1 / 2)
+            k3 = f(r + dt * k2 / 2)
+            k4 = f(r + dt * k3)
+            r = r + (k1 + 2 * k2 + 2 * k3 + k4) * (dt / 6)
+        return r, W
+
+    def suff_stats_np(self, Z):
+        """NumPy version of compute_suff_stats (see system.compute_suff_stats_np).
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        r_ss, W = self.simulate_np(Z)
+        if self.behavior["type"] == "ISN_coeff":
+            assert self.fixed_params["n"] == 2.0
+            u_E = np.sqrt(r_ss[0, :, 0])
+            ISN = 1 - 2 * u_E * W[:, 0, 0]
+            T_x_list = [ISN, np.square(ISN - self.mu[0])]
+            if "silenced" in self.behavior.keys():
+                if self.behavior["silenced"] == "S":
+                    T_x_list.append(r_ss[0, :, 2])
+                elif self.behavior["silenced"] == "V":
+                    T_x_list.append(r_ss[0, :, 3])
+                else:
+                    raise NotImplementedError()
+            T_x = np.stack(T_x_list, axis=1)
+
+        elif self.behavior["type"] == "difference":
+            alpha_ind = ["E", "P", "S", "V"].index(self.behavior["alpha"])
+            diff_ss = r_ss[1, :, alpha_ind] - r_ss[0, :, alpha_ind]
+            T_x = np.stack((diff_ss, np.square(diff_ss - self.mu[0])), axis=1)
+
+        elif self.behavior["type"] == "rates":
+            r_ss_var = np.square(r_ss[0] - np.expand_dims(self.mu[:4], 0))
+            T_x = np.concatenate((r_ss[0], r_ss_var), axis=1)
+
+        else:
+            raise NotImplementedError
+
+        return T_x
+
     def compute_mu(self,):
         """Calculate expected moment constraints given system paramterization.
 
@@ -2011,59 +2473,59 @@ class SCCircuit(system):
             for fixed_param in self.fixed_params.keys():
                 if fixed_param == "sW_P":
                     sW_P = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "sW_A":
                     sW_A = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "vW_PA":
                     vW_PA = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "vW_AP":
                     vW_AP = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "dW_PA":
                     dW_PA = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "dW_AP":
                     dW_AP = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "hW_P":
                     hW_P = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "hW_A":
                     hW_A = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "E_constant":
                     E_constant = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_Pbias":
                     E_Pbias = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_Prule":
                     E_Prule = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_Arule":
                     E_Arule = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_choice":
                     E_choice = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_light":
                     E_light = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
 
                 else:
@@ -2121,43 +2583,43 @@ class SCCircuit(system):
             for fixed_param in self.fixed_params.keys():
                 if fixed_param == "sW":
                     sW = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "vW":
                     vW = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "dW":
                     dW = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "hW":
                     hW = self.fixed_params[fixed_param] * tf.ones(
-                        (self.C, M), dtype=DTYPE
+                        (self.C, M), dtype=self.dtype
                     )
                 elif fixed_param == "E_constant":
                     E_constant = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_Pbias":
                     E_Pbias = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_Prule":
                     E_Prule = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_Arule":
                     E_Arule = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_choice":
                     E_choice = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
                 elif fixed_param == "E_light":
                     E_light = self.fixed_params[fixed_param] * tf.ones(
-                        (1, 1, M, 1, 1), dtype=DTYPE
+                        (1, 1, M, 1, 1), dtype=self.dtype
                     )
 
                 else:
@@ -2172,58 +2634,86 @@ class SCCircuit(system):
             W = tf.stack([Wrow1, Wrow2, Wrow3, Wrow4], axis=2)
 
         # input current time courses
-        I_constant = E_constant * tf.ones((self.T, 1, 1, 4, 1), dtype=DTYPE)
-
-        I_Pbias = np.zeros((self.T, 4))
-        I_Pbias[self.t < self.T * self.dt] = np.array([1, 0, 0, 1])
-        I_Pbias = np.expand_dims(np.expand_dims(np.expand_dims(I_Pbias, 2), 1), 1)
-        I_Pbias = E_Pbias * tf.constant(I_Pbias)
-
-        I_Prule = np.zeros((self.T, 4))
-        I_Prule[self.t < 1.2] = np.array([1, 0, 0, 1])
-        I_Prule = np.expand_dims(np.expand_dims(np.expand_dims(I_Prule, 2), 1), 1)
-        I_Prule = E_Prule * tf.constant(I_Prule)
-
-        I_Arule = np.zeros((self.T, 4))
-        I_Arule[self.t < 1.2] = np.array([0, 1, 1, 0])
-        I_Arule = np.expand_dims(np.expand_dims(np.expand_dims(I_Arule, 2), 1), 1)
-        I_Arule = E_Arule * tf.constant(I_Arule)
-
-        I_choice = np.zeros((self.T, 4))
-        I_choice[self.t > 1.2] = np.array([1, 1, 1, 1])
-        I_choice = np.expand_dims(np.expand_dims(np.expand_dims(I_choice, 2), 1), 1)
-        I_choice = E_choice * tf.constant(I_choice)
-
-        I_lightL = np.zeros((self.T, 4))
-        I_lightL[self.t > 1.2] = np.array([1, 1, 0, 0])
-        I_lightL = np.expand_dims(np.expand_dims(np.expand_dims(I_lightL, 2), 1), 1)
-        I_lightL = E_light * tf.constant(I_lightL)
-
-        I_lightR = np.zeros((self.T, 4))
-        I_lightR[self.t > 1.2] = np.array([0, 0, 1, 1])
-        I_lightR = np.expand_dims(np.expand_dims(np.expand_dims(I_lightR, 2), 1), 1)
-        I_lightR = E_light * tf.constant(I_lightR)
+        I_t = self.get_input_time_courses()
+        I_constant = E_constant * tf.ones((self.T, 1, 1, 4, 1), dtype=self.dtype)
+
+        I_Pbias = np.expand_dims(np.expand_dims(np.expand_dims(I_t["Pbias"], 2), 1), 1)
+        I_Pbias = E_Pbias * graph_array(I_Pbias, "I_Pbias", dtype=self.dtype)
+
+        I_Prule = np.expand_dims(np.expand_dims(np.expand_dims(I_t["Prule"], 2), 1), 1)
+        I_Prule = E_Prule * graph_array(I_Prule, "I_Prule", dtype=self.dtype)
+
+        I_Arule = np.expand_dims(np.expand_dims(np.expand_dims(I_t["Arule"], 2), 1), 1)
+        I_Arule = E_Arule * graph_array(I_Arule, "I_Arule", dtype=self.dtype)
+
+        I_choice = np.expand_dims(
+            np.expand_dims(np.expand_dims(I_t["choice"], 2), 1), 1
+        )
+        I_choice = E_choice * graph_array(I_choice, "I_choice", dtype=self.dtype)
+
+        I_lightL = np.expand_dims(
+            np.expand_dims(np.expand_dims(I_t["lightL"], 2), 1), 1
+        )
+        I_lightL = E_light * graph_array(I_lightL, "I_lightL", dtype=self.dtype)
+
+        I_lightR = np.expand_dims(
+            np.expand_dims(np.expand_dims(I_t["lightR"], 2), 1), 1
+        )
+        I_lightR = E_light * graph_array(I_lightR, "I_lightR", dtype=self.dtype)
 
         I_LP = I_constant + I_Pbias + I_Prule + I_choice + I_lightL
         I_LA = I_constant + I_Pbias + I_Arule + I_choice + I_lightL
         # Gather inputs into I [T,C,1,4,1]
+        I_rules = {"P": I_LP, "A": I_LA}
+        I = tf.concat([I_rules[rule] for rule in self.get_condition_rules()], axis=1)
+
+        eta = graph_array(self.get_eta(), "eta", dtype=self.dtype)
+
+        return W, I, eta
+
+    def get_input_time_courses(self,):
+        """Returns the (T,4) time courses of the unit strength task inputs.
+
+        # Returns
+            I_t (dict): Time course of each of the Pbias, Prule, Arule,
+                        choice, lightL and lightR inputs.
+
+        """
+        patterns = [
+            ("Pbias", self.t < self.T * self.dt, [1, 0, 0, 1]),
+            ("Prule", self.t < 1.2, [1, 0, 0, 1]),
+            ("Arule", self.t < 1.2, [0, 1, 1, 0]),
+            ("choice", self.t > 1.2, [1, 1, 1, 1]),
+            ("lightL", self.t > 1.2, [1, 1, 0, 0]),
+            ("lightR", self.t > 1.2, [0, 0, 1, 1]),
+        ]
+        I_t = {}
+        for name, t_on, pattern in patterns:
+            I_t[name] = np.zeros((self.T, 4))
+            I_t[name][t_on] = np.array(pattern)
+        return I_t
+
+    def get_condition_rules(self,):
+        """Returns the task rule ("P" or "A") of each of the C conditions."""
         if self.behavior["type"] in ["inforoute", "feasible"]:
             # this is just a stepping stone, will implement full resps
             if self.C == 1:
-                I = I_LP
+                return ["P"]
             elif self.C == 2:
-                I = tf.concat((I_LP, I_LP), axis=1)
+                return ["P", "P"]
             elif self.C == 4:
-                I = tf.concat((I_LP, I_LP, I_LA, I_LA), axis=1)
+                return ["P", "P", "A", "A"]
             elif self.C == 6:
-                I = tf.concat((I_LP, I_LP, I_LP, I_LA, I_LA, I_LA), axis=1)
+                return ["P", "P", "P", "A", "A", "A"]
             else:
                 raise NotImplementedError
         elif self.behavior["type"] == "WTA":
-            I = tf.concat((I_LP, I_LA), axis=1)
+            return ["P", "A"]
         else:
             raise NotImplementedError
 
+    def get_eta(self,):
+        """Returns the [T,C,1,1,1] inactivation time courses of the conditions."""
         # just took roughly middle value
         opto_strength = 0.7
         eta = np.ones((self.T, self.C, 1, 1, 1), dtype=np.float64)
@@ -2258,10 +2748,7 @@ class SCCircuit(system):
                     np.logical_and(0.8 <= self.t, self.t <= 1.2), 4, :, :, :
                 ] = opto_strength
                 eta[1.2 <= self.t, 5, :, :, :] = opto_strength
-
-        eta = tf.constant(eta, dtype=DTYPE)
-
-        return W, I, eta
+        return eta
 
     def compute_I_x(self, z, T_x):
         # Not efficient (repeated computation)
@@ -2269,7 +2756,7 @@ class SCCircuit(system):
         t = 1.0
         bounds = self.behavior["bounds"]
         # [T, C, M, D, trials]
-        v_LP = self.v_t[-1, :, :, 0, :]
+        v_LP = tf.cast(self.v_t[-1, :, :, 0, :], REDUCE_DTYPE)
         E_v_LP = tf.reduce_mean(v_LP, 2)
         Var_v_LP = tf.reduce_mean(tf.square(v_LP - tf.expand_dims(E_v_LP, 2)), 2)
         barriers = []
@@ -2303,9 +2790,10 @@ class SCCircuit(system):
 
         # obtain weights and inputs from parameterization
         W, I, eta = self.filter_Z(z)
+        w = graph_array(self.w, "w", dtype=self.dtype)
 
         # initial conditions
-        v0 = 0.1 * tf.ones((self.C, M, 4, self.N), dtype=DTYPE)
+        v0 = 0.1 * tf.ones((self.C, M, 4, self.N), dtype=self.dtype)
         # I have to use 1.9 on habanero with their cuda versions
         if tf.__version__ == "1.9.0":
             u0 = beta * tf.atanh(2 * v0 - 1) - theta
@@ -2317,7 +2805,7 @@ class SCCircuit(system):
         v_t_list = [v]
         u_t_list = [u]
         for i in range(1, self.T):
-            du = (self.dt / tau) * (-u + tf.matmul(W, v) + I[i] + sigma * self.w[i])
+            du = (self.dt / tau) * (-u + tf.matmul(W, v) + I[i] + sigma * w[i])
             u = u + du
             v = eta[i] * (0.5 * tf.tanh((u - theta) / beta) + 0.5)
             v_t_list.append(v)
@@ -2363,15 +2851,16 @@ class SCCircuit(system):
 
         v_t = self.get_v_t(z)
         # [T, C, M, D, trials]
-        v_LP = v_t[
-            -1, :, :, 0, :
-        ]  # we're looking at LP in the standard L Pro condition
+        # Trial statistics are reduced in double precision.
+        v_LP = tf.cast(
+            v_t[-1, :, :, 0, :], REDUCE_DTYPE
+        )  # we're looking at LP in the standard L Pro condition
         E_v_LP = tf.reduce_mean(v_LP, 2)
         Var_v_LP = tf.reduce_mean(tf.square(v_LP - tf.expand_dims(E_v_LP, 2)), 2)
 
-        v_RP = v_t[
-            -1, :, :, 3, :
-        ]  # we're looking at RP in the standard A Pro condition
+        v_RP = tf.cast(
+            v_t[-1, :, :, 3, :], REDUCE_DTYPE
+        )  # we're looking at RP in the standard A Pro condition
         E_v_RP = tf.reduce_mean(v_RP, 2)
         Var_v_RP = tf.reduce_mean(tf.square(v_RP - tf.expand_dims(E_v_RP, 2)), 2)
 
@@ -2464,6 +2953,118 @@ class SCCircuit(system):
 
         return T_x
 
+    def simulate_np(self, Z):
+        """NumPy version of simulate, vectorized over samples, conditions and
+        frozen noises.
+
+        Only the final rates are kept.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            v (np.array): (C, M, 4, N) final rates.
+
+        """
+        M = Z.shape[0]
+
+        # same constants as simulate
+        theta = 0.05
+        beta = 0.5
+        tau = 0.09
+        sigma = 1.0
+
+        params = self.filter_Z_np(Z)
+        if self.model_opts["params"] == "full":
+            sW_P, sW_A = params["sW_P"], params["sW_A"]
+            vW_PA, vW_AP = params["vW_PA"], params["vW_AP"]
+            dW_PA, dW_AP = params["dW_PA"], params["dW_AP"]
+            hW_P, hW_A = params["hW_P"], params["hW_A"]
+        elif self.model_opts["params"] == "reduced":
+            sW_P = sW_A = params["sW"]
+            vW_PA = vW_AP = params["vW"]
+            dW_PA = dW_AP = params["dW"]
+            hW_P = hW_A = params["hW"]
+        # (M,4,4)
+        W = np.stack(
+            [
+                np.stack([sW_P, vW_PA, dW_PA, hW_P], 1),
+                np.stack([vW_AP, sW_A, hW_A, dW_AP], 1),
+                np.stack([dW_AP, hW_A, sW_A, vW_AP], 1),
+                np.stack([hW_P, dW_PA, vW_PA, sW_P], 1),
+            ],
+            1,
+        )
+
+        # input current time courses (T,M,4)
+        I_t = self.get_input_time_courses()
+
+        def input_t(names):
+            I = np.expand_dims(np.expand_dims(params["E_constant"], 0), 2)
+            for name, E in names:
+                I = I + np.expand_dims(I_t[name], 1) * np.expand_dims(params[E], 1)
+            return I
+
+        I_LP = [("Pbias", "E_Pbias"), ("Prule", "E_Prule")]
+        I_LA = [("Pbias", "E_Pbias"), ("Arule", "E_Arule")]
+        I_choice = [("choice", "E_choice"), ("lightL", "E_light")]
+        I_rules = {"P": input_t(I_LP + I_choice), "A": input_t(I_LA + I_choice)}
+        # (T,C,M,4,1)
+        I = np.stack([I_rules[rule] for rule in self.get_condition_rules()], 1)
+        I = np.expand_dims(I, 4)
+        eta = self.get_eta()
+        # (T,1,1,4,N)
+        w = self.w
+
+        v = 0.1 * np.ones((self.C, M, 4, self.N))
+        u = beta * np.arctanh(2 * v - 1) - theta
+        for i in range(1, self.T):
+            du = (self.dt / tau) * (-u + np.matmul(W, v) + I[i] + sigma * w[i])
+            u = u + du
+            v = eta[i] * (0.5 * np.tanh((u - theta) / beta) + 0.5)
+        return v
+
+    def np_unsupported(self,):
+        """See system.np_unsupported."""
+        if self.behavior["type"] != "WTA":
+            return "behavior '%s'" % self.behavior["type"]
+        return None
+
+    def suff_stats_np(self, Z):
+        """NumPy version of compute_suff_stats (see system.compute_suff_stats_np).
+
+        Only the 'WTA' behavior is supported.
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        v = self.simulate_np(Z)
+        # (C,M,N) LP rates in L Pro, RP rates in A Pro
+        v_LP = v[:, :, 0, :]
+        v_RP = v[:, :, 3, :]
+        E_v_LP = np.mean(v_LP, 2)
+        E_v_RP = np.mean(v_RP, 2)
+        Var_v_LP = np.mean(np.square(v_LP - np.expand_dims(E_v_LP, 2)), 2)
+        Var_v_RP = np.mean(np.square(v_RP - np.expand_dims(E_v_RP, 2)), 2)
+        Bern_Var_Err_L = Var_v_LP - (E_v_LP * (1.0 - E_v_LP))
+        Bern_Var_Err_R = Var_v_RP - (E_v_RP * (1.0 - E_v_RP))
+        square_diff = np.mean(np.square(v_LP - v_RP), axis=2)
+
+        mu_p = self.behavior["means"]
+        p_hats = np.stack((E_v_LP[0], E_v_RP[1]), axis=1)
+        p_hat_vars = np.stack(
+            (np.square(E_v_LP[0] - mu_p[0]), np.square(E_v_RP[1] - mu_p[1])), axis=1
+        )
+        Bern_Var_Err = np.stack((Bern_Var_Err_L[0], Bern_Var_Err_R[1]), axis=1)
+        T_x = np.concatenate(
+            (p_hats, p_hat_vars, Bern_Var_Err, np.transpose(square_diff)), axis=1
+        )
+        return T_x
+
     def compute_mu(self,):
         """Calculate expected moment constraints given system paramterization.
 
@@ -2521,8 +3122,28 @@ class LowRankRNN(system):
           * model_opts[`'input_type'`] 
             * `'spont'` (default) No input.
             * `'gaussian'` (default) Gaussian input.
+          * model_opts[`'integrals'`] 
+            * `'quadrature'` (default) Gauss-Hermite quadrature.
+            * `'adaptive'` Quadrature with per-sample order chosen from delta0.
+            * `'tables'` Interpolated precomputed tables (see dsn.util.np_moment_tables).
+          * model_opts[`'solver'`] 
+            * `'langevin'` (default) Unrolled Langevin dynamics.
+            * `'while'` Langevin dynamics in a while loop, stopping at convergence.
+            * `'anderson'` Anderson accelerated Langevin dynamics.
+            * `'newton'` Newton's method with per-sample Jacobians.
+          * model_opts[`'implicit_grad'`] 
+            * `False` (default) Backpropagate through the solver iterations.
+            * `True` Implicit-function gradients at the solution.
+          * model_opts[`'state_cache'`] 
+            * `0` (default) Solvers start from constant inits.
+            * `C` Initialize solvers from a cache of the last C solutions.
+          * model_opts[`'warm_start_lookup'`] 
+            * `'grid'` (default) Warm start from the enclosing grid cell.
+            * `'dense'` Warm start weighting all grid points.
         solve_its (int): Number of langevin dynamics simulation steps.
         solve_eps (float): Langevin dynamics solver step-size.
+        solver_states (dict): Overridable solver init and solution tensors
+                              of each solve (see cached_solver_inits).
     """
 
     def __init__(
@@ -2542,6 +3163,7 @@ class LowRankRNN(system):
         self.density_network_bounds = [self.a, self.b]
         self.warm_start_grid_step = 0.5
         self.has_support_map = True
+        self.solver_states = {}
 
     def get_a_b(self,):
         a = np.zeros((self.D,))
@@ -2570,7 +3192,7 @@ class LowRankRNN(system):
             for i in range(self.D):
                 a[i] = a_dict[self.free_params[i]]
                 b[i] = b_dict[self.free_params[i]]
-        elif self.model_opts["rank"] == 1 and self.behavior["type"] == "BI":
+        elif self.model_opts["rank"] == 1:
             lb = -5.0
             ub = 5.0
             a_dict = {
@@ -2738,13 +3360,21 @@ class LowRankRNN(system):
             # load fixed parameters
             for fixed_param in self.fixed_params.keys():
                 if fixed_param == "g":
-                    g = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    g = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Mm":
-                    Mm = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Mm = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Mn":
-                    Mn = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Mn = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Sm":
-                    Sm = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Sm = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 else:
                     print("Error: unknown fixed parameter: %s." % fixed_param)
                     raise NotImplementedError
@@ -2779,24 +3409,40 @@ class LowRankRNN(system):
             # load fixed parameters
             for fixed_param in self.fixed_params.keys():
                 if fixed_param == "g":
-                    g = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    g = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Mm":
-                    Mm = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Mm = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Mn":
-                    Mn = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Mn = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "MI":
-                    MI = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    MI = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Sm":
-                    Sm = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Sm = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Sn":
-                    Sn = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    Sn = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "SmI":
-                    SmI = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    SmI = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "SnI":
-                    SnI = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    SnI = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "Sperp":
                     Sperp = self.fixed_params[fixed_param] * tf.ones(
-                        (1, M), dtype=DTYPE
+                        (1, M), dtype=self.dtype
                     )
                 else:
                     print("Error: unknown fixed parameter: %s." % fixed_param)
@@ -2832,26 +3478,32 @@ class LowRankRNN(system):
             # load fixed parameters
             for fixed_param in self.fixed_params.keys():
                 if fixed_param == "g":
-                    g = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    g = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "rhom":
-                    rhom = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    rhom = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "rhon":
-                    rhon = self.fixed_params[fixed_param] * tf.ones((1, M), dtype=DTYPE)
+                    rhon = self.fixed_params[fixed_param] * tf.ones(
+                        (1, M), dtype=self.dtype
+                    )
                 elif fixed_param == "betam":
                     betam = self.fixed_params[fixed_param] * tf.ones(
-                        (1, M), dtype=DTYPE
+                        (1, M), dtype=self.dtype
                     )
                 elif fixed_param == "betan":
                     betan = self.fixed_params[fixed_param] * tf.ones(
-                        (1, M), dtype=DTYPE
+                        (1, M), dtype=self.dtype
                     )
                 elif fixed_param == "gammaLO":
                     gammaLO = self.fixed_params[fixed_param] * tf.ones(
-                        (1, M), dtype=DTYPE
+                        (1, M), dtype=self.dtype
                     )
                 elif fixed_param == "gammaHI":
                     gammaHI = self.fixed_params[fixed_param] * tf.ones(
-                        (1, M), dtype=DTYPE
+                        (1, M), dtype=self.dtype
                     )
                 else:
                     print("Error: unknown fixed parameter: %s." % fixed_param)
@@ -2909,9 +3561,15 @@ class LowRankRNN(system):
                 # mu_init, delta_0_init, delta_inf_init = self.warm_start_inits(z)
                 g, Mm, Mn, Sm = self.filter_Z(z)
 
-                mu_init = 50.0 * tf.ones((M,), dtype=DTYPE)
-                delta_0_init = 55.0 * tf.ones((M,), dtype=DTYPE)
-                delta_inf_init = 45.0 * tf.ones((M,), dtype=DTYPE)
+                mu_init = 50.0 * tf.ones((M,), dtype=self.dtype)
+                delta_0_init = 55.0 * tf.ones((M,), dtype=self.dtype)
+                delta_inf_init = 45.0 * tf.ones((M,), dtype=self.dtype)
+                solver_params = [g[0, :], Mm[0, :], Mn[0, :], Sm[0, :]]
+                inits = [mu_init, delta_0_init, delta_inf_init]
+                inits, cache = self.cached_solver_inits(
+                    "struct_chaos", solver_params, inits
+                )
+                mu_init, delta_0_init, delta_inf_init = inits
 
                 mu, delta_0, delta_inf = rank1_spont_chaotic_solve(
                     mu_init,
@@ -2924,6 +3582,9 @@ class LowRankRNN(system):
                     self.solve_its,
                     self.solve_eps,
                     gauss_quad_pts=50,
+                    integrals=self.model_opts.get("integrals", "quadrature"),
+                    solver=self.model_opts.get("solver", "langevin"),
+                    implicit_grad=self.model_opts.get("implicit_grad", False),
                     db=False,
                 )
 
@@ -2935,6 +3596,7 @@ class LowRankRNN(system):
                 T_x = tf.expand_dims(
                     tf.concat((first_moments, second_moments), axis=1), 0
                 )
+                T_x = self.cache_solver_state(cache, [mu, delta_0, delta_inf], T_x)
 
             else:
                 raise NotImplementedError
@@ -2951,15 +3613,23 @@ class LowRankRNN(system):
                 [g, Mm, Mn, MI, Sm, Sn, SmI, Sperp], num_conds
             )
 
-            mu_init = -5.0 * tf.ones((num_conds * M,), dtype=DTYPE)
-            kappa_init = -5.0 * tf.ones((num_conds * M,), dtype=DTYPE)
-            delta_0_init = 5.0 * tf.ones((num_conds * M,), dtype=DTYPE)
-            delta_inf_init = 4.0 * tf.ones((num_conds * M,), dtype=DTYPE)
+            mu_init = -5.0 * tf.ones((num_conds * M,), dtype=self.dtype)
+            kappa_init = -5.0 * tf.ones((num_conds * M,), dtype=self.dtype)
+            delta_0_init = 5.0 * tf.ones((num_conds * M,), dtype=self.dtype)
+            delta_inf_init = 4.0 * tf.ones((num_conds * M,), dtype=self.dtype)
 
             SnI = tf.concat(
-                (c_LO * tf.ones((M,), dtype=DTYPE), c_HI * tf.ones((M,), dtype=DTYPE)),
+                (
+                    c_LO * tf.ones((M,), dtype=self.dtype),
+                    c_HI * tf.ones((M,), dtype=self.dtype),
+                ),
                 axis=0,
             )
+            solver_params = [g[0, :], Mm[0, :], Mn[0, :], MI[0, :], Sm[0, :]]
+            solver_params += [Sn[0, :], SmI[0, :], SnI, Sperp[0, :]]
+            inits = [mu_init, kappa_init, delta_0_init, delta_inf_init]
+            inits, cache = self.cached_solver_inits("ND", solver_params, inits)
+            mu_init, kappa_init, delta_0_init, delta_inf_init = inits
 
             mu, kappa, delta_0, delta_inf = rank1_input_chaotic_solve(
                 mu_init,
@@ -2978,6 +3648,9 @@ class LowRankRNN(system):
                 self.solve_its,
                 self.solve_eps,
                 gauss_quad_pts=50,
+                integrals=self.model_opts.get("integrals", "quadrature"),
+                solver=self.model_opts.get("solver", "langevin"),
+                implicit_grad=self.model_opts.get("implicit_grad", False),
                 db=False,
             )
 
@@ -2988,20 +3661,23 @@ class LowRankRNN(system):
             first_moments = tf.stack([kappa_HI - kappa_LO], axis=1)
             second_moments = tf.square(first_moments)
             T_x = tf.expand_dims(tf.concat((first_moments, second_moments), axis=1), 0)
+            T_x = self.cache_solver_state(cache, [mu, kappa, delta_0, delta_inf], T_x)
 
         elif self.behavior["type"] == "BI":
             assert self.model_opts["input_type"] == "input"
             g, Mm, Mn, MI, Sm, Sn, SmI, SnI, Sperp = self.filter_Z(z)
 
-            """mu_init = 5.0 * tf.ones((M,), dtype=DTYPE)
-            kappa_init = 5.0 * tf.ones((M,), dtype=DTYPE)
-            delta_0_init = 5.0 * tf.ones((M,), dtype=DTYPE)
-            delta_inf_init = 4.0 * tf.ones((M,), dtype=DTYPE)"""
+            """mu_init = 5.0 * tf.ones((M,), dtype=self.dtype)
+            kappa_init = 5.0 * tf.ones((M,), dtype=self.dtype)
+            delta_0_init = 5.0 * tf.ones((M,), dtype=self.dtype)
+            delta_inf_init = 4.0 * tf.ones((M,), dtype=self.dtype)"""
             _, _, warm_start_inits, _ = self.get_warm_start_inits(z, beta=100.0)
-            mu_init = warm_start_inits[:, 0]
-            kappa_init = warm_start_inits[:, 1]
-            delta_0_init = warm_start_inits[:, 2]
-            delta_inf_init = warm_start_inits[:, 3]
+            solver_params = [g[0, :], Mm[0, :], Mn[0, :], MI[0, :], Sm[0, :]]
+            solver_params += [Sn[0, :], SmI[0, :], SnI[0, :], Sperp[0, :]]
+            inits, cache = self.cached_solver_inits(
+                "BI", solver_params, tf.unstack(warm_start_inits, axis=1)
+            )
+            mu_init, kappa_init, delta_0_init, delta_inf_init = inits
 
             mu, kappa, delta_0, delta_inf, xs = rank1_input_chaotic_solve(
                 mu_init,
@@ -3020,6 +3696,9 @@ class LowRankRNN(system):
                 self.solve_its,
                 self.solve_eps,
                 gauss_quad_pts=50,
+                integrals=self.model_opts.get("integrals", "quadrature"),
+                solver=self.model_opts.get("solver", "langevin"),
+                implicit_grad=self.model_opts.get("implicit_grad", False),
                 db=True,
             )
 
@@ -3032,6 +3711,9 @@ class LowRankRNN(system):
             delta_T_var = tf.square(delta_T - self.mu[1])
 
             T_x = tf.stack((mu, delta_T, mu_var, delta_T_var), axis=2)
+            T_x = self.cache_solver_state(
+                cache, [mu[0], kappa, delta_0, delta_inf], T_x
+            )
             return T_x
 
         elif self.behavior["type"] == "CDD":
@@ -3050,18 +3732,30 @@ class LowRankRNN(system):
             gammaB = gammaLO
 
             cA = tf.concat(
-                (c_HI * tf.ones((M,), dtype=DTYPE), c_LO * tf.ones((M,), dtype=DTYPE)),
+                (
+                    c_HI * tf.ones((M,), dtype=self.dtype),
+                    c_LO * tf.ones((M,), dtype=self.dtype),
+                ),
                 axis=0,
             )
             cB = tf.concat(
-                (c_LO * tf.ones((M,), dtype=DTYPE), c_HI * tf.ones((M,), dtype=DTYPE)),
+                (
+                    c_LO * tf.ones((M,), dtype=self.dtype),
+                    c_HI * tf.ones((M,), dtype=self.dtype),
+                ),
                 axis=0,
             )
 
-            kappa1_init = -5.0 * tf.ones((num_conds * M,), dtype=DTYPE)
-            kappa2_init = -5.0 * tf.ones((num_conds * M,), dtype=DTYPE)
-            delta_0_init = 5.0 * tf.ones((num_conds * M,), dtype=DTYPE)
-            # delta_inf_init = 4.0 * tf.ones((num_conds*M,), dtype=DTYPE)
+            kappa1_init = -5.0 * tf.ones((num_conds * M,), dtype=self.dtype)
+            kappa2_init = -5.0 * tf.ones((num_conds * M,), dtype=self.dtype)
+            delta_0_init = 5.0 * tf.ones((num_conds * M,), dtype=self.dtype)
+            solver_params = [cA, cB, g[0, :], rhom[0, :], rhon[0, :], betam[0, :]]
+            solver_params += [betan[0, :], gammaA[0, :], gammaB[0, :]]
+            inits, cache = self.cached_solver_inits(
+                "CDD", solver_params, [kappa1_init, kappa2_init, delta_0_init]
+            )
+            kappa1_init, kappa2_init, delta_0_init = inits
+            # delta_inf_init = 4.0 * tf.ones((num_conds*M,), dtype=self.dtype)
 
             # TODO delta_0 should be written square diff in commented out?
             # kappa1, kappa2, delta_0, delta_inf, z = rank2_CDD_chaotic_solve(
@@ -3081,6 +3775,9 @@ class LowRankRNN(system):
                 self.solve_its,
                 self.solve_eps,
                 gauss_quad_pts=50,
+                integrals=self.model_opts.get("integrals", "quadrature"),
+                solver=self.model_opts.get("solver", "langevin"),
+                implicit_grad=self.model_opts.get("implicit_grad", False),
                 db=False,
             )
 
@@ -3090,6 +3787,119 @@ class LowRankRNN(system):
             first_moments = tf.stack([z_ctxA_A - z_ctxA_B], axis=1)
             second_moments = tf.square(first_moments)
             T_x = tf.expand_dims(tf.concat((first_moments, second_moments), axis=1), 0)
+            T_x = self.cache_solver_state(cache, [kappa1, kappa2, delta_0], T_x)
+
+        else:
+            raise NotImplementedError
+
+        return T_x
+
+    def np_unsupported(self,):
+        """See system.np_unsupported."""
+        if self.behavior["type"] not in ["struct_chaos", "BI", "CDD"]:
+            return "behavior '%s'" % self.behavior["type"]
+        input_type = self.model_opts["input_type"]
+        if self.behavior["type"] == "struct_chaos" and input_type != "spont":
+            return "struct_chaos with input_type '%s'" % input_type
+        return None
+
+    def suff_stats_np(self, Z):
+        """NumPy version of compute_suff_stats (see system.compute_suff_stats_np).
+
+        The consistency equations are solved by the NumPy Langevin dynamics
+        solvers of dsn.util.tf_DMFT_solvers from the same inits, for
+        `self.solve_its` iterations of step size `self.solve_eps`.  The solver
+        state cache is not used, and the 'ND' behavior and input driven
+        'struct_chaos' are not supported (see np_unsupported).
+
+        # Arguments
+            Z (np.array): (M, D) system parameter samples.
+
+        # Returns
+            T_x (np.array): (M, num_suff_stats) sufficient statistics of samples.
+
+        """
+        M = Z.shape[0]
+        params = self.filter_Z_np(Z)
+        integrals = self.model_opts.get("integrals", "quadrature")
+
+        if self.behavior["type"] == "struct_chaos":
+            mu, delta_0, delta_inf = rank1_spont_chaotic_solve_np(
+                50.0 * np.ones((M,)),
+                55.0 * np.ones((M,)),
+                45.0 * np.ones((M,)),
+                params["g"],
+                params["Mm"],
+                params["Mn"],
+                params["Sm"],
+                self.solve_its,
+                self.solve_eps,
+                gauss_quad_pts=50,
+                integrals=integrals,
+            )
+
+            static_var = delta_inf
+            chaotic_var = delta_0 - delta_inf
+
+            first_moments = np.stack([mu, static_var, chaotic_var], axis=1)
+            T_x = np.concatenate((first_moments, np.square(first_moments)), axis=1)
+
+        elif self.behavior["type"] == "BI":
+            assert self.model_opts["input_type"] == "input"
+            warm_start_inits = self.get_warm_start_inits_np(Z, beta=100.0)
+            solver_params = ["g", "Mm", "Mn", "MI", "Sm", "Sn", "SmI", "SnI", "Sperp"]
+            mu, kappa, delta_0, delta_inf = rank1_input_chaotic_solve_np(
+                *(
+                    [warm_start_inits[:, i] for i in range(4)]
+                    + [params[param] for param in solver_params]
+                ),
+                self.solve_its,
+                self.solve_eps,
+                gauss_quad_pts=50,
+                integrals=integrals,
+            )
+
+            delta_T = delta_0 - delta_inf
+            T_x = np.stack(
+                (
+                    mu,
+                    delta_T,
+                    np.square(mu - self.mu[0]),
+                    np.square(delta_T - self.mu[1]),
+                ),
+                axis=1,
+            )
+
+        elif self.behavior["type"] == "CDD":
+            c_LO = 0.0
+            c_HI = 1.0
+            ones = np.ones((M,))
+            cA = np.concatenate((c_HI * ones, c_LO * ones), axis=0)
+            cB = np.concatenate((c_LO * ones, c_HI * ones), axis=0)
+
+            gammaLO = params["gammaLO"]
+            if "gammaLO" in self.free_params:  # negate
+                gammaLO = -gammaLO
+            solver_params = [params[param] for param in ["g", "rhom", "rhon"]]
+            solver_params += [params["betam"], params["betan"], params["gammaHI"]]
+            solver_params += [gammaLO]
+            solver_params = [np.concatenate((x, x), axis=0) for x in solver_params]
+
+            kappa1, kappa2, delta_0, z = rank2_CDD_static_solve_np(
+                -5.0 * np.ones((2 * M,)),
+                -5.0 * np.ones((2 * M,)),
+                5.0 * np.ones((2 * M,)),
+                cA,
+                cB,
+                *solver_params,
+                self.solve_its,
+                self.solve_eps,
+                num_pts=50,
+                integrals=integrals,
+            )
+
+            first_moments = np.expand_dims(z[:M] - z[M:], 1)
+            T_x = np.concatenate((first_moments, np.square(first_moments)), axis=1)
 
         else:
             raise NotImplementedError
@@ -3137,35 +3947,225 @@ class LowRankRNN(system):
         a, b = self.density_network_bounds
         return IntervalFlow([], inputs, a, b)
 
+    def cached_solver_inits(self, name, solver_params, inits):
+        """Solver inits from the solver state cache (model_opts["state_cache"]).
+
+        With a state cache of size C, each solve is initialized at the cached
+        solution of the nearest of the last C solver parameter vectors seen
+        during earlier session runs (see tf_DMFT_solvers.solver_state_cache).
+
+        The (M,d) inits can be overridden by feeding
+        self.solver_states[name]["init"] (see dsn_util.get_perturbs).
+
+        # Arguments:
+            name (str): Name of the cache.
+            solver_params (list): (M,) tf.tensor parameters of the solver.
+            inits (list): (M,) tf.tensor default solver inits.
+
+        # Returns
+            inits (list): (M,) tf.tensor solver inits.
+            cache (tuple): cache, solver parameters and name.
+        """
+        z = tf.stack(solver_params, axis=1)
+        x_init = tf.stack(inits, axis=1)
+        size = self.model_opts.get("state_cache", 0)
+        cache = None
+        if size:
+            cache = solver_state_cache(
+                name + "_state_cache", len(solver_params), len(inits), size, self.dtype
+            )
+            x_init = cached_solver_inits(cache, z, x_init)
+        x_init = tf.placeholder_with_default(
+            x_init, (None, len(inits)), name=name + "_init"
+        )
+        self.solver_states[name] = {"init": x_init, "solution": None}
+        return tf.unstack(x_init, axis=1), (cache, z, name)
+
+    def cache_solver_state(self, cache, solutions, T_x):
+        """Writes the solutions to the solver state cache when T_x is computed.
+
+        # Arguments:
+            cache (tuple): see cached_solver_inits.
+            solutions (list): (M,) tf.tensor solver solutions.
+            T_x (tf.tensor): Sufficient statistics of samples.
+
+        # Returns
+            T_x (tf.tensor): Sufficient statistics of samples.
+        """
+        cache, z, name = cache
+        x = tf.stack(solutions, axis=1)
+        self.solver_states[name]["solution"] = x
+        if cache is None:
+            return T_x
+        update = update_solver_state_cache(cache, z, x)
+        with tf.control_dependencies([update]):
+            return tf.identity(T_x)
+
     def get_warm_start_inits(self, z, beta=100.0):
         """Calculates warm start initialization for parameter sample.
 
+        The solutions at grid points near z are averaged with weights
+        exp(-beta*|z - z_grid|^2).  By default (model_opts[`'warm_start_lookup'`]
+        = `'grid'`) only the 2^D corners of the warm start grid cell holding
+        each sample are used, so the cost is O(M 2^D) regardless of the grid
+        size.  `'dense'` (and warm start files without grid geometry) weights
+        every grid point.
+
         # Arguments:
             z (tf.tensor): Density network system parameter samples.
 
         # Returns
-            inits (list): list of (M,) tf.tensor solver inits
+            diffs (tf.tensor): (M,K) squared distances to the grid points used.
+            param_select (tf.tensor): (M,D) weighted grid parameters.
+            warm_start_inits (tf.tensor): (M,d) solver inits.
+            param_grid (np.array): (1,G,D) warm start parameter grid.
         """
 
         ws_filename, _ = warm_start(self)
         ws_file = np.load(ws_filename)
         param_grid = ws_file["param_grid"]
         solution_grid = ws_file["solution_grid"]
+        lookup = self.model_opts.get("warm_start_lookup", "grid")
+        if lookup == "grid" and "grid_vals" in ws_file.files:
+            diffs, param_select, warm_start_inits = self.get_grid_warm_start_inits(
+                z, ws_file["grid_vals"], ws_file["grid_shape"], solution_grid, beta
+            )
+            param_grid = np.expand_dims(np.transpose(param_grid), 0)
+            return diffs, param_select, warm_start_inits, param_grid
 
         # take dot product and make approx one-hot
         z = tf.transpose(z, [1, 0, 2])
         param_grid = np.expand_dims(np.transpose(param_grid), 0)
-        diffs = tf.reduce_sum(tf.square(z - param_grid), axis=2)
+        _param_grid = graph_array(param_grid, "param_grid", dtype=self.dtype)
+        _solution_grid = graph_array(
+            solution_grid, "solution_grid", dtype=self.dtype
+        )
+        diffs = tf.reduce_sum(tf.square(z - _param_grid), axis=2)
         # avoid the spectre of nan
         kernel_eps = 1e-16
         sim_kernel = tf.exp(-beta * diffs) + kernel_eps
         one_hot = sim_kernel / tf.expand_dims(tf.reduce_sum(sim_kernel, 1), 1)
-        param_select = tf.matmul(one_hot, param_grid[0])
-        warm_start_inits = tf.matmul(one_hot, solution_grid)
+        param_select = tf.matmul(one_hot, _param_grid[0])
+        warm_start_inits = tf.matmul(one_hot, _solution_grid)
 
         # soft-select the solution grid to be the initializations.
         return diffs, param_select, warm_start_inits, param_grid
 
+    def get_grid_warm_start_inits(self, z, grid_vals, grid_shape, solution_grid, beta):
+        """Warm start inits from the corners of the grid cell of each sample.
+
+        # Arguments:
+            z (tf.tensor): (1,M,D) density network system parameter samples.
+            grid_vals (np.array): Concatenated values of each free parameter.
+            grid_shape (np.array): (D,) number of values of each parameter.
+            solution_grid (np.array): (G,d) solutions in 'ij' grid order.
+            beta (float): Inverse temperature of the kernel.
+
+        # Returns
+            diffs (tf.tensor): (M,2^D) squared distances to the cell corners.
+            param_select (tf.tensor): (M,D) weighted cell corner parameters.
+            warm_start_inits (tf.tensor): (M,d) solver inits.
+        """
+        starts, steps, max_cell, strides, offsets = self.get_grid_cell_geometry(
+            grid_vals, grid_shape
+        )
+        starts = tf.constant(starts, dtype=self.dtype)
+        steps = tf.constant(steps, dtype=self.dtype)
+        max_cell = tf.constant(max_cell, dtype=self.dtype)
+
+        z = z[0]
+        s = (z - starts) / steps
+        cell = tf.clip_by_value(tf.floor(s), 0.0, max_cell)
+        cell = tf.cast(tf.stop_gradient(cell), tf.int32)
+        # (M,K,D) grid indices of the cell corners
+        inds = tf.expand_dims(cell, 1) + offsets
+        flat_inds = tf.reduce_sum(inds * strides.astype(np.int32), axis=2)
+        corners = starts + tf.cast(inds, self.dtype) * steps
+
+        _solution_grid = graph_array(
+            solution_grid, "solution_grid", dtype=self.dtype
+        )
+        diffs = tf.reduce_sum(tf.square(tf.expand_dims(z, 1) - corners), axis=2)
+        # avoid the spectre of nan
+        kernel_eps = 1e-16
+        sim_kernel = tf.exp(-beta * diffs) + kernel_eps
+        weights = sim_kernel / tf.expand_dims(tf.reduce_sum(sim_kernel, 1), 1)
+        weights = tf.expand_dims(weights, 2)
+        param_select = tf.reduce_sum(weights * corners, axis=1)
+        warm_start_inits = tf.reduce_sum(
+            weights * tf.gather(_solution_grid, flat_inds), axis=1
+        )
+        return diffs, param_select, warm_start_inits
+
+    def get_grid_cell_geometry(self, grid_vals, grid_shape):
+        """Geometry of the cells of the warm start grid.
+
+        # Arguments:
+            grid_vals (np.array): Concatenated values of each free parameter.
+            grid_shape (np.array): (D,) number of values of each parameter.
+
+        # Returns
+            starts (np.array): (D,) first value of each parameter.
+            steps (np.array): (D,) grid step of each parameter.
+            max_cell (np.array): (D,) largest cell index of each parameter.
+            strides (np.array): (D,) flat index strides of the 'ij' grid.
+            offsets (np.array): (K,D) corners of a cell along the dimensions
+                                with more than one value.
+        """
+        num_dims = grid_shape.shape[0]
+        splits = np.cumsum(grid_shape)[:-1]
+        axes = np.split(grid_vals, splits)
+        starts = np.array([vals[0] for vals in axes])
+        steps = np.array(
+            [vals[1] - vals[0] if vals.shape[0] > 1 else 1.0 for vals in axes]
+        )
+        max_cell = np.maximum(grid_shape - 2, 0)
+        strides = np.cumprod(np.concatenate([grid_shape[1:], [1]])[::-1])[::-1]
+
+        offsets = np.zeros((1, num_dims), dtype=np.int32)
+        for i in range(num_dims):
+            if grid_shape[i] > 1:
+                shifted = np.copy(offsets)
+                shifted[:, i] = 1
+                offsets = np.concatenate([offsets, shifted], axis=0)
+        return starts, steps, max_cell, strides, offsets
+
+    def get_warm_start_inits_np(self, Z, beta=100.0):
+        """NumPy version of get_warm_start_inits.
+
+        # Arguments:
+            Z (np.array): (M, D) system parameter samples.
+            beta (float): Inverse temperature of the kernel.
+
+        # Returns
+            warm_start_inits (np.array): (M,d) solver inits.
+        """
+        ws_filename, _ = warm_start(self)
+        ws_file = np.load(ws_filename)
+        solution_grid = ws_file["solution_grid"]
+        lookup = self.model_opts.get("warm_start_lookup", "grid")
+        grid = lookup == "grid" and "grid_vals" in ws_file.files
+        if grid:
+            starts, steps, max_cell, strides, offsets = self.get_grid_cell_geometry(
+                ws_file["grid_vals"], ws_file["grid_shape"]
+            )
+            cell = np.clip(np.floor((Z - starts) / steps), 0.0, max_cell)
+            # (M,K,D) grid indices of the cell corners
+            inds = np.expand_dims(cell.astype(np.int64), 1) + offsets
+            corners = starts + inds * steps
+        else:
+            corners = np.expand_dims(np.transpose(ws_file["param_grid"]), 0)
+
+        diffs = np.sum(np.square(np.expand_dims(Z, 1) - corners), axis=2)
+        # avoid the spectre of nan
+        kernel_eps = 1e-16
+        sim_kernel = np.exp(-beta * diffs) + kernel_eps
+        weights = sim_kernel / np.sum(sim_kernel, axis=1, keepdims=True)
+        if grid:
+            solutions = solution_grid[np.sum(inds * strides, axis=2)]
+            return np.sum(np.expand_dims(weights, 2) * solutions, axis=1)
+        return np.dot(weights, solution_grid)
+
 
 def system_from_str(system_str):
     if system_str in ["Linear2D"]:
@@ -2,24 +2,93 @@ import numpy as np
 import tensorflow as tf
 from tf_util.tf_util import get_array_str
 import dsn.util.tf_integrals as tfi
-from dsn.util.tf_langevin import bounded_langevin_dyn, bounded_langevin_dyn_np
+from dsn.util.tf_langevin import active_set_langevin_np, fixed_point_solve
 import dsn.util.np_integrals as npi
+import dsn.util.tf_moments as tfm
+import dsn.util.np_moments as npm
+import dsn.util.tf_moment_tables as tfmt
+import dsn.util.np_moment_tables as npmt
+from dsn.util.tf_graph_util import graph_buffer, graph_root_scope
+from dsn.util.warm_start_store import (
+    open_store,
+    get_store_dir,
+    lattice_range,
+    overlapping_blocks,
+    missing_blocks,
+    block_lattice,
+    block_name,
+    add_block,
+    save_block,
+    assemble_box,
+    pad_history,
+)
+import multiprocessing
+import inspect
+import hashlib
 import os
 
 DTYPE = tf.float64
 
+# Gaussian integral backends
+#   "quadrature" - Gauss-Hermite quadrature (tf_moments, np_moments).
+#   "adaptive" - quadrature with the order chosen per sample from delta0
+#                (gauss_quad_pts is the largest order).
+#   "tables" - interpolated precomputed tables (tf_moment_tables,
+#              np_moment_tables).
+TF_INTEGRALS = {
+    "quadrature": tfm.gaussian_moments,
+    "adaptive": tfm.adaptive_gaussian_moments,
+    "tables": tfmt.gaussian_moments,
+}
+NP_INTEGRALS = {
+    "quadrature": npm.gaussian_moments,
+    "adaptive": npm.adaptive_gaussian_moments,
+    "tables": npmt.gaussian_moments,
+}
+
+
+def take_rows(params, inds):
+    """Rows inds of the per-sample parameters (scalars are shared).
+
+    # Arguments
+        params (list): Scalar or (M,) np.array parameters.
+        inds (np.array): Sample indices (or slice(None)).
+
+    # Returns
+        params (list): Parameters of the samples inds.
+
+    """
+    return [
+        param if np.ndim(param) == 0 or np.shape(param)[0] == 1 else param[inds]
+        for param in params
+    ]
+
 
 def rank1_spont_static_solve(
-    mu_init, delta_0_init, g, Mm, Mn, Sm, num_its, eps, gauss_quad_pts=50
+    mu_init,
+    delta_0_init,
+    g,
+    Mm,
+    Mn,
+    Sm,
+    num_its,
+    eps,
+    gauss_quad_pts=50,
+    integrals="quadrature",
+    solver="langevin",
+    implicit_grad=False,
 ):
 
+    gaussian_moments = TF_INTEGRALS[integrals]
+
     # convergence equations used for langevin-like dynamimcs solver
     def f(x):
         mu = x[:, 0]
         delta_0 = x[:, 1]
 
-        Phi = tfi.Phi(mu, delta_0, num_pts=gauss_quad_pts)
-        PhiSq = tfi.PhiSq(mu, delta_0, num_pts=gauss_quad_pts)
+        Phi, PhiSq = gaussian_moments(
+            mu, delta_0, None, ["Phi", "PhiSq"], num_pts=gauss_quad_pts
+        )
 
         F = Mm * Mn * Phi
         H = (g ** 2) * PhiSq + (Sm ** 2) * (Mn ** 2) * Phi ** 2
@@ -27,7 +96,15 @@ def rank1_spont_static_solve(
 
     x_init = tf.stack([mu_init, delta_0_init], axis=1)
     non_neg = [False, True]
-    xs_end = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg)
+    xs_end = fixed_point_solve(
+        f,
+        x_init,
+        eps,
+        num_its,
+        non_neg,
+        solver=solver,
+        implicit_grad=implicit_grad,
+    )
     mu = xs_end[:, 0]
     delta_0 = xs_end[:, 1]
     return mu, delta_0
@@ -45,18 +122,26 @@ def rank1_spont_chaotic_solve(
     eps,
     gauss_quad_pts=50,
     db=False,
+    integrals="quadrature",
+    solver="langevin",
+    implicit_grad=False,
 ):
 
+    gaussian_moments = TF_INTEGRALS[integrals]
+
     # convergence equations used for langevin-like dynamimcs solver
     def f(x):
         mu = x[:, 0]
         delta_0 = x[:, 1]
         delta_inf = x[:, 2]
 
-        Phi = tfi.Phi(mu, delta_0, num_pts=gauss_quad_pts)
-        PrimSq = tfi.PrimSq(mu, delta_0, num_pts=gauss_quad_pts)
-        IntPrimPrim = tfi.IntPrimPrim(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
-        IntPhiPhi = tfi.IntPhiPhi(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
+        Phi, PrimSq, IntPrimPrim, IntPhiPhi = gaussian_moments(
+            mu,
+            delta_0,
+            delta_inf,
+            ["Phi", "PrimSq", "IntPrimPrim", "IntPhiPhi"],
+            num_pts=gauss_quad_pts,
+        )
 
         F = Mm * Mn * Phi
         G_squared = delta_inf ** 2 + 2 * (
@@ -70,9 +155,27 @@ def rank1_spont_chaotic_solve(
     x_init = tf.stack([mu_init, delta_0_init, delta_inf_init], axis=1)
     non_neg = [False, True, True]
     if db:
-        xs_end, xs = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end, xs = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
     else:
-        xs_end = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
 
     mu = xs_end[:, 0]
     delta_0 = xs_end[:, 1]
@@ -102,11 +205,16 @@ def rank1_input_chaotic_solve(
     eps,
     gauss_quad_pts=50,
     db=False,
+    integrals="quadrature",
+    solver="langevin",
+    implicit_grad=False,
 ):
 
     square_diff_init = (tf.square(delta_0_init) - tf.square(delta_inf_init)) / 2.0
     SI_squared = (SmI ** 2 / Sm ** 2) + (SnI ** 2) / (Sn ** 2) + Sperp ** 2
 
+    gaussian_moments = TF_INTEGRALS[integrals]
+
     # convergence equations used for langevin-like dynamimcs solver
     def f(x):
         mu = x[:, 0]
@@ -116,11 +224,13 @@ def rank1_input_chaotic_solve(
 
         delta_0 = tf.sqrt(2 * square_diff + tf.square(delta_inf))
 
-        Phi = tfi.Phi(mu, delta_0, num_pts=gauss_quad_pts)
-        Prime = tfi.Prime(mu, delta_0, num_pts=gauss_quad_pts)
-        PrimSq = tfi.PrimSq(mu, delta_0, num_pts=gauss_quad_pts)
-        IntPrimPrim = tfi.IntPrimPrim(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
-        IntPhiPhi = tfi.IntPhiPhi(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
+        Phi, Prime, PrimSq, IntPrimPrim, IntPhiPhi = gaussian_moments(
+            mu,
+            delta_0,
+            delta_inf,
+            ["Phi", "Prime", "PrimSq", "IntPrimPrim", "IntPhiPhi"],
+            num_pts=gauss_quad_pts,
+        )
 
         F = Mm * kappa + MI  # mu
         G = Mn * Phi + SnI * Prime
@@ -140,9 +250,27 @@ def rank1_input_chaotic_solve(
     non_neg = [False, False, True, True]
 
     if db:
-        xs_end, xs = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end, xs = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
     else:
-        xs_end = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
 
     mu = xs_end[:, 0]
     kappa = xs_end[:, 1]
@@ -174,22 +302,28 @@ def rank2_CDD_static_solve(
     eps,
     gauss_quad_pts=50,
     db=False,
+    integrals="quadrature",
+    solver="langevin",
+    implicit_grad=False,
 ):
     # Use equations 159 and 160 from M&O 2018
 
     SI = 1.2
     Sy = 1.2
 
+    gaussian_moments = TF_INTEGRALS[integrals]
+
     # convergence equations used for langevin-like dynamimcs solver
     def f(x):
         kappa1 = x[:, 0]
         kappa2 = x[:, 1]
         delta_0 = x[:, 2]
 
-        mu = tf.zeros((1,), dtype=DTYPE)
+        mu = tf.zeros((1,), dtype=x.dtype)
 
-        Prime = tfi.Prime(mu, delta_0, num_pts=gauss_quad_pts)
-        PhiSq = tfi.PhiSq(mu, delta_0, num_pts=gauss_quad_pts)
+        Prime, PhiSq = gaussian_moments(
+            mu, delta_0, None, ["Prime", "PhiSq"], num_pts=gauss_quad_pts
+        )
 
         F = (
             rhom * rhon * kappa1
@@ -217,15 +351,33 @@ def rank2_CDD_static_solve(
     non_neg = [False, False, True]
 
     if db:
-        xs_end, xs = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end, xs = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
     else:
-        xs_end = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
 
     kappa1 = xs_end[:, 0]
     kappa2 = xs_end[:, 1]
     delta_0 = xs_end[:, 2]
 
-    mu = tf.zeros((1,), dtype=DTYPE)
+    mu = tf.zeros((1,), dtype=xs_end.dtype)
 
     Prime = tfi.Prime(mu, delta_0, num_pts=gauss_quad_pts)
 
@@ -255,6 +407,9 @@ def rank2_CDD_chaotic_solve(
     eps,
     gauss_quad_pts=50,
     db=False,
+    integrals="quadrature",
+    solver="langevin",
+    implicit_grad=False,
 ):
 
     SI = 1.2
@@ -273,6 +428,8 @@ def rank2_CDD_chaotic_solve(
 
     square_diff_init = (tf.square(delta_0_init) - tf.square(delta_inf_init)) / 2.0
 
+    gaussian_moments = TF_INTEGRALS[integrals]
+
     # convergence equations used for langevin-like dynamimcs solver
     def f(x):
         kappa1 = x[:, 0]
@@ -280,13 +437,16 @@ def rank2_CDD_chaotic_solve(
         square_diff = x[:, 2]
         delta_inf = x[:, 3]
 
-        mu = tf.zeros((1,), dtype=DTYPE)
+        mu = tf.zeros((1,), dtype=x.dtype)
         delta_0 = tf.sqrt(2 * square_diff + tf.square(delta_inf))
 
-        Prime = tfi.Prime(mu, delta_0, num_pts=gauss_quad_pts)
-        PrimSq = tfi.PrimSq(mu, delta_0, num_pts=gauss_quad_pts)
-        IntPrimPrim = tfi.IntPrimPrim(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
-        IntPhiPhi = tfi.IntPhiPhi(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
+        Prime, PrimSq, IntPrimPrim, IntPhiPhi = gaussian_moments(
+            mu,
+            delta_0,
+            delta_inf,
+            ["Prime", "PrimSq", "IntPrimPrim", "IntPhiPhi"],
+            num_pts=gauss_quad_pts,
+        )
 
         noise_corr = (
             (Sw ** 2 + tf.square(betam)) * (tf.square(kappa1) + tf.square(kappa2))
@@ -317,16 +477,34 @@ def rank2_CDD_chaotic_solve(
     )
     non_neg = [False, False, True, True]
     if db:
-        xs_end, xs = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end, xs = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
     else:
-        xs_end = bounded_langevin_dyn(f, x_init, eps, num_its, non_neg, db=db)
+        xs_end = fixed_point_solve(
+            f,
+            x_init,
+            eps,
+            num_its,
+            non_neg,
+            db=db,
+            solver=solver,
+            implicit_grad=implicit_grad,
+        )
 
     kappa1 = xs_end[:, 0]
     kappa2 = xs_end[:, 1]
     square_diff = xs_end[:, 2]
     delta_inf = xs_end[:, 3]
 
-    mu = tf.zeros((1,), dtype=DTYPE)
+    mu = tf.zeros((1,), dtype=xs_end.dtype)
     delta_0 = tf.sqrt(2 * square_diff + tf.square(delta_inf))
 
     Prime = tfi.Prime(mu, delta_0, num_pts=gauss_quad_pts)
@@ -339,13 +517,110 @@ def rank2_CDD_chaotic_solve(
         return kappa1, kappa2, delta_0, delta_inf, z
 
 
-def rank1_spont_static_solve_np(mu_init, delta_0_init, g, Mm, Mn, Sm, num_its, eps):
-    def f(x):
+def solver_state_cache(name, z_dim, x_dim, size, dtype=DTYPE):
+    """Buffers of recent (z, solution) pairs of a DMFT solver.
+
+    The buffers are graph buffers (see tf_graph_util.graph_buffer), so they
+    persist across session runs but are not written to checkpoints.
+
+    # Arguments
+        name (str): Name scope of the cache.
+        z_dim (int): Dimension of the solver parameters z.
+        x_dim (int): Dimension of the solutions.
+        size (int): Number of cached pairs.
+        dtype (tf.dtype): Dtype of the buffers.
+
+    # Returns
+        cache (dict): "zs" (size, z_dim) and "xs" (size, x_dim) buffers,
+                      and "count", the number of pairs written so far.
+
+    """
+    with graph_root_scope(), tf.name_scope(name):
+        cache = {
+            "zs": graph_buffer(np.zeros((size, z_dim)), "zs", dtype),
+            "xs": graph_buffer(np.zeros((size, x_dim)), "xs", dtype),
+            "count": graph_buffer(np.zeros(()), "count", tf.int32),
+            "size": size,
+        }
+    return cache
+
+
+def cached_solver_inits(cache, z, x_default):
+    """Initializes a solver at the cached solution nearest to each z.
+
+    # Arguments
+        cache (dict): see solver_state_cache.
+        z (tf.tensor): (M, z_dim) solver parameters.
+        x_default (tf.tensor): (M, x_dim) inits used while the cache is empty.
+
+    # Returns
+        x_init (tf.tensor): (M, x_dim) solver inits (no gradient).
+
+    """
+    M = tf.shape(z)[0]
+    filled = tf.range(cache["size"]) < cache["count"]
+    diffs = tf.reduce_sum(
+        tf.square(tf.expand_dims(z, 1) - tf.expand_dims(cache["zs"], 0)), axis=2
+    )
+    diffs = tf.where(
+        tf.tile(tf.expand_dims(filled, 0), [M, 1]),
+        diffs,
+        np.inf * tf.ones_like(diffs),
+    )
+    nearest = tf.argmin(diffs, axis=1)
+    x_cached = tf.gather(cache["xs"], nearest)
+    use_cache = tf.fill([M], cache["count"] > 0)
+    return tf.stop_gradient(tf.where(use_cache, x_cached, x_default))
+
+
+def update_solver_state_cache(cache, z, x):
+    """Writes (z, solution) pairs into the cache ring buffer.
+
+    Pairs with non-finite solutions are skipped.
+
+    # Arguments
+        cache (dict): see solver_state_cache.
+        z (tf.tensor): (M, z_dim) solver parameters.
+        x (tf.tensor): (M, x_dim) solutions.
+
+    # Returns
+        update (tf.op): Cache update.
+
+    """
+    finite = tf.reduce_all(tf.is_finite(x), axis=1)
+    z = tf.boolean_mask(tf.stop_gradient(z), finite)[: cache["size"]]
+    x = tf.boolean_mask(tf.stop_gradient(x), finite)[: cache["size"]]
+    num_new = tf.shape(z)[0]
+    inds = tf.mod(cache["count"] + tf.range(num_new), cache["size"])
+    update_zs = tf.scatter_update(cache["zs"], inds, z)
+    update_xs = tf.scatter_update(cache["xs"], inds, x)
+    with tf.control_dependencies([update_zs, update_xs]):
+        update_count = tf.assign_add(cache["count"], num_new)
+    return update_count
+
+
+def rank1_spont_static_solve_np(
+    mu_init,
+    delta_0_init,
+    g,
+    Mm,
+    Mn,
+    Sm,
+    num_its,
+    eps,
+    integrals="quadrature",
+    tol=None,
+    callback=None,
+):
+    gaussian_moments = NP_INTEGRALS[integrals]
+    params = [g, Mm, Mn, Sm]
+
+    def f(x, inds):
+        g, Mm, Mn, Sm = take_rows(params, inds)
         mu = x[:, 0]
         delta_0 = x[:, 1]
 
-        Phi = npi.Phi(mu, delta_0)
-        PhiSq = npi.PhiSq(mu, delta_0)
+        Phi, PhiSq = gaussian_moments(mu, delta_0, None, ["Phi", "PhiSq"])
 
         F = Mm * Mn * Phi
         H = (g ** 2) * PhiSq + (Sm ** 2) * (Mn ** 2) * Phi ** 2
@@ -353,12 +628,67 @@ def rank1_spont_static_solve_np(mu_init, delta_0_init, g, Mm, Mn, Sm, num_its, e
 
     x_init = np.stack([mu_init, delta_0_init], axis=1)
     non_neg = [False, True]
-    xs_end = bounded_langevin_dyn_np(f, x_init, eps, num_its, non_neg)
+    xs_end, _ = active_set_langevin_np(
+        f, x_init, eps, num_its, non_neg, tol=tol, callback=callback
+    )
     mu = xs_end[:, 0]
     delta_0 = xs_end[:, 1]
     return mu, delta_0
 
 
+def rank1_spont_chaotic_solve_np(
+    mu_init,
+    delta_0_init,
+    delta_inf_init,
+    g,
+    Mm,
+    Mn,
+    Sm,
+    num_its,
+    eps,
+    gauss_quad_pts=50,
+    integrals="quadrature",
+    tol=None,
+    callback=None,
+):
+    gaussian_moments = NP_INTEGRALS[integrals]
+    params = [g, Mm, Mn, Sm]
+
+    # convergence equations used for langevin-like dynamimcs solver
+    def f(x, inds):
+        g, Mm, Mn, Sm = take_rows(params, inds)
+        mu = x[:, 0]
+        delta_0 = x[:, 1]
+        delta_inf = x[:, 2]
+
+        Phi, PrimSq, IntPrimPrim, IntPhiPhi = gaussian_moments(
+            mu,
+            delta_0,
+            delta_inf,
+            ["Phi", "PrimSq", "IntPrimPrim", "IntPhiPhi"],
+            num_pts=gauss_quad_pts,
+        )
+
+        F = Mm * Mn * Phi
+        G_squared = delta_inf ** 2 + 2 * (
+            (g ** 2) * (PrimSq - IntPrimPrim)
+            + (Mn ** 2) * (Sm ** 2) * (Phi ** 2) * (delta_0 - delta_inf)
+        )
+        G = np.sqrt(np.maximum(G_squared, 0.0))
+        H = (g ** 2) * IntPhiPhi + (Mn ** 2) * (Sm ** 2) * (Phi ** 2)
+        return np.stack([F, G, H], axis=1)
+
+    x_init = np.stack([mu_init, delta_0_init, delta_inf_init], axis=1)
+    non_neg = [False, True, True]
+    xs_end, _ = active_set_langevin_np(
+        f, x_init, eps, num_its, non_neg, tol=tol, callback=callback
+    )
+    mu = xs_end[:, 0]
+    delta_0 = xs_end[:, 1]
+    delta_inf = xs_end[:, 2]
+    return mu, delta_0, delta_inf
+
+
 def rank1_input_chaotic_solve_np(
     mu_init,
     kappa_init,
@@ -377,13 +707,20 @@ def rank1_input_chaotic_solve_np(
     eps,
     gauss_quad_pts=50,
     db=False,
+    integrals="quadrature",
+    tol=None,
+    callback=None,
 ):
 
     square_diff_init = (np.square(delta_0_init) - np.square(delta_inf_init)) / 2.0
     SI_squared = (SmI ** 2 / Sm ** 2) + (SnI ** 2) / (Sn ** 2) + Sperp ** 2
 
+    gaussian_moments = NP_INTEGRALS[integrals]
+    params = [g, Mm, Mn, MI, Sm, SmI, SnI, SI_squared]
+
     # convergence equations used for langevin-like dynamimcs solver
-    def f(x):
+    def f(x, inds):
+        g, Mm, Mn, MI, Sm, SmI, SnI, SI_squared = take_rows(params, inds)
         mu = x[:, 0]
         kappa = x[:, 1]
         square_diff = x[:, 2]
@@ -391,11 +728,13 @@ def rank1_input_chaotic_solve_np(
 
         delta_0 = np.sqrt(2 * square_diff + np.square(delta_inf))
 
-        Phi = npi.Phi(mu, delta_0, num_pts=gauss_quad_pts)
-        Prime = npi.Prime(mu, delta_0, num_pts=gauss_quad_pts)
-        PrimSq = npi.PrimSq(mu, delta_0, num_pts=gauss_quad_pts)
-        IntPrimPrim = npi.IntPrimPrim(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
-        IntPhiPhi = npi.IntPhiPhi(mu, delta_0, delta_inf, num_pts=gauss_quad_pts)
+        Phi, Prime, PrimSq, IntPrimPrim, IntPhiPhi = gaussian_moments(
+            mu,
+            delta_0,
+            delta_inf,
+            ["Phi", "Prime", "PrimSq", "IntPrimPrim", "IntPhiPhi"],
+            num_pts=gauss_quad_pts,
+        )
 
         F = Mm * kappa + MI  # mu
         G = Mn * Phi + SnI * Prime
@@ -414,10 +753,12 @@ def rank1_input_chaotic_solve_np(
     x_init = np.stack([mu_init, kappa_init, square_diff_init, delta_inf_init], axis=1)
     non_neg = [False, False, True, True]
 
+    outs = active_set_langevin_np(
+        f, x_init, eps, num_its, non_neg, tol=tol, db=db, callback=callback
+    )
+    xs_end = outs[0]
     if db:
-        xs_end, xs = bounded_langevin_dyn_np(f, x_init, eps, num_its, non_neg, db=db)
-    else:
-        xs_end = bounded_langevin_dyn_np(f, x_init, eps, num_its, non_neg, db=db)
+        xs = outs[2]
 
     mu = xs_end[:, 0]
     kappa = xs_end[:, 1]
@@ -449,22 +790,30 @@ def rank2_CDD_static_solve_np(
     eps,
     num_pts=200,
     db=False,
+    integrals="quadrature",
+    tol=None,
+    callback=None,
 ):
     # Use equations 159 and 160 from M&O 2018
 
     SI = 1.2
     Sy = 1.2
 
+    gaussian_moments = NP_INTEGRALS[integrals]
+    params = [cA, cB, g, rhom, rhon, betam, betan, gammaA, gammaB]
+
     # convergence equations used for langevin-like dynamimcs solver
-    def f(x):
+    def f(x, inds):
+        cA, cB, g, rhom, rhon, betam, betan, gammaA, gammaB = take_rows(params, inds)
         kappa1 = x[:, 0]
         kappa2 = x[:, 1]
         delta_0 = x[:, 2]
 
         mu = np.zeros((1,))
 
-        Prime = npi.Prime(mu, delta_0, num_pts=num_pts)
-        PhiSq = npi.PhiSq(mu, delta_0, num_pts=num_pts)
+        Prime, PhiSq = gaussian_moments(
+            mu, delta_0, None, ["Prime", "PhiSq"], num_pts=num_pts
+        )
 
         F = (
             rhom * rhon * kappa1
@@ -491,10 +840,12 @@ def rank2_CDD_static_solve_np(
     x_init = np.stack([kappa1_init, kappa2_init, delta_0_init], axis=1)
     non_neg = [False, False, True]
 
+    outs = active_set_langevin_np(
+        f, x_init, eps, num_its, non_neg, tol=tol, db=db, callback=callback
+    )
+    xs_end = outs[0]
     if db:
-        xs_end, xs = bounded_langevin_dyn_np(f, x_init, eps, num_its, non_neg, db=db)
-    else:
-        xs_end = bounded_langevin_dyn_np(f, x_init, eps, num_its, non_neg, db=db)
+        xs = outs[2]
 
     kappa1 = xs_end[:, 0]
     kappa2 = xs_end[:, 1]
@@ -502,7 +853,7 @@ def rank2_CDD_static_solve_np(
 
     mu = np.zeros((1,))
 
-    Prime = npi.Prime(mu, delta_0)
+    Prime = npi.Prime(mu, delta_0, num_pts=num_pts)
 
     z = betam * (kappa1 + kappa2) * Prime
 
@@ -512,144 +863,285 @@ def rank2_CDD_static_solve_np(
         return kappa1, kappa2, delta_0, z
 
 
-def warm_start(system):
+# Warm start grid settings
+WS_ITS = 1500
+# grid points stop iterating once converged
+WS_TOL = 1e-10
+# approximate lattice points per warm start store block
+WS_BLOCK_POINTS = 10000
+
+
+def warm_start_grid_shard(grid_vals_list, start, stop):
+    """Parameters of grid points start to stop of the warm start grid.
+
+    Grid points are enumerated in 'ij' (C) order of grid_vals_list, so the
+    grid is never materialized.
+
+    # Arguments
+        grid_vals_list (list): Values of each parameter.
+        start (int): First flat grid index.
+        stop (int): One past the last flat grid index.
+
+    # Returns
+        grid (np.array): (num_params, stop-start) parameter values.
+
+    """
+    nvals = [vals.shape[0] for vals in grid_vals_list]
+    inds = np.unravel_index(np.arange(start, stop), nvals)
+    return np.stack([vals[ind] for vals, ind in zip(grid_vals_list, inds)], axis=0)
+
+
+def solve_warm_start_grid(rank, behavior_type, grid, eps, history=False):
+    """Solves the warm start DMFT equations on a grid of parameters.
+
+    # Arguments
+        rank (int): Network rank.
+        behavior_type (str): Behavior type.
+        grid (np.array): (num_params, m) values of system.all_params.
+        eps (float): Langevin dynamics step size.
+        history (bool): Also return the solver histories.
+
+    # Returns
+        solutions (np.array): (m, ...) solutions.
+        xs (np.array): (m, ..., T) solver histories (None unless history).
+
+    """
+    m = grid.shape[1]
+    xs = None
+    if rank == 2 and behavior_type == "CDD":
+        solutions = np.zeros((m, 2, 2, 3))
+        xs_list = []
+        for cA in [0, 1]:
+            for cB in [0, 1]:
+                _cA = cA * np.ones((m,))
+                _cB = cB * np.ones((m,))
+                kappa1_init = -5.0 * np.ones((m,))
+                kappa2_init = -4.0 * np.ones((m,))
+                delta0_init = 2.0 * np.ones((m,))
+                outs = rank2_CDD_static_solve_np(
+                    kappa1_init,
+                    kappa2_init,
+                    delta0_init,
+                    _cA,
+                    _cB,
+                    grid[0],
+                    grid[1],
+                    grid[2],
+                    grid[3],
+                    grid[4],
+                    grid[5],
+                    grid[6],
+                    WS_ITS,
+                    eps,
+                    num_pts=50,
+                    db=history,
+                    tol=WS_TOL,
+                )
+                kappa1, kappa2, delta_0 = outs[:3]
+                solutions[:, cA, cB] = np.stack((kappa1, kappa2, delta_0), axis=1)
+                if history:
+                    xs_list.append(outs[4])
+        if history:
+            xs = np.stack(pad_history(xs_list), axis=1)
+    elif rank == 1 and behavior_type == "BI":
+        mu_init = 5.0 * np.ones((m,))
+        kappa_init = 5.0 * np.ones((m,))
+        delta_0_init = 5.0 * np.ones((m,))
+        delta_inf_init = 4.0 * np.ones((m,))
+        outs = rank1_input_chaotic_solve_np(
+            mu_init,
+            kappa_init,
+            delta_0_init,
+            delta_inf_init,
+            grid[0],
+            grid[1],
+            grid[2],
+            grid[3],
+            grid[4],
+            grid[5],
+            grid[6],
+            grid[7],
+            grid[8],
+            WS_ITS,
+            eps,
+            gauss_quad_pts=50,
+            db=history,
+            tol=WS_TOL,
+        )
+        mu, kappa, delta_0, delta_inf = outs[:4]
+        solutions = np.stack((mu, kappa, delta_0, delta_inf), axis=1)
+        if history:
+            xs = outs[4]
+    else:
+        raise NotImplementedError(
+            "No warm start for rank %d %s networks." % (rank, behavior_type)
+        )
+    return solutions, xs
+
+
+def get_warm_start_key(system):
+    """Everything warm start solutions depend on besides the free parameters.
+
+    Includes the source of the warm start solver equations, so that any
+    change to them starts a new store, and the lattice step.
+
+    # Arguments
+        system (obj): LowRankRNN instance.
+
+    # Returns
+        key (dict): Warm start store key.
+
+    """
+    rank = system.model_opts["rank"]
+    behavior_type = system.behavior["type"]
+    if rank == 2 and behavior_type == "CDD":
+        solver = rank2_CDD_static_solve_np
+    else:
+        solver = rank1_input_chaotic_solve_np
+    equations = inspect.getsource(solver) + inspect.getsource(solve_warm_start_grid)
+    fixed_params = {}
+    for param in system.all_params:
+        if param not in system.free_params:
+            fixed_params[param] = float(system.fixed_params[param])
+    return {
+        "rank": rank,
+        "behavior_type": behavior_type,
+        "all_params": list(system.all_params),
+        "free_params": list(system.free_params),
+        "fixed_params": fixed_params,
+        "equations": hashlib.sha1(equations.encode("utf-8")).hexdigest(),
+        "num_pts": 50,
+        "eps": float(system.solve_eps),
+        "num_its": WS_ITS,
+        "tol": WS_TOL,
+        "step": float(system.warm_start_grid_step),
+    }
+
+
+def solve_warm_start_block(args):
+    """Solves one block of a warm start store and saves it.
+
+    Module level so that it can be sent to a process pool.
+
+    # Arguments
+        args (tuple): (store_dir, block, block_size, step, key, history).
+
+    # Returns
+        block (tuple): Block indices.
+
+    """
+    store_dir, block, block_size, step, key, history = args
+    lattice = block_lattice(block, block_size)
+    m = lattice.shape[1]
+    grid = []
+    j = 0
+    for param in key["all_params"]:
+        if param in key["free_params"]:
+            grid.append(step * lattice[j])
+            j += 1
+        else:
+            grid.append(key["fixed_params"][param] * np.ones((m,)))
+    grid = np.stack(grid, axis=0)
+    solutions, xs = solve_warm_start_grid(
+        key["rank"], key["behavior_type"], grid, key["eps"], history
+    )
+    save_block(store_dir, block, solutions, xs)
+    return block
+
+
+def warm_start(system, num_procs=None, block_points=WS_BLOCK_POINTS, history=False):
+    """Solves the DMFT equations on a grid of parameters for warm starts.
+
+    The grid is the lattice step*k of the free parameters covering [a, b]
+    (step = system.warm_start_grid_step).  Its solutions come from the
+    content-addressed warm start store of the system (see
+    dsn.util.warm_start_store): blocks of the lattice already solved for the
+    same equations, fixed parameters and solver settings are reused, and the
+    missing blocks are solved on a pool of num_procs processes.  Jobs sharing
+    a store coordinate through file locks, and an interrupted run resumes
+    from the finished blocks.
+
+    # Arguments
+        system (obj): LowRankRNN instance.
+        num_procs (int): Number of processes (defaults to the available CPUs).
+        block_points (int): Approximate lattice points per block of a new
+                            store.
+        history (bool): Also store the solver histories xs.
+
+    # Returns
+        ws_filename (str): Warm start file of the [a, b] grid.
+        xs (np.array): Solver histories (None unless history).
+
+    """
     assert system.name == "LowRankRNN"
     ws_filename = get_warm_start_dir(system)
     print(ws_filename)
-    ws_its = 1500
-    if not os.path.isfile(ws_filename):
-        rank = system.model_opts["rank"]
-        behavior_type = system.behavior["type"]
-        if rank == 2 and behavior_type == "CDD":
-            cAs = [0, 1]
-            cBs = [0, 1]
-            a = system.a
-            b = system.b
-            step = system.warm_start_grid_step
-            grid_vals_list = []
-            nvals = []
-            j = 0
-            for i in range(len(system.all_params)):
-                param = system.all_params[i]
-                if param in system.free_params:
-                    vals = np.arange(a[j], b[j] + step, step)
-                    j += 1
-                else:
-                    vals = np.array([system.fixed_params[param]])
-                grid_vals_list.append(vals)
-                nvals.append(vals.shape[0])
-            m = np.prod(np.array(nvals))
-
-            grid = np.array(np.meshgrid(*grid_vals_list))
-            grid = np.reshape(grid, (len(system.all_params), m))
-
-            solution_grids = np.zeros((2, 2, m, 3))
-            for cA in cAs:
-                for cB in cBs:
-                    _cA = cA * np.ones((m,))
-                    _cB = cB * np.ones((m,))
-                    kappa1_init = -5.0 * np.ones((m,))
-                    kappa2_init = -4.0 * np.ones((m,))
-                    delta0_init = 2.0 * np.ones((m,))
-                    kappa1, kappa2, delta_0, z, xs = rank2_CDD_static_solve_np(
-                        kappa1_init,
-                        kappa2_init,
-                        delta0_init,
-                        _cA,
-                        _cB,
-                        grid[0],
-                        grid[1],
-                        grid[2],
-                        grid[3],
-                        grid[4],
-                        grid[5],
-                        grid[6],
-                        ws_its,
-                        system.solve_eps,
-                        num_pts=50,
-                        db=True,
-                    )
-
-                    solution_grids[cA, cB] = np.stack((kappa1, kappa2, delta_0), axis=1)
-        elif rank == 1 and behavior_type == "BI":
-            step = system.warm_start_grid_step
-            a = system.a
-            b = system.b
-            free_param_inds = []
-            grid_vals_list = []
-            nvals = []
-            j = 0
-            for i in range(len(system.all_params)):
-                param = system.all_params[i]
-                if param in system.free_params:
-                    vals = np.arange(a[j], b[j] + step, step)
-                    free_param_inds.append(i)
-                    j += 1
-                else:
-                    vals = np.array([system.fixed_params[param]])
-                grid_vals_list.append(vals)
-                nvals.append(vals.shape[0])
-            print("nvals", nvals)
-            m = np.prod(np.array(nvals))
-            print("m", m)
-
-            grid = np.array(np.meshgrid(*grid_vals_list))
-            grid = np.reshape(grid, (len(system.all_params), m))
-
-            mu_init = 5.0 * np.ones((m,))
-            kappa_init = 5.0 * np.ones((m,))
-            delta_0_init = 5.0 * np.ones((m,))
-            delta_inf_init = 4.0 * np.ones((m,))
-
-            mu, kappa, delta_0, delta_inf, xs = rank1_input_chaotic_solve_np(
-                mu_init,
-                kappa_init,
-                delta_0_init,
-                delta_inf_init,
-                grid[0],
-                grid[1],
-                grid[2],
-                grid[3],
-                grid[4],
-                grid[5],
-                grid[6],
-                grid[7],
-                grid[8],
-                ws_its,
-                system.solve_eps,
-                gauss_quad_pts=50,
-                db=True,
-            )
-            solution_grid = np.stack((mu, kappa, delta_0, delta_inf), axis=1)
-
-        np.savez(
-            ws_filename,
-            param_grid=grid[free_param_inds, :],
-            solution_grid=solution_grid,
-            xs=xs,
-        )
-    else:
-        print("Already warm_started.")
-        print(ws_filename)
+    if os.path.isfile(ws_filename):
         npzfile = np.load(ws_filename)
-        xs = npzfile["xs"]
+        if not history or "xs" in npzfile.files:
+            print("Already warm_started.")
+            xs = npzfile["xs"] if "xs" in npzfile.files else None
+            return ws_filename, xs
+
+    key = get_warm_start_key(system)
+    step = system.warm_start_grid_step
+    num_free = len(system.free_params)
+    block_size = max(2, int(np.round(block_points ** (1.0 / num_free))))
+    store_dir, manifest = open_store(key, step, block_size)
+    block_size = manifest["block_size"]
+
+    k_lo, k_hi = lattice_range(system.a, system.b, step)
+    nvals = k_hi - k_lo + 1
+    m = int(np.prod(nvals))
+    print("nvals", nvals)
+    print("m", m)
+    blocks = overlapping_blocks(k_lo, k_hi, block_size)
+    todo = missing_blocks(store_dir, blocks, history)
+    print("%d of %d blocks left" % (len(todo), len(blocks)))
+
+    args = [(store_dir, block, block_size, step, key, history) for block in todo]
+    if num_procs is None:
+        num_procs = len(os.sched_getaffinity(0))
+    num_procs = max(1, min(num_procs, len(todo)))
+    if num_procs > 1:
+        with multiprocessing.Pool(num_procs) as pool:
+            blocks_done = pool.imap_unordered(solve_warm_start_block, args)
+            for i, block in enumerate(blocks_done):
+                add_block(store_dir, block, block_size, step, history)
+                print("%d/%d block %s" % (i + 1, len(todo), block_name(block)))
+    else:
+        for i, block_args in enumerate(args):
+            block = solve_warm_start_block(block_args)
+            add_block(store_dir, block, block_size, step, history)
+            print("%d/%d block %s" % (i + 1, len(todo), block_name(block)))
+
+    solution_grid = assemble_box(store_dir, k_lo, k_hi, block_size)
+    if key["rank"] == 2 and key["behavior_type"] == "CDD":
+        # (2, 2, m, 3) solutions for each cA, cB
+        solution_grid = np.transpose(solution_grid, [1, 2, 0, 3])
+    grid_vals_list = [step * np.arange(lo, hi + 1) for lo, hi in zip(k_lo, k_hi)]
+    param_grid = warm_start_grid_shard(grid_vals_list, 0, m)
+
+    # values of each free parameter, concatenated
+    ws = {
+        "param_grid": param_grid,
+        "solution_grid": solution_grid,
+        "grid_shape": nvals,
+        "grid_vals": np.concatenate(grid_vals_list),
+    }
+    xs = None
+    if history:
+        xs = assemble_box(store_dir, k_lo, k_hi, block_size, field="xs")
+        ws["xs"] = xs
+    np.savez(ws_filename, **ws)
     return ws_filename, xs
 
 
 def get_warm_start_dir(system):
-    rank = system.model_opts["rank"]
-    type = system.behavior["type"]
+    """Warm start file of the [a, b] grid, inside the system's store."""
+    store_dir = get_store_dir(get_warm_start_key(system))
     a_str = get_array_str(system.a)
     b_str = get_array_str(system.b)
     step = system.warm_start_grid_step
-    ws_dir = "data/warm_starts/"
-    if not os.path.isdir(ws_dir):
-        os.makedirs(ws_dir)
-    ws_filename = ws_dir + "rank%d_%s_a=%s_b=%s_step=%.2E.npz" % (
-        rank,
-        type,
-        a_str,
-        b_str,
-        step,
-    )
+    ws_filename = store_dir + "a=%s_b=%s_step=%.2E.npz" % (a_str, b_str, step)
     return ws_filename
@@ -0,0 +1,418 @@
+# Copyright 2019 Sean Bittner, Columbia University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# ==============================================================================
+import tensorflow as tf
+import numpy as np
+import hashlib
+import weakref
+import os
+from contextlib import contextmanager
+from dsn.util.tf_session_util import xla_suff_stats
+
+DTYPE = tf.float64
+
+# Graph collection holding the variables created by graph_array.
+GRAPH_ARRAYS = "graph_arrays"
+
+# When True, graph_array falls back to tf.constant (arrays are serialized
+# into the GraphDef).  Only useful for comparing graph sizes.
+EMBED_GRAPH_ARRAYS = False
+
+# Arrays with fewer elements than this are embedded as constants, so that
+# meta graphs restored without their graph arrays file still evaluate them.
+GRAPH_ARRAY_MIN_SIZE = 1024
+
+# Graph arrays of a saved model, written next to its checkpoints by train_dsn
+# (see save_graph_arrays and restore_graph_arrays).
+GRAPH_ARRAYS_FILE = "graph_arrays.npz"
+
+# graph -> {initializer name: (placeholder name, np.array)}
+_graph_array_values = weakref.WeakKeyDictionary()
+
+SYSTEM_GRAPH_CACHE_DIR = "data/graph_cache/"
+
+
+def graph_array(value, name, dtype=DTYPE):
+    """Makes a large numpy array available to the graph without embedding it.
+
+    The array is held in a non-trainable variable that is initialized by
+    feeding the value once at session start (see initialize_graph_arrays).
+    This keeps the GraphDef, and thus every saved model-k.meta, small.  The
+    variables are kept out of tf.GraphKeys.GLOBAL_VARIABLES, so they are
+    neither written to checkpoints nor run by tf.global_variables_initializer.
+    Their values are saved with save_graph_arrays instead, and a meta graph
+    imported with tf.train.import_meta_graph needs restore_graph_arrays.
+    Arrays smaller than GRAPH_ARRAY_MIN_SIZE are embedded as constants.
+
+    # Arguments
+        value (np.array): Array to hold in the graph.
+        name (str): Name of the variable.
+        dtype (tf.dtype): Tensorflow dtype of the variable.
+
+    # Returns
+        array (tf.tensor): Tensor holding value once initialized.
+
+    """
+    value = np.asarray(value, dtype=dtype.as_numpy_dtype)
+    if EMBED_GRAPH_ARRAYS or value.size < GRAPH_ARRAY_MIN_SIZE:
+        return tf.constant(value, dtype=dtype, name=name)
+
+    graph = tf.get_default_graph()
+    with tf.name_scope(name):
+        init_ph = tf.placeholder(dtype, value.shape, name="init")
+        array = tf.Variable(
+            init_ph, trainable=False, collections=[GRAPH_ARRAYS], name="array"
+        )
+    register_graph_array(array.initializer.name, init_ph.name, value, graph)
+    return array
+
+
+def graph_buffer(value, name, dtype=DTYPE):
+    """Non-trainable variable initialized like a graph array.
+
+    Unlike graph_array, this is always a variable, so it can be updated
+    (e.g. with tf.scatter_update) to carry state across session runs.
+
+    # Arguments
+        value (np.array): Initial value.
+        name (str): Name of the variable.
+        dtype (tf.dtype): Tensorflow dtype of the variable.
+
+    # Returns
+        buffer (tf.Variable): Buffer holding value once initialized.
+
+    """
+    value = np.asarray(value, dtype=dtype.as_numpy_dtype)
+    graph = tf.get_default_graph()
+    with tf.name_scope(name):
+        init_ph = tf.placeholder(dtype, value.shape, name="init")
+        buffer = tf.Variable(
+            init_ph, trainable=False, collections=[GRAPH_ARRAYS], name="buffer"
+        )
+    register_graph_array(buffer.initializer.name, init_ph.name, value, graph)
+    return buffer
+
+
+@contextmanager
+def graph_root_scope(graph=None):
+    """Builds ops at the root of the graph.
+
+    Ops created in this context are outside of any control flow (e.g. a
+    while loop body), name scope or control dependencies they are requested
+    in, so they can be created once and shared by the whole graph.
+
+    # Arguments
+        graph (tf.Graph): Graph (default graph if None).
+
+    """
+    if graph is None:
+        graph = tf.get_default_graph()
+    control_flow_context = graph._get_control_flow_context()
+    graph._set_control_flow_context(None)
+    try:
+        with graph.name_scope(None), graph.control_dependencies(None):
+            yield
+    finally:
+        graph._set_control_flow_context(control_flow_context)
+
+
+def register_graph_array(init_name, init_ph_name, value, graph=None):
+    """Records the value fed to the initializer of a graph array.
+
+    # Arguments
+        init_name (str): Name of the variable initializer op.
+        init_ph_name (str): Name of the placeholder feeding the initializer.
+        value (np.array): Value of the array.
+        graph (tf.Graph): Graph containing the array (default graph if None).
+
+    """
+    if graph is None:
+        graph = tf.get_default_graph()
+    if graph not in _graph_array_values:
+        _graph_array_values[graph] = {}
+    _graph_array_values[graph][init_name] = (init_ph_name, value)
+    return None
+
+
+def get_graph_arrays(graph=None):
+    """Returns the registered graph arrays of a graph.
+
+    # Arguments
+        graph (tf.Graph): Graph containing the arrays (default graph if None).
+
+    # Returns
+        graph_arrays (dict): Initializer name -> (placeholder name, np.array).
+
+    """
+    if graph is None:
+        graph = tf.get_default_graph()
+    return _graph_array_values.get(graph, {})
+
+
+def initialize_graph_arrays(sess):
+    """Initializes all graph arrays of the session's graph.
+
+    Must be run after the graph is built and before any system statistics
+    are evaluated.  Safe to call more than once.
+
+    # Arguments
+        sess (tf.Session): Session to initialize the arrays in.
+
+    """
+    graph = sess.graph
+    init_ops = []
+    feed_dict = {}
+    for init_name, (init_ph_name, value) in get_graph_arrays(graph).items():
+        init_ops.append(graph.get_operation_by_name(init_name))
+        feed_dict.update({graph.get_tensor_by_name(init_ph_name): value})
+    if len(init_ops) > 0:
+        sess.run(init_ops, feed_dict)
+    return None
+
+
+def save_graph_arrays(fname, graph=None):
+    """Saves the values of the graph arrays of a graph.
+
+    # Arguments
+        fname (str): .npz file to write.
+        graph (tf.Graph): Graph containing the arrays (default graph if None).
+
+    """
+    init_names = []
+    init_ph_names = []
+    array_dict = {}
+    for init_name, (init_ph_name, value) in get_graph_arrays(graph).items():
+        array_dict.update({"array%d" % len(init_names): value})
+        init_names.append(init_name)
+        init_ph_names.append(init_ph_name)
+    np.savez(
+        fname,
+        init_names=np.array(init_names, dtype=str),
+        init_ph_names=np.array(init_ph_names, dtype=str),
+        **array_dict
+    )
+    return None
+
+
+def load_graph_arrays(fname, import_scope=None, graph=None):
+    """Registers saved graph arrays with a graph they were imported into.
+
+    # Arguments
+        fname (str): .npz file written by save_graph_arrays.
+        import_scope (str): Scope the meta graph was imported under.
+        graph (tf.Graph): Graph containing the arrays (default graph if None).
+
+    """
+    prefix = "" if import_scope is None else import_scope + "/"
+    arrays = np.load(fname)
+    init_names = arrays["init_names"]
+    init_ph_names = arrays["init_ph_names"]
+    for i in range(init_names.shape[0]):
+        register_graph_array(
+            prefix + init_names[i],
+            prefix + init_ph_names[i],
+            arrays["array%d" % i],
+            graph,
+        )
+    return None
+
+
+def restore_graph_arrays(sess, fname, import_scope=None):
+    """Initializes the graph arrays of a meta graph restored into a session.
+
+    Use after tf.train.import_meta_graph and saver.restore, e.g.
+
+        saver = tf.train.import_meta_graph(savedir + "model-%d.meta" % k)
+        saver.restore(sess, savedir + "model-%d" % k)
+        restore_graph_arrays(sess, savedir + GRAPH_ARRAYS_FILE)
+
+    Arrays built in the session's graph after the import are initialized as
+    well.  Models saved before graph arrays existed have no arrays file, and
+    only those built after the import are initialized.
+
+    # Arguments
+        sess (tf.Session): Session of the restored graph.
+        fname (str): .npz file written by save_graph_arrays.
+        import_scope (str): Scope the meta graph was imported under.
+
+    """
+    if os.path.exists(fname):
+        load_graph_arrays(fname, import_scope, sess.graph)
+    else:
+        print("No graph arrays file %s." % fname)
+    initialize_graph_arrays(sess)
+    return None
+
+
+def graph_def_size(graph=None):
+    """Size in bytes of the serialized GraphDef.
+
+    # Arguments
+        graph (tf.Graph): Graph to measure (default graph if None).
+
+    # Returns
+        size (int): Number of bytes.
+
+    """
+    if graph is None:
+        graph = tf.get_default_graph()
+    return graph.as_graph_def().ByteSize()
+
+
+def system_graph_key(system):
+    """Hash identifying the system subgraph built by compute_suff_stats.
+
+    The key covers the system class and all of its configuration
+    (fixed_params, behavior, model_opts and the remaining numeric
+    attributes such as frozen noise), the tensorflow version, and the
+    source code of dsn.util.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+
+    # Returns
+        key (str): Hex digest.
+
+    """
+    h = hashlib.sha1()
+    h.update(system.name.encode())
+    h.update(type(system).__name__.encode())
+    h.update(tf.__version__.encode())
+    for attr in sorted(vars(system).keys()):
+        val = getattr(system, attr)
+        if isinstance(val, (tf.Tensor, tf.Variable, tf.Operation)) or callable(val):
+            continue
+        h.update(attr.encode())
+        _hash_obj(h, val)
+    h.update(dsn_util_code_hash().encode())
+    return h.hexdigest()
+
+
+def dsn_util_code_hash():
+    """Hash of the source files of dsn.util."""
+    h = hashlib.sha1()
+    util_dir = os.path.dirname(os.path.abspath(__file__))
+    for fname in sorted(os.listdir(util_dir)):
+        if fname.endswith(".py"):
+            with open(os.path.join(util_dir, fname), "rb") as f:
+                h.update(fname.encode())
+                h.update(f.read())
+    return h.hexdigest()
+
+
+def _hash_obj(h, obj):
+    if isinstance(obj, dict):
+        h.update(b"dict")
+        for key in sorted(obj.keys(), key=str):
+            h.update(str(key).encode())
+            _hash_obj(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"list")
+        for el in obj:
+            _hash_obj(h, el)
+    elif isinstance(obj, np.ndarray):
+        h.update(str(obj.dtype).encode())
+        h.update(str(obj.shape).encode())
+        if obj.dtype == object:
+            _hash_obj(h, obj.tolist())
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, tf.DType):
+        h.update(obj.name.encode())
+    elif isinstance(obj, (str, bool, int, float, complex, np.generic)) or obj is None:
+        h.update(repr(obj).encode())
+    else:
+        # Objects without a stable representation only contribute their type.
+        h.update(type(obj).__name__.encode())
+    return None
+
+
+def cached_suff_stats(system, Z, cache_dir=SYSTEM_GRAPH_CACHE_DIR, xla=None):
+    """Computes T(x) by importing the system subgraph from an on-disk cache.
+
+    On a cache miss, the system subgraph (Z -> T(x)) is built in a separate
+    graph and written to cache_dir as a MetaGraphDef along with the values of
+    its graph arrays.  On a hit, that meta graph is imported with Z mapped to
+    its input, skipping system.compute_suff_stats entirely.  Attributes that
+    compute_suff_stats sets as a side effect (e.g. simulated activity) are not
+    available for cached graphs, so behaviors with bounds (which need them in
+    compute_I_x) are always built directly.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        Z (tf.tensor): [1, M, D] density network system parameter samples.
+        cache_dir (str): Directory of the system graph cache.
+        xla (str): XLA mode the subgraph is built with (see tf_session_util).
+
+    # Returns
+        T_x (tf.tensor): Sufficient statistics of samples.
+
+    """
+    if "bounds" in system.behavior.keys():
+        return xla_suff_stats(system, Z, xla)
+
+    key = system_graph_key(system)
+    if xla is not None:
+        key = key + "_xla_" + xla
+    meta_file = os.path.join(cache_dir, "%s_%s.meta" % (system.name, key))
+    arrays_file = os.path.join(cache_dir, "%s_%s_arrays.npz" % (system.name, key))
+    if os.path.exists(meta_file) and os.path.exists(arrays_file):
+        print("System graph cache hit: %s" % meta_file)
+    else:
+        print("System graph cache miss: %s" % meta_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_system_graph(system, Z.dtype, meta_file, arrays_file, xla)
+
+    graph = tf.get_default_graph()
+    with graph.name_scope(None):
+        import_scope = graph.unique_name("system_graph", mark_as_used=False)
+        tf.train.import_meta_graph(
+            meta_file,
+            clear_devices=True,
+            import_scope=import_scope,
+            input_map={"Z:0": Z},
+        )
+    T_x = graph.get_tensor_by_name(import_scope + "/T_x:0")
+    load_graph_arrays(arrays_file, import_scope, graph)
+    return T_x
+
+
+def _write_system_graph(system, dtype, meta_file, arrays_file, xla=None):
+    """Writes the system subgraph and its graph arrays to the cache.
+
+    Both files are written under temporary names and moved into place with
+    os.replace, the arrays first.  The meta graph is only present once its
+    arrays are, so concurrent or interrupted jobs never import a truncated or
+    mismatched pair (writers with the same key write the same pair).
+
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        Z = tf.placeholder(dtype, (1, None, system.D), name="Z")
+        T_x = xla_suff_stats(system, Z, xla)
+        T_x = tf.identity(T_x, name="T_x")
+    tmp_str = "_%d_tmp" % os.getpid()
+    tmp_meta_file = meta_file[:-5] + tmp_str + ".meta"
+    tmp_arrays_file = arrays_file[:-4] + tmp_str + ".npz"
+    tf.train.export_meta_graph(
+        filename=tmp_meta_file,
+        graph=graph,
+        clear_devices=True,
+        collection_list=[tf.GraphKeys.WHILE_CONTEXT, tf.GraphKeys.COND_CONTEXT],
+    )
+    save_graph_arrays(tmp_arrays_file, graph)
+    os.replace(tmp_arrays_file, arrays_file)
+    os.replace(tmp_meta_file, meta_file)
+    return None
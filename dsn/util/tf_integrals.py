@@ -5,36 +5,54 @@
 
 import numpy as np
 import tensorflow as tf
+import weakref
+from dsn.util.gauss_quadrature import gauss_hermite
+from dsn.util.tf_graph_util import graph_root_scope
 
 #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
 #### Computing Gaussian integrals through Gauss-Hermite quadrature
 # here phi(x) = tanh(x)
 
-# Global variables for Gaussian quadrature
-def get_quadrature(num_pts, double=False):
-    gauss_norm = 1 / np.sqrt(np.pi)
-    gauss_points, gauss_weights = np.polynomial.hermite.hermgauss(num_pts)
-    gauss_points = np.expand_dims(gauss_points * np.sqrt(2), 0)
-
-    if double:
-        gauss_points_inner = np.expand_dims(gauss_points, 1)
-        gauss_points_outer = np.expand_dims(gauss_points, 2)
-        return (
-            gauss_norm,
-            gauss_points,
-            gauss_weights,
-            gauss_points_inner,
-            gauss_points_outer,
-        )
-    else:
-        return gauss_norm, gauss_points, gauss_weights
+# Quadrature constants shared by all integrals built in a graph
+# graph -> {(num_pts, double, dtype): quadrature tuple}
+_graph_quadratures = weakref.WeakKeyDictionary()
+
+
+def get_quadrature(num_pts, double=False, dtype=tf.float64):
+    """Gauss-Hermite quadrature as constants of the default graph.
+
+    The constants are created once per graph and (num_pts, double, dtype),
+    outside of any control flow (e.g. the Langevin while loop) or name
+    scope they are first requested in, so that every integral reuses them.
+
+    # Arguments
+        num_pts (int): Number of quadrature points.
+        double (bool): Also return points shaped for nested integrals.
+        dtype (tf.dtype): Dtype of the points and weights.
+
+    # Returns
+        Same as dsn.util.gauss_quadrature.gauss_hermite with tf constants.
+
+    """
+    graph = tf.get_default_graph()
+    key = (num_pts, double, dtype)
+    quadratures = _graph_quadratures.setdefault(graph, {})
+    if key not in quadratures:
+        np_quadrature = gauss_hermite(num_pts, double, dtype.as_numpy_dtype)
+        names = ["points", "weights", "points_inner", "points_outer"]
+        with graph_root_scope(graph), tf.name_scope("gauss_quadrature_%d" % num_pts):
+            quadrature = [np_quadrature[0]]
+            for array, name in zip(np_quadrature[1:], names):
+                quadrature.append(tf.constant(array, dtype=dtype, name=name))
+        quadratures[key] = tuple(quadrature)
+    return quadratures[key]
 
 
 #### Single Gaussian intergrals
 
 
 def Prim(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = tf.log(tf.math.cosh(mu + tf.sqrt(delta0) * gauss_points))
@@ -42,7 +60,7 @@ def Prim(mu, delta0, num_pts=200):
 
 
 def Phi(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = tf.tanh(mu + tf.sqrt(delta0) * gauss_points)
@@ -50,7 +68,7 @@ def Phi(mu, delta0, num_pts=200):
 
 
 def Prime(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = 1 - tf.square(tf.tanh(mu + tf.sqrt(delta0) * gauss_points))
@@ -58,7 +76,7 @@ def Prime(mu, delta0, num_pts=200):
 
 
 def Sec(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = (
@@ -70,7 +88,7 @@ def Sec(mu, delta0, num_pts=200):
 
 
 def Third(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = (
@@ -85,7 +103,7 @@ def Third(mu, delta0, num_pts=200):
 
 
 def PrimSq(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = tf.log(tf.math.cosh(mu + tf.sqrt(delta0) * gauss_points))
@@ -93,7 +111,7 @@ def PrimSq(mu, delta0, num_pts=200):
 
 
 def PhiSq(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = tf.tanh(mu + tf.sqrt(delta0) * gauss_points)
@@ -101,7 +119,7 @@ def PhiSq(mu, delta0, num_pts=200):
 
 
 def PrimeSq(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = 1 - (tf.tanh(mu + tf.sqrt(delta0) * gauss_points)) ** 2
@@ -109,7 +127,7 @@ def PrimeSq(mu, delta0, num_pts=200):
 
 
 def PhiPrime(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = tf.tanh(mu + tf.sqrt(delta0) * gauss_points) * (
@@ -119,7 +137,7 @@ def PhiPrime(mu, delta0, num_pts=200):
 
 
 def PrimPrime(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = (1 - (tf.tanh(mu + tf.sqrt(delta0) * gauss_points)) ** 2) * tf.log(
@@ -129,7 +147,7 @@ def PrimPrime(mu, delta0, num_pts=200):
 
 
 def PhiSec(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = (
@@ -141,7 +159,7 @@ def PhiSec(mu, delta0, num_pts=200):
 
 
 def PrimPhi(mu, delta0, num_pts=200):
-    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts)
+    gauss_norm, gauss_points, gauss_weights = get_quadrature(num_pts, dtype=mu.dtype)
     mu = tf.expand_dims(mu, 1)
     delta0 = tf.expand_dims(delta0, 1)
     integrand = tf.log(tf.math.cosh(mu + tf.sqrt(delta0) * gauss_points)) * tf.tanh(
@@ -155,7 +173,7 @@ def PrimPhi(mu, delta0, num_pts=200):
 
 def IntPrimPrim(mu, delta0, deltainf, num_pts=200):  # Performs the external integral
     gauss_norm, gauss_points, gauss_weights, gauss_points_inner, gauss_points_outer = get_quadrature(
-        num_pts, double=True
+        num_pts, double=True, dtype=mu.dtype
     )
     mu = tf.expand_dims(tf.expand_dims(mu, 1), 2)
     delta0 = tf.expand_dims(tf.expand_dims(delta0, 1), 2)
@@ -175,7 +193,7 @@ def IntPrimPrim(mu, delta0, deltainf, num_pts=200):  # Performs the external int
 
 def IntPhiPhi(mu, delta0, deltainf, num_pts=200):
     gauss_norm, gauss_points, gauss_weights, gauss_points_inner, gauss_points_outer = get_quadrature(
-        num_pts, double=True
+        num_pts, double=True, dtype=mu.dtype
     )
     mu = tf.expand_dims(tf.expand_dims(mu, 1), 2)
     delta0 = tf.expand_dims(tf.expand_dims(delta0, 1), 2)
@@ -193,7 +211,7 @@ def IntPhiPhi(mu, delta0, deltainf, num_pts=200):
 
 def IntPrimePrime(mu, delta0, deltainf, num_pts=200):
     gauss_norm, gauss_points, gauss_weights, gauss_points_inner, gauss_points_outer = get_quadrature(
-        num_pts, double=True
+        num_pts, double=True, dtype=mu.dtype
     )
     mu = tf.expand_dims(tf.expand_dims(mu, 1), 2)
     delta0 = tf.expand_dims(tf.expand_dims(delta0, 1), 2)
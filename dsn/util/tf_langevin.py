@@ -27,35 +27,60 @@ def langevin_dyn(f, x0, eps, num_its, db=False):
 
 MAXVAL = 150.0
 
+# Collection of the per-sample iteration counts of the while loop solvers.
+SOLVER_ITS = "dmft_solver_its"
 
-def bounded_langevin_dyn(f, x0, eps, num_its, non_neg, db=False):
-    """Tensorflow langevin dynamics
+# Fixed point solvers of fixed_point_solve
+#   "langevin" - bounded_langevin_dyn, num_its unrolled iterations.
+#   "while" - bounded_langevin_dyn_while, iterations in a tf.while_loop
+#             stopping when all samples converge.
+#   "anderson" - anderson_solve, Anderson accelerated iterations.
+#   "newton" - newton_solve, Newton's method with per-sample Jacobians.
+SOLVERS = ["langevin", "while", "anderson", "newton"]
 
-        # Arguments:
-            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
-            x0 (tf.tensor): (M,d) initial conditions.
-            eps (float): langevin dyanmics step size.
-            num_its (int): number of iterations.
-            non_neg (list): True if dimension is nonnegative. 
 
-        # Returns
-            x_i (tf.tensor): (M,d) consistency equation solution
+def get_clip_bounds(x0, non_neg):
+    """(M,d) lower and upper bounds of the solver states.
+
+    # Arguments:
+        x0 (tf.tensor): (M,d) initial conditions.
+        non_neg (list): True if dimension is nonnegative.
+
+    # Returns
+        clip_min (tf.tensor): (M,d) lower bounds.
+        clip_max (tf.tensor): (M,d) upper bounds.
     """
-    MAX_VAL = 150.0
     d = len(non_neg)
     M = tf.shape(x0)[0]
     clip_mins = np.zeros((d,))
-    clip_maxs = MAX_VAL * np.ones((d,))
+    clip_maxs = MAXVAL * np.ones((d,))
     for j in range(d):
         if non_neg[j]:
             clip_mins[j] = 0.0
         else:
-            clip_mins[j] = -MAX_VAL
+            clip_mins[j] = -MAXVAL
 
-    clip_min = tf.constant(np.expand_dims(clip_mins, 0))
-    clip_max = tf.constant(np.expand_dims(clip_maxs, 0))
+    clip_min = tf.constant(np.expand_dims(clip_mins, 0), dtype=x0.dtype)
+    clip_max = tf.constant(np.expand_dims(clip_maxs, 0), dtype=x0.dtype)
     clip_min = tf.tile(clip_min, [M, 1])
     clip_max = tf.tile(clip_max, [M, 1])
+    return clip_min, clip_max
+
+
+def bounded_langevin_dyn(f, x0, eps, num_its, non_neg, db=False):
+    """Tensorflow langevin dynamics
+
+        # Arguments:
+            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
+            x0 (tf.tensor): (M,d) initial conditions.
+            eps (float): langevin dyanmics step size.
+            num_its (int): number of iterations.
+            non_neg (list): True if dimension is nonnegative. 
+
+        # Returns
+            x_i (tf.tensor): (M,d) consistency equation solution
+    """
+    clip_min, clip_max = get_clip_bounds(x0, non_neg)
 
     x_i = x0
     if db:
@@ -72,8 +97,443 @@ def bounded_langevin_dyn(f, x0, eps, num_its, non_neg, db=False):
         return x_i
 
 
-def bounded_langevin_dyn_np(f, x0, eps, num_its, non_neg, db=False):
-    """Tensorflow langevin dynamics
+def while_fixed_point(update, x0, state0, num_its, tol, db=False, db_stride=10):
+    """Runs a batched fixed point update in a tf.while_loop.
+
+    A sample is frozen once the residual returned by update falls below tol,
+    and the loop stops when all samples have converged or after num_its
+    iterations.  The graph holds a single copy of update regardless of
+    num_its.
+
+        # Arguments:
+            update (function): maps (i, x_i, state) to (x_next, state_next,
+                               residual), where residual is the (M,)
+                               residual of x_i.
+            x0 (tf.tensor): (M,d) initial conditions.
+            state0 (tuple): initial solver state tensors.
+            num_its (int): maximum number of iterations.
+            tol (float): per-sample residual tolerance.
+            db (bool): also return the state every db_stride iterations.
+            db_stride (int): iterations between recorded states.
+
+        # Returns
+            x_i (tf.tensor): (M,d) consistency equation solution
+            its (tf.tensor): (M,) iterations used by each sample
+            xs (tf.tensor): (M,d,T) recorded states (if db)
+    """
+    M = tf.shape(x0)[0]
+    num_state = len(state0)
+
+    def cond(i, x_i, its, converged, *loop_state):
+        return tf.logical_and(i < num_its, tf.logical_not(tf.reduce_all(converged)))
+
+    def body(i, x_i, its, converged, *loop_state):
+        state, history = loop_state[:num_state], loop_state[num_state:]
+        if db:
+            xs, k = history
+            xs, k = tf.cond(
+                tf.equal(tf.mod(i, db_stride), 0),
+                lambda: (xs.write(k, x_i), k + 1),
+                lambda: (xs, k),
+            )
+            history = (xs, k)
+        x_next, state, residual = update(i, x_i, state)
+        x_next = tf.where(converged, x_i, x_next)
+        its = its + tf.cast(tf.logical_not(converged), tf.int32)
+        converged = tf.logical_or(converged, residual < tol)
+        return (i + 1, x_next, its, converged) + tuple(state) + tuple(history)
+
+    loop_vars = (tf.constant(0), x0, tf.zeros((M,), tf.int32), tf.zeros((M,), tf.bool))
+    loop_vars += tuple(state0)
+    if db:
+        xs = tf.TensorArray(x0.dtype, size=0, dynamic_size=True)
+        loop_vars += (xs, tf.constant(0))
+    outs = tf.while_loop(cond, body, loop_vars)
+    x_i, its = outs[1], outs[2]
+    tf.add_to_collection(SOLVER_ITS, its)
+
+    if db:
+        xs, k = outs[-2], outs[-1]
+        xs = xs.write(k, x_i)
+        return x_i, its, tf.transpose(xs.stack(), [1, 2, 0])
+    else:
+        return x_i, its
+
+
+def bounded_langevin_dyn_while(
+    f, x0, eps, num_its, non_neg, tol=1e-6, db=False, db_stride=10
+):
+    """Tensorflow langevin dynamics in a tf.while_loop.
+
+    Each sample stops updating once its residual max_j |f(x)_j - x_j| (for
+    coordinates off their bounds) falls below tol, and the loop stops when
+    all samples have converged or after num_its iterations.  The graph holds
+    a single copy of f regardless of num_its.
+
+        # Arguments:
+            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
+            x0 (tf.tensor): (M,d) initial conditions.
+            eps (float): langevin dyanmics step size.
+            num_its (int): maximum number of iterations.
+            non_neg (list): True if dimension is nonnegative.
+            tol (float): per-sample residual tolerance.
+            db (bool): also return the state every db_stride iterations.
+            db_stride (int): iterations between recorded states.
+
+        # Returns
+            x_i (tf.tensor): (M,d) consistency equation solution
+            its (tf.tensor): (M,) iterations used by each sample
+            xs (tf.tensor): (M,d,T) recorded states (if db)
+    """
+    clip_min, clip_max = get_clip_bounds(x0, non_neg)
+
+    def update(i, x_i, state):
+        f_x = f(x_i)
+        x_next = tf.clip_by_value((1.0 - eps) * x_i + eps * f_x, clip_min, clip_max)
+        residual = tf.reduce_max(tf.abs(x_next - x_i), axis=1) / eps
+        return x_next, state, residual
+
+    return while_fixed_point(update, x0, (), num_its, tol, db, db_stride)
+
+
+def anderson_solve(
+    f, x0, eps, num_its, non_neg, mem=5, tol=1e-6, reg=1e-10, db=False, db_stride=10
+):
+    """Batched Anderson acceleration of the bounded langevin dynamics.
+
+    Solves the projected fixed point x = clip(f(x)), which has the same
+    solutions as the bounded langevin dynamics.  Each sample mixes its last
+    mem residuals by regularized least squares; with mem=0 the update is
+    the langevin step with mixing eps.
+
+        # Arguments:
+            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
+            x0 (tf.tensor): (M,d) initial conditions.
+            eps (float): mixing parameter.
+            num_its (int): maximum number of iterations.
+            non_neg (list): True if dimension is nonnegative.
+            mem (int): number of stored residual differences.
+            tol (float): per-sample tolerance on max_j |clip(f(x))_j - x_j|.
+            reg (float): Tikhonov regularization of the least squares,
+                         relative to the mean squared residual difference.
+            db (bool): also return the state every db_stride iterations.
+            db_stride (int): iterations between recorded states.
+
+        # Returns
+            x_i (tf.tensor): (M,d) consistency equation solution
+            its (tf.tensor): (M,) iterations used by each sample
+            xs (tf.tensor): (M,d,T) recorded states (if db)
+    """
+    clip_min, clip_max = get_clip_bounds(x0, non_neg)
+    d = len(non_neg)
+    M = tf.shape(x0)[0]
+
+    def residual_fn(x):
+        return tf.clip_by_value(f(x), clip_min, clip_max) - x
+
+    if mem == 0:
+
+        def update(i, x_i, state):
+            r_i = residual_fn(x_i)
+            x_next = tf.clip_by_value(x_i + eps * r_i, clip_min, clip_max)
+            return x_next, state, tf.reduce_max(tf.abs(r_i), axis=1)
+
+        return while_fixed_point(update, x0, (), num_its, tol, db, db_stride)
+
+    def update(i, x_i, state):
+        x_prev, r_prev, dX, dR = state
+        r_i = residual_fn(x_i)
+        # write the newest differences into ring buffer slot (i-1) % mem
+        slot = tf.one_hot(tf.mod(i - 1, mem), mem, dtype=x0.dtype)
+        slot = tf.expand_dims(tf.expand_dims(slot, 0), 2)
+        slot = slot * tf.cast(i > 0, x0.dtype)
+        dX = (1.0 - slot) * dX + slot * tf.expand_dims(x_i - x_prev, 1)
+        dR = (1.0 - slot) * dR + slot * tf.expand_dims(r_i - r_prev, 1)
+
+        # gamma = argmin_g |r_i - dR^T g|, unused slots are zero and get g = 0
+        A = tf.matmul(dR, dR, transpose_b=True)
+        scale = tf.reduce_mean(tf.linalg.diag_part(A), axis=1) + 1e-30
+        A += reg * tf.expand_dims(tf.expand_dims(scale, 1), 2) * tf.eye(
+            mem, dtype=x0.dtype
+        )
+        b = tf.matmul(dR, tf.expand_dims(r_i, 2))
+        gamma = tf.linalg.solve(A, b)
+        step = eps * r_i - tf.reduce_sum(gamma * (dX + eps * dR), axis=1)
+        langevin_step = eps * r_i
+        step = tf.where(tf.is_finite(tf.reduce_sum(step, 1)), step, langevin_step)
+        x_next = tf.clip_by_value(x_i + step, clip_min, clip_max)
+        residual = tf.reduce_max(tf.abs(r_i), axis=1)
+        return x_next, (x_i, r_i, dX, dR), residual
+
+    zeros = tf.zeros((M, mem, d), dtype=x0.dtype)
+    state0 = (x0, tf.zeros_like(x0), zeros, zeros)
+    return while_fixed_point(update, x0, state0, num_its, tol, db, db_stride)
+
+
+def batch_jacobian(f_x, x):
+    """(M,d,d) per-sample Jacobians df_i/dx_j of a batched map.
+
+    Requires that f_x[m] depends only on x[m].
+
+        # Arguments:
+            f_x (tf.tensor): (M,d) f(x).
+            x (tf.tensor): (M,d) inputs.
+
+        # Returns
+            J (tf.tensor): (M,d,d) Jacobians.
+    """
+    d = int(f_x.shape[1])
+    rows = [tf.gradients(f_x[:, i], x)[0] for i in range(d)]
+    rows = [tf.zeros_like(x) if row is None else row for row in rows]
+    return tf.stack(rows, axis=1)
+
+
+def newton_solve(
+    f, x0, eps, num_its, non_neg, tol=1e-6, reg=1e-10, db=False, db_stride=10
+):
+    """Batched Newton's method for x = f(x) with box constraints.
+
+    Each iteration solves (I - J) dx = clip(f(x)) - x per sample, with J the
+    (d,d) Jacobian of f.  Coordinates that f maps past a bound step exactly
+    onto it (their rows of I - J are replaced by the identity).  Samples
+    with a singular or non-finite Newton step take the langevin step
+    instead.  Differentiating through the solver requires second derivatives
+    of f.
+
+        # Arguments:
+            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
+            x0 (tf.tensor): (M,d) initial conditions.
+            eps (float): langevin dyanmics step size of the fallback step.
+            num_its (int): maximum number of iterations.
+            non_neg (list): True if dimension is nonnegative.
+            tol (float): per-sample tolerance on max_j |clip(f(x))_j - x_j|.
+            reg (float): diagonal regularization of I - J.
+            db (bool): also return the state every db_stride iterations.
+            db_stride (int): iterations between recorded states.
+
+        # Returns
+            x_i (tf.tensor): (M,d) consistency equation solution
+            its (tf.tensor): (M,) iterations used by each sample
+            xs (tf.tensor): (M,d,T) recorded states (if db)
+    """
+    clip_min, clip_max = get_clip_bounds(x0, non_neg)
+    d = len(non_neg)
+    eye = tf.eye(d, dtype=x0.dtype)
+
+    def update(i, x_i, state):
+        f_x = f(x_i)
+        J = batch_jacobian(f_x, x_i)
+        r_i = tf.clip_by_value(f_x, clip_min, clip_max) - x_i
+        # f pushes these coordinates past a bound, so the step lands them on it
+        active = tf.logical_or(f_x <= clip_min, f_x >= clip_max)
+        A = (1.0 + reg) * eye - J
+        A = tf.where(
+            tf.tile(tf.expand_dims(active, 2), [1, 1, d]),
+            tf.zeros_like(A) + eye,
+            A,
+        )
+        step = tf.squeeze(tf.linalg.solve(A, tf.expand_dims(r_i, 2)), 2)
+        langevin_step = eps * r_i
+        step = tf.where(tf.is_finite(tf.reduce_sum(step, 1)), step, langevin_step)
+        x_next = tf.clip_by_value(x_i + step, clip_min, clip_max)
+        residual = tf.reduce_max(tf.abs(r_i), axis=1)
+        return x_next, state, residual
+
+    return while_fixed_point(update, x0, (), num_its, tol, db, db_stride)
+
+
+def implicit_fixed_point(f, x_star, non_neg, reg=1e-10):
+    """Attaches implicit-function gradients to a fixed point of f.
+
+    The returned tensor equals x_star, but its gradient with respect to any
+    tensor captured by f is (I - P J)^-1 P df, the derivative of the fixed
+    point x = clip(f(x)), where J is the (d,d) Jacobian of f at x_star and
+    P masks the coordinates that f maps past a bound (wherever the solver
+    stopped relative to it).  No gradient flows through the solver that
+    produced x_star, so the backward pass costs one evaluation of f and its
+    Jacobian regardless of the number of solver iterations.
+
+        # Arguments:
+            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
+            x_star (tf.tensor): (M,d) (converged) fixed point of f.
+            non_neg (list): True if dimension is nonnegative.
+            reg (float): diagonal regularization of I - P J.
+
+        # Returns
+            x_star (tf.tensor): (M,d) fixed point with implicit gradients.
+    """
+    clip_min, clip_max = get_clip_bounds(x_star, non_neg)
+    d = len(non_neg)
+    x_star = tf.stop_gradient(x_star)
+    f_x = f(x_star)
+    J = tf.stop_gradient(batch_jacobian(f_x, x_star))
+    # decided by f alone, so that solvers stopping just short of a bound agree
+    active = tf.logical_or(f_x <= clip_min, f_x >= clip_max)
+    free = tf.stop_gradient(1.0 - tf.cast(active, x_star.dtype))
+    A = (1.0 + reg) * tf.eye(d, dtype=x_star.dtype) - tf.expand_dims(free, 2) * J
+    # zero valued, differentiable in the tensors captured by f
+    df = free * (f_x - tf.stop_gradient(f_x))
+    dx = tf.squeeze(tf.linalg.solve(A, tf.expand_dims(df, 2)), 2)
+    return x_star + dx
+
+
+def fixed_point_solve(
+    f,
+    x0,
+    eps,
+    num_its,
+    non_neg,
+    db=False,
+    solver="langevin",
+    tol=1e-6,
+    implicit_grad=False,
+):
+    """Solves x = f(x) with the chosen solver.
+
+    Per-sample iteration counts of the while loop solvers are added to the
+    SOLVER_ITS graph collection.
+
+        # Arguments:
+            f (function): maps tf.tensor (M,d) MF coeff to consist eq.
+            x0 (tf.tensor): (M,d) initial conditions.
+            eps (float): langevin dyanmics step size (mixing of "anderson").
+            num_its (int): (maximum) number of iterations.
+            non_neg (list): True if dimension is nonnegative.
+            db (bool): also return the solver history.
+            solver (str): see SOLVERS.
+            tol (float): per-sample residual tolerance (while loop solvers).
+            implicit_grad (bool): differentiate the solution implicitly
+                                  (see implicit_fixed_point) rather than
+                                  through the solver iterations.
+
+        # Returns
+            x_i (tf.tensor): (M,d) consistency equation solution
+            xs (tf.tensor): (M,d,T) solver history (if db)
+    """
+    if solver == "langevin":
+        outs = bounded_langevin_dyn(f, x0, eps, num_its, non_neg, db=db)
+        outs = (outs[0], None, outs[1]) if db else (outs,)
+    elif solver == "while":
+        outs = bounded_langevin_dyn_while(f, x0, eps, num_its, non_neg, tol, db=db)
+    elif solver == "anderson":
+        outs = anderson_solve(f, x0, eps, num_its, non_neg, tol=tol, db=db)
+    elif solver == "newton":
+        outs = newton_solve(f, x0, eps, num_its, non_neg, tol=tol, db=db)
+    else:
+        raise ValueError("Unknown solver %s." % solver)
+    x_i = outs[0]
+    if implicit_grad:
+        x_i = implicit_fixed_point(f, x_i, non_neg)
+    if db:
+        return x_i, outs[2]
+    else:
+        return x_i
+
+
+def langevin_progress(stride=100):
+    """Callback for bounded_langevin_dyn_np printing solver progress.
+
+        # Arguments:
+            stride (int): iterations between prints.
+
+        # Returns
+            callback (function): prints iteration, active samples and time.
+    """
+    t0 = [time.time()]
+
+    def callback(i, x, active):
+        if np.mod(i, stride) == 0:
+            t1 = time.time()
+            print(
+                "i %d, %d active, %.4f seconds" % (i, active.shape[0], t1 - t0[0])
+            )
+            t0[0] = t1
+
+    return callback
+
+
+def active_set_langevin_np(
+    f, x0, eps, num_its, non_neg, tol=None, db=False, db_stride=1, callback=None
+):
+    """NumPy bounded langevin dynamics on the active set of samples.
+
+    The states are updated in place in a (M,d) buffer.  A sample leaves the
+    active set once its step max_j |x_next_j - x_j| / eps falls below tol
+    (samples with non-finite steps stay active), and later iterations only
+    evaluate f on the active samples, so f takes the indices of the rows of x
+    in the full batch.
+
+        # Arguments:
+            f (function): maps np.array (M',d) MF coeff and (M',) sample
+                          indices (or slice(None) for all samples) to
+                          consist eqs.
+            x0 (np.array): (M,d) initial conditions.
+            eps (float): langevin dyanmics step size.
+            num_its (int): maximum number of iterations.
+            non_neg (list): True if dimension is nonnegative.
+            tol (float): per-sample step tolerance (None runs all num_its
+                         iterations on all samples).
+            db (bool): also return the state every db_stride iterations.
+            db_stride (int): iterations between recorded states.
+            callback (function): called with (i, x, active) after each
+                                 iteration, where x is the (M,d) buffer and
+                                 active the indices of the active samples.
+
+        # Returns
+            x_i (np.array): (M,d) consistency equation solution
+            its (np.array): (M,) iterations used by each sample
+            xs (np.array): (M,d,T) recorded states (if db)
+    """
+    M, d = x0.shape
+    clip_min = np.where(non_neg, 0.0, -MAXVAL)
+    clip_max = MAXVAL * np.ones((d,))
+    x = np.array(x0, dtype=np.float64)
+    its = np.zeros((M,), dtype=np.int64)
+    active = np.arange(M)
+    if db:
+        xs = [x.copy()]
+
+    num_done = 0
+    for i in range(num_its):
+        if active.shape[0] == 0:
+            break
+        all_active = active.shape[0] == M
+        inds = slice(None) if all_active else active
+        x_i = x if all_active else x[active]
+        # a new array, f may return one it holds on to
+        f_x = eps * np.asarray(f(x_i, inds), dtype=np.float64)
+        x_next = (1.0 - eps) * x_i
+        x_next += f_x
+        np.clip(x_next, clip_min, clip_max, out=x_next)
+        its[active] += 1
+        if tol is not None:
+            residual = np.max(np.abs(x_next - x_i), axis=1) / eps
+        if all_active:
+            x[...] = x_next
+        else:
+            x[active] = x_next
+        if tol is not None:
+            # NaN residuals (diverged samples) are not converged
+            active = active[~(residual < tol)]
+        num_done = i + 1
+        if callback is not None:
+            callback(i, x, active)
+        if db and np.mod(num_done, db_stride) == 0:
+            xs.append(x.copy())
+
+    if db:
+        if np.mod(num_done, db_stride) != 0:
+            xs.append(x.copy())
+        return x, its, np.stack(xs, axis=2)
+    else:
+        return x, its
+
+
+def bounded_langevin_dyn_np(f, x0, eps, num_its, non_neg, db=False, callback=None):
+    """NumPy langevin dynamics
+
+    Runs all num_its iterations on all samples (see active_set_langevin_np
+    for early stopping of converged samples).
 
         # Arguments:
             f (function): maps np.arrays (M,d) MF coeff to consist eqs.
@@ -81,35 +541,15 @@ def bounded_langevin_dyn_np(f, x0, eps, num_its, non_neg, db=False):
             eps (float): langevin dyanmics step size.
             num_its (int): number of iterations.
             non_neg (list): True if dimension is nonnegative. 
+            callback (function): see active_set_langevin_np.
 
         # Returns
             x_i (np.array): (M,d) consistency equation solution
         """
-    d = len(non_neg)
-    x_i = x0
-    if db:
-        xs = [x0]
-    for i in range(num_its):
-        t1 = time.time()
-        f_x = f(x_i)
-        x_next = []
-        for j in range(d):
-            if non_neg[j]:
-                x_next.append(
-                    np.clip((1.0 - eps) * x_i[:, j] + eps * f_x[:, j], 0.0, MAXVAL)
-                )
-            else:
-                x_next.append(
-                    np.clip((1.0 - eps) * x_i[:, j] + eps * f_x[:, j], -MAXVAL, MAXVAL)
-                )
-        x_i = np.stack(x_next, axis=1)
-        t2 = time.time()
-        if np.mod(i, 100) == 0:
-            print("i", i, "%.4f seconds" % (t2 - t1))
-        if db:
-            xs.append(x_i)
-
+    outs = active_set_langevin_np(
+        lambda x, inds: f(x), x0, eps, num_its, non_neg, db=db, callback=callback
+    )
     if db:
-        return x_i, np.stack(xs, axis=2)
+        return outs[0], outs[2]
     else:
-        return x_i
+        return outs[0]
@@ -0,0 +1,160 @@
+# Sean Bittner 2019
+
+import tensorflow as tf
+import numpy as np
+import weakref
+from dsn.util.np_moment_tables import (
+    SINGLE_TABLE_MOMENTS,
+    NESTED_TABLE_MOMENTS,
+    load_moment_tables,
+    table_baseline,
+)
+from dsn.util.tf_graph_util import graph_array, graph_root_scope
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Tabulated Gaussian moments of phi(x) = tanh(x)
+# Tensorflow version of np_moment_tables.gaussian_moments.  The interpolant
+# is differentiable in mu, delta0 and deltainf.
+
+# graph -> {(num_pts, dtype): tables}
+_graph_tables = weakref.WeakKeyDictionary()
+
+
+def get_tables(num_pts, dtype):
+    """Moment tables held by graph arrays of the default graph.
+
+    The tables are created once per graph, outside of any control flow.
+
+    # Arguments
+        num_pts (int): Number of quadrature points of the tabulated moments.
+        dtype (tf.dtype): Dtype of the tables.
+
+    # Returns
+        tables (dict): Flattened "single" and "nested" tables, and the
+                       table shapes and grid axes (np.array).
+
+    """
+    graph = tf.get_default_graph()
+    key = (num_pts, dtype)
+    graph_tables = _graph_tables.setdefault(graph, {})
+    if key not in graph_tables:
+        np_tables = load_moment_tables(num_pts)
+        tables = {"u": np_tables["u"], "v": np_tables["v"], "r": np_tables["r"]}
+        with graph_root_scope(graph), tf.name_scope("moment_tables_%d" % num_pts):
+            for name in ["single", "nested"]:
+                table = np_tables[name]
+                tables[name + "_shape"] = table.shape
+                flat_table = np.reshape(table, (-1, table.shape[-1]))
+                tables[name] = graph_array(flat_table, name, dtype=dtype)
+        graph_tables[key] = tables
+    return graph_tables[key]
+
+
+def catmull_rom_weights(t):
+    t2 = tf.square(t)
+    t3 = t2 * t
+    return tf.stack(
+        [
+            (-t3 + 2 * t2 - t) / 2.0,
+            (3 * t3 - 5 * t2 + 2) / 2.0,
+            (-3 * t3 + 4 * t2 + t) / 2.0,
+            (t3 - t2) / 2.0,
+        ],
+        axis=1,
+    )
+
+
+def interp_indices(coord, nodes):
+    num_nodes = nodes.shape[0]
+    h = float(nodes[1] - nodes[0])
+    s = tf.clip_by_value((coord - float(nodes[0])) / h, 0.0, float(num_nodes - 1))
+    i = tf.minimum(tf.floor(s), float(num_nodes - 2))
+    # no gradient flows through the cell index
+    return tf.cast(tf.stop_gradient(i), tf.int32), s - i
+
+
+def interp_table(flat_table, shape, coords, axes):
+    """Catmull-Rom interpolation of a padded table.
+
+    # Arguments
+        flat_table (tf.tensor): (prod(N_d+2), K) flattened padded table.
+        shape (tuple): Padded table shape (N_1+2, ..., N_d+2, K).
+        coords (list): d (M,) coordinates.
+        axes (list): d node arrays.
+
+    # Returns
+        values (tf.tensor): (M, K) interpolated values.
+
+    """
+    num_dims = len(coords)
+    flat_inds = 0
+    weights = 1.0
+    for d in range(num_dims):
+        i, t = interp_indices(coords[d], axes[d])
+        stencil = tf.expand_dims(i, 1) + tf.range(4)
+        w = catmull_rom_weights(t)
+        expand = [1] * num_dims
+        expand[d] = 4
+        stencil = tf.reshape(stencil, [-1] + expand)
+        w = tf.reshape(w, [-1] + expand)
+        flat_inds = flat_inds * shape[d] + stencil
+        weights = weights * w
+    num_stencil = 4 ** num_dims
+    values = tf.gather(flat_table, tf.reshape(flat_inds, (-1, num_stencil)))
+    weights = tf.reshape(weights, (-1, num_stencil, 1))
+    return tf.reduce_sum(weights * values, axis=1)
+
+
+def gaussian_moments(mu, delta0, deltainf, moments, num_pts=50, eps=1e-12):
+    """Tabulated version of tf_moments.gaussian_moments.
+
+    Only np_moment_tables.SINGLE_TABLE_MOMENTS and
+    np_moment_tables.NESTED_TABLE_MOMENTS are available.
+
+    # Arguments
+        mu (tf.tensor): (M,) means.
+        delta0 (tf.tensor): (M,) variances.
+        deltainf (tf.tensor): (M,) delta_inf (None if no nested moments).
+        moments (list): Moment names.
+        num_pts (int): Number of quadrature points of the tables.
+        eps (float): Guards deltainf / delta0 at delta0 = 0.
+
+    # Returns
+        values (list): (M,) value of each moment in the order requested.
+
+    """
+    single = [moment for moment in moments if moment in SINGLE_TABLE_MOMENTS]
+    nested = [moment for moment in moments if moment in NESTED_TABLE_MOMENTS]
+    if len(single) + len(nested) < len(moments):
+        raise ValueError(
+            "Only %s are tabulated."
+            % ", ".join(SINGLE_TABLE_MOMENTS + NESTED_TABLE_MOMENTS)
+        )
+    if len(nested) > 0 and deltainf is None:
+        raise ValueError("Nested Gaussian moments require deltainf.")
+
+    tables = get_tables(num_pts, delta0.dtype)
+    # e.g. mu = tf.zeros((1,)) in the rank-2 solvers
+    mu = mu + tf.zeros_like(delta0)
+    u = tf.asinh(mu)
+    v = tf.asinh(delta0)
+    values = {}
+    if len(single) > 0:
+        y = interp_table(
+            tables["single"], tables["single_shape"], [u, v], [tables["u"], tables["v"]]
+        )
+        for moment in single:
+            k = SINGLE_TABLE_MOMENTS.index(moment)
+            values[moment] = y[:, k] + table_baseline(moment, mu, delta0, deltainf)
+    if len(nested) > 0:
+        r = deltainf / (delta0 + eps)
+        y = interp_table(
+            tables["nested"],
+            tables["nested_shape"],
+            [u, v, r],
+            [tables["u"], tables["v"], tables["r"]],
+        )
+        for moment in nested:
+            k = NESTED_TABLE_MOMENTS.index(moment)
+            values[moment] = y[:, k] + table_baseline(moment, mu, delta0, deltainf)
+    return [values[moment] for moment in moments]
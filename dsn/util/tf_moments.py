@@ -0,0 +1,140 @@
+# Sean Bittner 2019
+
+import tensorflow as tf
+from dsn.util.tf_integrals import get_quadrature
+import numpy as np
+from dsn.util.np_moments import (
+    SINGLE_INTEGRANDS,
+    NESTED_INTEGRANDS,
+    ADAPTIVE_TOL,
+    split_moments,
+    calibrate_orders,
+)
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Fused Gaussian moments of phi(x) = tanh(x)
+# Tensorflow version of np_moments.gaussian_moments.
+
+
+def transcendentals(h, names):
+    u = {}
+    if "tanh" in names or "prime" in names:
+        u["tanh"] = tf.tanh(h)
+    if "prime" in names:
+        u["prime"] = 1 - tf.square(u["tanh"])
+    if "logcosh" in names:
+        u["logcosh"] = tf.log(tf.math.cosh(h))
+    return u
+
+
+def gaussian_moments(mu, delta0, deltainf, moments, num_pts=200):
+    """Evaluates several Gaussian moments of tanh in one pass.
+
+    # Arguments
+        mu (tf.tensor): (M,) means.
+        delta0 (tf.tensor): (M,) variances.
+        deltainf (tf.tensor): (M,) delta_inf (None if no nested moments).
+        moments (list): Moment names (see np_moments.SINGLE_INTEGRANDS and
+                        np_moments.NESTED_INTEGRANDS).
+        num_pts (int): Number of quadrature points.
+
+    # Returns
+        values (list): (M,) value of each moment in the order requested.
+
+    """
+    single, nested, trans = split_moments(moments, deltainf)
+    values = {}
+    if len(single) > 0:
+        gauss_norm, gauss_points, gauss_weights = get_quadrature(
+            num_pts, dtype=mu.dtype
+        )
+        h = tf.expand_dims(mu, 1) + tf.sqrt(tf.expand_dims(delta0, 1)) * gauss_points
+        u = transcendentals(h, trans[0])
+        # one contraction with the weights for all single moments
+        integrands = tf.stack(
+            [SINGLE_INTEGRANDS[moment][1](u) for moment in single], axis=0
+        )
+        single_values = gauss_norm * tf.tensordot(integrands, gauss_weights, [[2], [0]])
+        for i, moment in enumerate(single):
+            values[moment] = single_values[i]
+
+    if len(nested) > 0:
+        gauss_norm, gauss_points, gauss_weights, gauss_points_inner, gauss_points_outer = get_quadrature(
+            num_pts, double=True, dtype=mu.dtype
+        )
+        mu = tf.expand_dims(tf.expand_dims(mu, 1), 2)
+        delta0 = tf.expand_dims(tf.expand_dims(delta0, 1), 2)
+        deltainf = tf.expand_dims(tf.expand_dims(deltainf, 1), 2)
+        h = (
+            mu
+            + tf.sqrt(delta0 - deltainf) * gauss_points_inner
+            + tf.sqrt(deltainf) * gauss_points_outer
+        )
+        u = transcendentals(h, trans[1])
+        for moment in nested:
+            inner_integrand = NESTED_INTEGRANDS[moment][1](u)
+            outer_integrand = gauss_norm * tf.tensordot(
+                inner_integrand, gauss_weights, [[2], [0]]
+            )
+            values[moment] = gauss_norm * tf.tensordot(
+                outer_integrand ** 2, gauss_weights, [[1], [0]]
+            )
+    return [values[moment] for moment in moments]
+
+
+def adaptive_gaussian_moments(
+    mu, delta0, deltainf, moments, num_pts=200, tol=ADAPTIVE_TOL
+):
+    """gaussian_moments with the quadrature order chosen per sample.
+
+    Samples are partitioned by order (see np_moments.calibrate_orders),
+    each partition is evaluated batched, and the results are stitched back.
+    The partitions have dynamic shapes, so this does not work with
+    xla="compile".
+
+    # Arguments
+        mu (tf.tensor): (M,) means.
+        delta0 (tf.tensor): (M,) variances.
+        deltainf (tf.tensor): (M,) delta_inf (None if no nested moments).
+        moments (list): Moment names.
+        num_pts (int): Largest quadrature order.
+        tol (float): Error tolerance relative to num_pts quadrature.
+
+    # Returns
+        values (list): (M,) value of each moment in the order requested.
+
+    """
+    single, nested, _ = split_moments(moments, deltainf)
+    # e.g. mu = tf.zeros((1,)) in the rank-2 solvers
+    mu = mu + tf.zeros_like(delta0)
+    inds = tf.range(tf.shape(delta0)[0])
+    values = {}
+    for group, is_nested in [(single, False), (nested, True)]:
+        if len(group) == 0:
+            continue
+        orders, thresholds = calibrate_orders(num_pts, tol, is_nested)
+        thresholds = np.maximum.accumulate(thresholds)
+        thresholds = thresholds.astype(delta0.dtype.as_numpy_dtype)
+        num_orders = len(orders)
+        order_inds = tf.reduce_sum(
+            tf.cast(tf.expand_dims(delta0, 1) > thresholds, tf.int32), axis=1
+        )
+
+        part_inds = tf.dynamic_partition(inds, order_inds, num_orders)
+        part_mu = tf.dynamic_partition(mu, order_inds, num_orders)
+        part_delta0 = tf.dynamic_partition(delta0, order_inds, num_orders)
+        if is_nested:
+            part_deltainf = tf.dynamic_partition(deltainf, order_inds, num_orders)
+        else:
+            part_deltainf = num_orders * [None]
+
+        part_values = [[] for moment in group]
+        for k, order in enumerate(orders):
+            y = gaussian_moments(
+                part_mu[k], part_delta0[k], part_deltainf[k], group, order
+            )
+            for j in range(len(group)):
+                part_values[j].append(y[j])
+        for j, moment in enumerate(group):
+            values[moment] = tf.dynamic_stitch(part_inds, part_values[j])
+    return [values[moment] for moment in moments]
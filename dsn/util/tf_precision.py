@@ -0,0 +1,62 @@
+# Copyright 2019 Sean Bittner, Columbia University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# ==============================================================================
+import tensorflow as tf
+
+# Precision of the density network, entropy, augmented Lagrangian cost and
+# any numerically sensitive reductions over simulated activity.
+REDUCE_DTYPE = tf.float64
+
+# Precision of system simulations and DMFT solvers.  Systems read it when
+# they are constructed, so set it before building them.
+_sim_dtype = tf.float64
+
+
+def set_sim_dtype(dtype):
+    """Sets the precision policy for systems constructed afterwards.
+
+    # Arguments
+        dtype (tf.dtype): tf.float32 or tf.float64.
+
+    """
+    global _sim_dtype
+    if dtype not in [tf.float32, tf.float64]:
+        raise ValueError("Simulation dtype must be tf.float32 or tf.float64.")
+    _sim_dtype = dtype
+    return None
+
+
+def get_sim_dtype():
+    """Returns the current simulation dtype."""
+    return _sim_dtype
+
+
+def sim_suff_stats(system, Z):
+    """Computes T(x) in the system precision and returns it in REDUCE_DTYPE.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        Z (tf.tensor): [1, M, D] density network system parameter samples.
+
+    # Returns
+        T_x (tf.tensor): Sufficient statistics of samples.
+
+    """
+    if Z.dtype != system.dtype:
+        Z = tf.cast(Z, system.dtype)
+    T_x = system.compute_suff_stats(Z)
+    if T_x.dtype != REDUCE_DTYPE:
+        T_x = tf.cast(T_x, REDUCE_DTYPE)
+    return T_x
@@ -0,0 +1,281 @@
+# Copyright 2019 Sean Bittner, Columbia University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# ==============================================================================
+import tensorflow as tf
+import numpy as np
+import time
+import os
+from contextlib import contextmanager
+from dsn.util.tf_precision import sim_suff_stats
+
+# XLA modes
+#   None - no XLA.
+#   "auto" - XLA auto-clustering of the whole graph (e.g. the full training
+#            step), set through the session config.
+#   "jit_scope" - mark the system subgraph for XLA compilation.
+#   "compile" - compile the system subgraph with tf.xla.experimental.compile.
+XLA_MODES = [None, "auto", "jit_scope", "compile"]
+
+# Execution profile of the sessions opened by train_dsn and dsn_util.
+#   intra_op (int) - intra-op thread pool size (0 lets tensorflow decide).
+#   inter_op (int) - inter-op thread pool size (0 lets tensorflow decide).
+#   cpus (list) - CPUs the process is pinned to (None leaves affinity alone).
+#   autotune (bool) - train_dsn times candidate thread counts on its first
+#                     steps and keeps the fastest.
+_exec_profile = {"intra_op": 0, "inter_op": 0, "cpus": None, "autotune": False}
+
+# Number of session configs handed out by session_config.
+_configs_made = [0]
+
+
+def xla_suff_stats(system, Z, xla=None):
+    """Builds T(x) on Z, compiling the system subgraph with XLA.
+
+    # Arguments
+        system (obj): Instance of dsn.util.systems.system.
+        Z (tf.tensor): [1, M, D] density network system parameter samples.
+        xla (str): XLA mode (see XLA_MODES).
+
+    # Returns
+        T_x (tf.tensor): Sufficient statistics of samples.
+
+    """
+    if xla not in XLA_MODES:
+        raise ValueError("Unknown XLA mode %s." % str(xla))
+
+    if xla == "jit_scope":
+        from tensorflow.contrib.compiler import jit
+
+        with jit.experimental_jit_scope(compile_ops=True):
+            T_x = sim_suff_stats(system, Z)
+    elif xla == "compile":
+        # Tensors created inside the compiled computation (e.g. the simulated
+        # activity read by compute_I_x) cannot be used outside of it.
+        if "bounds" in system.behavior.keys():
+            raise ValueError("xla='compile' does not support behaviors with bounds.")
+        (T_x,) = tf.xla.experimental.compile(
+            lambda Z: sim_suff_stats(system, Z), inputs=[Z]
+        )
+    else:
+        T_x = sim_suff_stats(system, Z)
+    return T_x
+
+
+def set_exec_profile(intra_op=0, inter_op=0, cpus=None, autotune=False):
+    """Sets the execution profile used by sessions opened afterwards.
+
+    Pinning to cpus takes effect immediately for the whole process.
+
+    # Arguments
+        intra_op (int): Intra-op thread pool size (0 lets tensorflow decide).
+        inter_op (int): Inter-op thread pool size (0 lets tensorflow decide).
+        cpus (list): CPUs to pin the process to, e.g. numa_node_cpus(0).
+        autotune (bool): Let train_dsn pick thread counts on its first steps.
+
+    """
+    _exec_profile.update(
+        {"intra_op": intra_op, "inter_op": inter_op, "cpus": cpus, "autotune": autotune}
+    )
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+        print("Pinned process to CPUs %s." % ",".join([str(cpu) for cpu in cpus]))
+    return None
+
+
+def get_exec_profile():
+    """Returns a copy of the current execution profile."""
+    return dict(_exec_profile)
+
+
+@contextmanager
+def exec_profile_scope(exec_profile=None):
+    """Runs a block with an execution profile.
+
+    The previous profile and the CPU affinity of the process are restored on
+    exit, including any changes made inside the block (e.g. by
+    autotune_exec_profile).
+
+    # Arguments
+        exec_profile (dict): Arguments of set_exec_profile (current profile
+                             if None).
+
+    """
+    profile = get_exec_profile()
+    cpus = os.sched_getaffinity(0)
+    try:
+        if exec_profile is not None:
+            set_exec_profile(**exec_profile)
+        yield
+    finally:
+        _exec_profile.clear()
+        _exec_profile.update(profile)
+        if os.sched_getaffinity(0) != cpus:
+            os.sched_setaffinity(0, cpus)
+
+
+def available_cpus():
+    """Returns the list of CPUs the process may run on."""
+    return sorted(os.sched_getaffinity(0))
+
+
+def numa_node_cpus(node):
+    """Returns the CPUs of a NUMA node (Linux).
+
+    # Arguments
+        node (int): NUMA node index.
+
+    # Returns
+        cpus (list): CPU indices of the node.
+
+    """
+    fname = "/sys/devices/system/node/node%d/cpulist" % node
+    with open(fname) as f:
+        cpulist = f.read().strip()
+    cpus = []
+    for cpu_range in cpulist.split(","):
+        bounds = cpu_range.split("-")
+        cpus += list(range(int(bounds[0]), int(bounds[-1]) + 1))
+    return cpus
+
+
+def session_config(xla=None, config=None, exec_profile=None):
+    """Returns a tf.ConfigProto for the XLA mode and execution profile.
+
+    Tensorflow sizes its thread pools once per process from the first session
+    unless the session asks for its own pools, so a config with explicit
+    thread counts sets use_per_session_threads.
+
+    xla='auto' on CPU needs --tf_xla_cpu_global_jit in TF_XLA_FLAGS, which
+    tensorflow reads only when the first session is created.  The flag is
+    added to the environment here; if a config was already handed out
+    without it, a ValueError is raised since it would be silently ignored.
+    Set TF_XLA_FLAGS before starting python to avoid this.
+
+    # Arguments
+        xla (str): XLA mode (see XLA_MODES).
+        config (tf.ConfigProto): Config to update (new config if None).
+        exec_profile (dict): Execution profile (current profile if None).
+
+    # Returns
+        config (tf.ConfigProto): Session config.
+
+    """
+    if config is None:
+        config = tf.ConfigProto()
+    if exec_profile is None:
+        exec_profile = _exec_profile
+    intra_op = exec_profile.get("intra_op", 0)
+    inter_op = exec_profile.get("inter_op", 0)
+    config.intra_op_parallelism_threads = intra_op
+    config.inter_op_parallelism_threads = inter_op
+    if intra_op > 0 or inter_op > 0:
+        # otherwise the process-global pools of the first session are reused
+        config.use_per_session_threads = True
+    if xla == "auto":
+        config.graph_options.optimizer_options.global_jit_level = (
+            tf.OptimizerOptions.ON_1
+        )
+        # Auto-clustering is GPU-only unless enabled for CPU by this flag,
+        # which is read when the first session is created.
+        xla_flags = os.environ.get("TF_XLA_FLAGS", "")
+        if "--tf_xla_cpu_global_jit" not in xla_flags:
+            if _configs_made[0] > 0:
+                raise ValueError(
+                    "xla='auto' needs TF_XLA_FLAGS=--tf_xla_cpu_global_jit before "
+                    + "the first session is created; set it before starting python."
+                )
+            os.environ["TF_XLA_FLAGS"] = (
+                xla_flags + " --tf_xla_cpu_global_jit"
+            ).strip()
+    _configs_made[0] += 1
+    return config
+
+
+def autotune_candidates(num_cpus=None):
+    """Candidate (intra_op, inter_op) thread counts for autotuning.
+
+    # Arguments
+        num_cpus (int): Number of usable CPUs (affinity mask size if None).
+
+    # Returns
+        candidates (list): List of (intra_op, inter_op) tuples.
+
+    """
+    if num_cpus is None:
+        num_cpus = len(available_cpus())
+    candidates = []
+    for intra_op, inter_op in [
+        (num_cpus, 1),
+        (num_cpus, 2),
+        (max(num_cpus // 2, 1), 2),
+        (max(num_cpus // 4, 1), 4),
+    ]:
+        if (intra_op, inter_op) not in candidates:
+            candidates.append((intra_op, inter_op))
+    return candidates
+
+
+def autotune_exec_profile(
+    fetches, feed_dict, init_fn=None, candidates=None, num_steps=5, xla=None
+):
+    """Times candidate thread counts on the graph and keeps the fastest.
+
+    Each candidate runs fetches in a fresh session with its own thread pools
+    (see session_config), so stateful ops (e.g. an optimizer step) should not
+    be in fetches.  The returned profile is also
+    made the current execution profile.
+
+    # Arguments
+        fetches (list): Tensors run in each timed step (e.g. cost and grads).
+        feed_dict (dict): Feed for fetches.
+        init_fn (function): Called with each new session before timing.
+        candidates (list): (intra_op, inter_op) tuples (autotune_candidates()).
+        num_steps (int): Number of timed steps per candidate.
+        xla (str): XLA mode (see XLA_MODES).
+
+    # Returns
+        exec_profile (dict): Fastest execution profile.
+
+    """
+    if candidates is None:
+        candidates = autotune_candidates()
+    best_time = np.inf
+    best_profile = None
+    for intra_op, inter_op in candidates:
+        exec_profile = get_exec_profile()
+        exec_profile.update({"intra_op": intra_op, "inter_op": inter_op})
+        config = session_config(xla, exec_profile=exec_profile)
+        with tf.Session(config=config) as sess:
+            if init_fn is not None:
+                init_fn(sess)
+            # warm up (graph optimization and compilation)
+            sess.run(fetches, feed_dict)
+            time1 = time.time()
+            for i in range(num_steps):
+                sess.run(fetches, feed_dict)
+            step_time = (time.time() - time1) / num_steps
+        print(
+            "intra_op %d, inter_op %d: %.4f seconds per step"
+            % (intra_op, inter_op, step_time)
+        )
+        if step_time < best_time:
+            best_time = step_time
+            best_profile = exec_profile
+    print(
+        "Using intra_op %d, inter_op %d."
+        % (best_profile["intra_op"], best_profile["inter_op"])
+    )
+    _exec_profile.update(best_profile)
+    return best_profile
@@ -0,0 +1,237 @@
+# Copyright 2019 Sean Bittner, Columbia University
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# ==============================================================================
+import numpy as np
+import hashlib
+import json
+import fcntl
+import os
+import itertools
+from contextlib import contextmanager
+
+#### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### #### ####
+#### Content-addressed store of DMFT warm start solutions
+# A store holds the solutions on the lattice step*k (k integer) of the free
+# parameters for one setting of everything else (solver equations, fixed
+# parameters, quadrature order, eps, ...), hashed into the store name.  The
+# lattice is split into blocks of block_size^D points, each solved once and
+# saved to its own file, and manifest.json lists the parameter box of each
+# finished block.  Any box of free parameters is then assembled from the
+# blocks it overlaps, solving only the missing ones.
+
+WS_STORE_DIR = "data/warm_starts/store/"
+
+
+def store_key_hash(key):
+    """sha1 of the json encoding of a warm start key (dict)."""
+    key_str = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+
+
+def get_store_dir(key):
+    store_dir = WS_STORE_DIR + store_key_hash(key) + "/"
+    if not os.path.isdir(store_dir + "blocks/"):
+        os.makedirs(store_dir + "blocks/")
+    return store_dir
+
+
+@contextmanager
+def store_lock(store_dir, exclusive=True):
+    """fcntl lock on a store, shared between processes and jobs."""
+    with open(store_dir + "lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest(store_dir):
+    fname = store_dir + "manifest.json"
+    if not os.path.isfile(fname):
+        return None
+    with open(fname) as f:
+        return json.load(f)
+
+
+def write_manifest(store_dir, manifest):
+    fname = store_dir + "manifest.json"
+    with open(fname + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(fname + ".tmp", fname)
+
+
+def open_store(key, step, block_size):
+    """Opens (or creates) the store of a warm start key.
+
+    Blocks are only valid on the lattice they were solved on, so a store
+    created with a different step raises a ValueError (include the step in
+    the key to keep one store per step).
+
+    # Arguments
+        key (dict): Everything the solutions depend on besides the free
+                    parameter values.
+        step (float): Lattice step.
+        block_size (int): Lattice points per dimension of new stores' blocks.
+
+    # Returns
+        store_dir (str): Store directory.
+        manifest (dict): Store manifest.
+
+    """
+    store_dir = get_store_dir(key)
+    with store_lock(store_dir):
+        manifest = read_manifest(store_dir)
+        if manifest is None:
+            manifest = {
+                "key": key,
+                "step": step,
+                "block_size": block_size,
+                "blocks": {},
+            }
+            write_manifest(store_dir, manifest)
+    if manifest["step"] != step:
+        raise ValueError(
+            "Warm start store %s has step %.2E, not %.2E."
+            % (store_dir, manifest["step"], step)
+        )
+    return store_dir, manifest
+
+
+def lattice_range(a, b, step):
+    """Integer lattice indices [k_lo, k_hi] covering the box [a, b]."""
+    k_lo = np.floor(np.array(a) / step + 1e-9).astype(np.int64)
+    k_hi = np.ceil(np.array(b) / step - 1e-9).astype(np.int64)
+    return k_lo, k_hi
+
+
+def block_name(block):
+    return "_".join(["%d" % i for i in block])
+
+
+def get_block_file(store_dir, block):
+    return store_dir + "blocks/" + block_name(block) + ".npz"
+
+
+def overlapping_blocks(k_lo, k_hi, block_size):
+    """Blocks (tuples of block indices) overlapping the lattice box."""
+    ranges = [
+        range(lo // block_size, hi // block_size + 1) for lo, hi in zip(k_lo, k_hi)
+    ]
+    return list(itertools.product(*ranges))
+
+
+def block_lattice(block, block_size):
+    """(D, block_size^D) lattice indices of a block in 'ij' order."""
+    axes = [np.arange(i * block_size, (i + 1) * block_size) for i in block]
+    grid = np.meshgrid(*axes, indexing="ij")
+    return np.stack([k.flatten() for k in grid], axis=0)
+
+
+def missing_blocks(store_dir, blocks, history=False):
+    """Blocks not yet in the store manifest (or lacking xs if history)."""
+    with store_lock(store_dir, exclusive=False):
+        manifest = read_manifest(store_dir)
+    done = manifest["blocks"]
+    return [
+        block
+        for block in blocks
+        if block_name(block) not in done
+        or (history and not done[block_name(block)]["history"])
+    ]
+
+
+def add_block(store_dir, block, block_size, step, history):
+    """Records a saved block in the store manifest."""
+    lo = [float(step * i * block_size) for i in block]
+    hi = [float(step * ((i + 1) * block_size - 1)) for i in block]
+    with store_lock(store_dir):
+        manifest = read_manifest(store_dir)
+        manifest["blocks"][block_name(block)] = {
+            "lo": lo,
+            "hi": hi,
+            "history": history,
+        }
+        write_manifest(store_dir, manifest)
+    return None
+
+
+def save_block(store_dir, block, solutions, xs=None):
+    """Atomically writes the solutions (and histories) of a block."""
+    block_file = get_block_file(store_dir, block)
+    tmp_file = block_file[:-4] + "_%d_tmp.npz" % os.getpid()
+    if xs is None:
+        np.savez(tmp_file, solutions=solutions)
+    else:
+        np.savez(tmp_file, solutions=solutions, xs=xs)
+    os.replace(tmp_file, block_file)
+    return block_file
+
+
+def pad_history(xs_list):
+    """Pads solver histories to a common length with their final states.
+
+    # Arguments
+        xs_list (list): (..., T_i) np.array solver histories.
+
+    # Returns
+        xs_list (list): (..., max T_i) np.array solver histories.
+
+    """
+    T = max([xs.shape[-1] for xs in xs_list])
+    return [
+        np.concatenate(
+            [xs, np.repeat(xs[..., -1:], T - xs.shape[-1], axis=-1)], axis=-1
+        )
+        for xs in xs_list
+    ]
+
+
+def assemble_box(store_dir, k_lo, k_hi, block_size, field="solutions"):
+    """Gathers a field of the lattice box [k_lo, k_hi] from its blocks.
+
+    # Arguments
+        store_dir (str): Store directory.
+        k_lo (np.array): (D,) lowest lattice indices of the box.
+        k_hi (np.array): (D,) highest lattice indices of the box.
+        block_size (int): Lattice points per dimension of the blocks.
+        field (str): "solutions" or "xs".
+
+    # Returns
+        values (np.array): (prod(k_hi-k_lo+1), ...) values in 'ij' order.
+
+    """
+    num_dims = len(k_lo)
+    nvals = [hi - lo + 1 for lo, hi in zip(k_lo, k_hi)]
+    blocks = overlapping_blocks(k_lo, k_hi, block_size)
+    block_values_list = [
+        np.load(get_block_file(store_dir, block))[field] for block in blocks
+    ]
+    if field == "xs":
+        block_values_list = pad_history(block_values_list)
+    value_shape = block_values_list[0].shape[1:]
+    values = np.zeros(nvals + list(value_shape), dtype=block_values_list[0].dtype)
+    for block, block_values in zip(blocks, block_values_list):
+        block_values = np.reshape(block_values, num_dims * (block_size,) + value_shape)
+        src = []
+        dst = []
+        for d in range(num_dims):
+            start = max(k_lo[d], block[d] * block_size)
+            stop = min(k_hi[d], (block[d] + 1) * block_size - 1) + 1
+            offset = block[d] * block_size
+            src.append(slice(start - offset, stop - offset))
+            dst.append(slice(start - k_lo[d], stop - k_lo[d]))
+        values[tuple(dst)] = block_values[tuple(src)]
+    return np.reshape(values, (int(np.prod(nvals)),) + values.shape[num_dims:])
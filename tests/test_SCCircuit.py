@@ -11,6 +11,7 @@ from dsn.util.systems import (
     LowRankRNN,
 )
 from dsn.util.dsn_util import get_system_from_template
+from dsn.util.tf_graph_util import initialize_graph_arrays
 import matplotlib.pyplot as plt
 
 DTYPE = tf.float64
@@ -120,6 +121,7 @@ def test_SCCircuit():
     _Z = np.random.normal(0.0, 3.0, (1, M, system.D))
 
     r_t = system.simulate(Z)
+    initialize_graph_arrays(sess)
     _r_t = sess.run(r_t, {Z: _Z})
 
     true_sys = sc_circuit()
@@ -164,6 +166,12 @@ def test_SCCircuit():
     r_t_true = np.transpose(r_t_true, [1, 0, 2, 3, 4])
     assert approx_equal(_r_t, r_t_true, EPS)
 
+    # Test the NumPy sufficient statistics
+    T_x = system.compute_suff_stats(Z)
+    _T_x = sess.run(T_x, {Z: _Z})
+    _T_x_np = system.compute_suff_stats_np(_Z[0], chunk_size=32)
+    assert approx_equal(_T_x_np, _T_x[0], 1e-10)
+
     return None
 
 
@@ -4,10 +4,18 @@ from tf_util.stat_util import approx_equal
 from dsn.util.tf_DMFT_solvers import (
     rank1_spont_static_solve, 
     rank1_spont_static_solve_np, 
+    rank1_spont_chaotic_solve,
+    rank1_spont_chaotic_solve_np,
     rank2_CDD_static_solve,
     rank2_CDD_static_solve_np,
+    warm_start_grid_shard,
+    solver_state_cache,
+    cached_solver_inits,
+    update_solver_state_cache,
 )
+from dsn.util.tf_graph_util import initialize_graph_arrays
 import dsn.lib.LowRank.Fig1_Spontaneous.fct_mf as mf
+import dsn.util.fct_mf as fct_mf
 import matplotlib.pyplot as plt
 
 DTYPE = tf.float64
@@ -61,6 +69,37 @@ def test_rank1_spont_static_solve():
 
     return None
 
+def test_rank1_spont_chaotic_solve():
+    np.random.seed(0)
+    n = 200
+    _g = np.random.uniform(1.5, 3.0, n)
+    _Mm = np.random.uniform(0.5, 2.0, n)
+    _Mn = np.random.uniform(0.5, 2.0, n)
+    _Sm = np.random.uniform(0.5, 1.0, n)
+    _inits = [50.0 * np.ones((n,)), 55.0 * np.ones((n,)), 45.0 * np.ones((n,))]
+
+    g = tf.placeholder(dtype=DTYPE, shape=(n,))
+    Mm = tf.placeholder(dtype=DTYPE, shape=(n,))
+    Mn = tf.placeholder(dtype=DTYPE, shape=(n,))
+    Sm = tf.placeholder(dtype=DTYPE, shape=(n,))
+    inits = [tf.constant(_init) for _init in _inits]
+
+    xs = rank1_spont_chaotic_solve(*inits, g, Mm, Mn, Sm, its, langevin_eps)
+    xs_np = rank1_spont_chaotic_solve_np(
+        *_inits, _g, _Mm, _Mn, _Sm, its, langevin_eps
+    )
+
+    with tf.Session() as sess:
+        _xs = sess.run(xs, {g: _g, Mm: _Mm, Mn: _Mn, Sm: _Sm})
+
+    # a few samples diverge (delta_0 < delta_inf) from these inits in both
+    for _x, x_np in zip(_xs, xs_np):
+        assert np.array_equal(np.isnan(_x), np.isnan(x_np))
+        assert approx_equal(_x, x_np, 1e-8, allow_special=True)
+
+    return None
+
+
 def test_rank2_CDD_static_solve():
     n = 1000
     _g = np.random.uniform(0.01, 5.0, n)
@@ -131,6 +170,153 @@ def test_rank2_CDD_static_solve():
     return None
 
 
+def test_warm_start_grid_shard():
+    grid_vals_list = [
+        np.arange(0.0, 2.01, 0.5),
+        np.array([3.0]),
+        np.arange(-1.0, 1.01, 0.5),
+        np.arange(0.5, 1.01, 0.5),
+    ]
+    grid = np.meshgrid(*grid_vals_list, indexing="ij")
+    grid = np.stack([vals.flatten() for vals in grid], axis=0)
+    m = grid.shape[1]
+
+    for shard_size in [1, 7, m]:
+        shards = [
+            warm_start_grid_shard(grid_vals_list, start, min(start + shard_size, m))
+            for start in range(0, m, shard_size)
+        ]
+        assert np.array_equal(np.concatenate(shards, axis=1), grid)
+    return None
+
+
+def test_solver_state_cache():
+    size = 8
+    z_dim = 2
+    x_dim = 3
+    M = 5
+    z = tf.placeholder(dtype=DTYPE, shape=(None, z_dim))
+    x = tf.placeholder(dtype=DTYPE, shape=(None, x_dim))
+    x_default = -np.ones((M, x_dim))
+
+    cache = solver_state_cache("test_cache", z_dim, x_dim, size)
+    x_init = cached_solver_inits(cache, z, x_default)
+    update = update_solver_state_cache(cache, z, x)
+
+    _z1 = np.random.normal(0.0, 1.0, (M, z_dim))
+    _x1 = np.random.normal(0.0, 1.0, (M, x_dim))
+    _z2 = _z1 + 1e-3
+    _x2 = np.copy(_x1)
+    _x2[0, 0] = np.nan
+    with tf.Session() as sess:
+        initialize_graph_arrays(sess)
+        # empty cache
+        _x_init = sess.run(x_init, {z: _z1})
+        assert approx_equal(_x_init, x_default, EPS)
+
+        sess.run(update, {z: _z1, x: _x1})
+        _x_init = sess.run(x_init, {z: _z2})
+        assert approx_equal(_x_init, _x1, EPS)
+
+        # non-finite solutions are skipped, older pairs are overwritten
+        sess.run(update, {z: _z2, x: _x2})
+        _count, _zs = sess.run([cache["count"], cache["zs"]])
+        assert _count == 2 * M - 1
+        assert approx_equal(_zs[M:], _z2[1:4], EPS)
+        assert approx_equal(_zs[0], _z2[4], EPS)
+        assert approx_equal(_zs[1:M], _z1[1:], EPS)
+    return None
+
+
+def test_SolveStaticBatch():
+    n = 40
+    _g = np.random.uniform(0.2, 1.2, n)
+    _Sini = np.random.uniform(0.0, 1.0, n)
+    VecPar = [3.5, 1.0, 0.0, 1.0, 1.0, _Sini, 1.0]
+    _y0 = np.random.uniform(-5.0, 5.0, (n, 3))
+    _y0[:, 1] = np.abs(_y0[:, 1])
+    # some rows iterate towards unstable solutions
+    backwards = np.where(np.arange(n) % 4 == 0, -1, 1)
+
+    y, count, ys = fct_mf.SolveStaticBatch(
+        _y0, _g, VecPar, langevin_eps, 1e-10, backwards, history=True
+    )
+    assert ys.shape == (n, 3, np.max(count) - 1)
+    for k in range(n):
+        VecPar_k = [3.5, 1.0, 0.0, 1.0, 1.0, _Sini[k], 1.0]
+        ys_k, count_k = fct_mf.SolveStatic(
+            _y0[k], _g[k], VecPar_k, langevin_eps, 1e-10, backwards[k]
+        )
+        assert count[k] == count_k
+        # relative, since backwards rows may explode before stopping
+        assert np.allclose(y[k], ys_k[-1], rtol=1e-10, atol=1e-12)
+        assert np.allclose(ys[k, :, : count_k - 1], ys_k.T, rtol=1e-10, atol=1e-12)
+
+    # capped iterations
+    y, count = fct_mf.SolveStatic2Batch(_y0, _g, 0.0, VecPar, langevin_eps, max_its=5)
+    assert np.all(count <= 6)
+    return None
+
+
+def test_SolveStaticMultiStart():
+    n = 5
+    _y = np.random.uniform(0.5, 3.0, (n, 3))
+    _g = np.random.uniform(0.3, 1.5, n)
+    VecPar = [
+        np.random.uniform(-2.0, 4.0, n),
+        np.random.uniform(0.0, 2.0, n),
+        np.random.uniform(-1.0, 1.0, n),
+        1.3,
+        1.0,
+        np.random.uniform(0.0, 1.0, n),
+        0.7,
+    ]
+    J = fct_mf.static_jacobian(_y, _g, VecPar)
+    h = 1e-6
+    for j in range(2):
+        y_plus = _y.copy()
+        y_plus[:, j + 1] += h
+        y_minus = _y.copy()
+        y_minus[:, j + 1] -= h
+        J_fd = (
+            fct_mf.static_map(y_plus, _g, VecPar)
+            - fct_mf.static_map(y_minus, _g, VecPar)
+        ) / (2 * h)
+        assert approx_equal(J[:, :, j], J_fd, 1e-6)
+
+    # bistable, bistable without input, monostable
+    starts = np.array(
+        [[5.0, 5.0, 5.0], [-5.0, 5.0, -5.0], [0.0, 1.0, 0.1], [0.0, 1.0, -0.1]]
+    )
+    backwards = np.array([1, 1, -1, -1])
+    Mm = np.array([3.5, 3.5, 0.5])
+    Sini = np.array([0.5, 0.0, 0.5])
+    VecPar = [Mm, 1.0, 0.0, 1.0, 1.0, Sini, 1.0]
+    solutions, num_solutions, stable, hits = fct_mf.SolveStaticMultiStart(
+        starts, 0.8, VecPar, langevin_eps, backwards=backwards, k_max=3
+    )
+    assert solutions.shape == (3, 3, 3)
+    assert np.all(num_solutions == np.array([3, 3, 1]))
+    assert np.all(stable == np.array([[1, 1, 0], [1, 1, 0], [1, 0, 0]], bool))
+    # backwards starts of the monostable network run off and are discarded
+    assert np.all(hits == np.array([[1, 1, 2], [1, 1, 2], [2, 0, 0]]))
+    assert np.all(np.isnan(solutions[2, 1:]))
+
+    # the stable solutions are those of SolveStatic
+    for k in range(2):
+        VecPar_k = [Mm[0], 1.0, 0.0, 1.0, 1.0, Sini[0], 1.0]
+        ys_k, count_k = fct_mf.SolveStatic(starts[k], 0.8, VecPar_k, langevin_eps)
+        assert np.allclose(solutions[0, k], ys_k[-1], rtol=1e-8)
+    # without input the solutions are symmetric
+    assert approx_equal(solutions[1, 0], solutions[1, 1] * [-1.0, 1.0, -1.0], 1e-8)
+    return None
+
+
 if __name__ == "__main__":
     test_rank1_spont_static_solve()
+    test_rank1_spont_chaotic_solve()
     test_rank2_CDD_static_solve()
+    test_warm_start_grid_shard()
+    test_solver_state_cache()
+    test_SolveStaticBatch()
+    test_SolveStaticMultiStart()
@@ -10,7 +10,12 @@ from dsn.util.systems import (
     SCCircuit,
     LowRankRNN,
 )
+import dsn.util.systems as systems
+from dsn.util.tf_graph_util import initialize_graph_arrays
 import matplotlib.pyplot as plt
+import tempfile
+import shutil
+import os
 
 # import dsn.lib.LowRank.Fig1_Spontaneous.fct_mf as mf
 
@@ -84,5 +89,195 @@ def test_LowRankRNN():
     return None
 
 
+def write_warm_start_file(fname, grid_vals_list, d=3):
+    grid_shape = np.array([vals.shape[0] for vals in grid_vals_list])
+    param_grid = np.stack(
+        [x.flatten() for x in np.meshgrid(*grid_vals_list, indexing="ij")], axis=0
+    )
+    W = np.random.normal(0.0, 1.0, (param_grid.shape[0], d))
+    solution_grid = np.sin(np.dot(param_grid.T, W)) + 2.0
+    np.savez(
+        fname,
+        param_grid=param_grid,
+        solution_grid=solution_grid,
+        grid_shape=grid_shape,
+        grid_vals=np.concatenate(grid_vals_list),
+    )
+    return param_grid
+
+
+def lookup_points(grid_vals_list, M):
+    """Grid nodes, points inside cells, and points on and past the edges."""
+    lo = np.array([vals[0] for vals in grid_vals_list])
+    hi = np.array([vals[-1] for vals in grid_vals_list])
+    nvals = np.array([vals.shape[0] for vals in grid_vals_list])
+    step = 0.5
+    num_dims = len(grid_vals_list)
+    nodes = lo + step * np.random.randint(0, nvals, (M, num_dims))
+    cells = lo + step * np.random.randint(0, np.maximum(nvals - 1, 1), (M, num_dims))
+    inside = cells + step * np.random.uniform(0.1, 0.9, (M, num_dims)) * (nvals > 1)
+    edges = np.copy(inside)
+    edge_dims = np.random.randint(0, 2, (M, num_dims)) == 1
+    edges[edge_dims] = np.tile(hi, (M, 1))[edge_dims]
+    beyond = np.copy(edges)
+    past = np.random.uniform(0.0, 0.05, (M, num_dims)) * (nvals > 1)
+    beyond[edge_dims] += past[edge_dims]
+    beyond[~edge_dims] = np.tile(lo, (M, 1))[~edge_dims] - past[~edge_dims]
+    return np.concatenate((nodes, inside, edges, beyond), axis=0)
+
+
+def test_warm_start_lookup():
+    np.random.seed(0)
+    behavior = {"type": "CDD", "means": np.array([0.3]), "variances": np.array([0.1])}
+    model_opts = {"rank": 2, "input_type": "input"}
+    ws_dir = tempfile.mkdtemp()
+    warm_start = systems.warm_start
+    step = 0.5
+    grids = [
+        [step * np.arange(0, 5), step * np.arange(-3, 4)],
+        [step * np.arange(2, 5), step * np.arange(-1, 2), step * np.arange(0, 4)],
+        [
+            step * np.arange(0, 3),
+            step * np.arange(-2, 1),
+            np.array([1.0]),
+            step * np.arange(-1, 2),
+            step * np.arange(1, 4),
+        ],
+    ]
+    try:
+        for i, grid_vals_list in enumerate(grids):
+            fname = os.path.join(ws_dir, "ws%d.npz" % i)
+            param_grid = write_warm_start_file(fname, grid_vals_list)
+            systems.warm_start = lambda system: (fname, None)
+            _Z = lookup_points(grid_vals_list, 20)
+            num_dims = _Z.shape[1]
+
+            inits = {}
+            for lookup in ["grid", "dense"]:
+                model_opts.update({"warm_start_lookup": lookup})
+                system = LowRankRNN({}, behavior, model_opts=model_opts)
+                tf.reset_default_graph()
+                Z = tf.placeholder(DTYPE, (1, None, num_dims))
+                _, param_select, ws_inits, _param_grid = system.get_warm_start_inits(Z)
+                assert approx_equal(_param_grid[0], param_grid.T, EPS)
+                with tf.Session() as sess:
+                    initialize_graph_arrays(sess)
+                    inits[lookup] = sess.run(
+                        [param_select, ws_inits], {Z: np.expand_dims(_Z, 0)}
+                    )
+                inits[lookup + "_np"] = system.get_warm_start_inits_np(_Z)
+
+            # The grid points outside the cell of a sample carry at most
+            # exp(-beta*step^2) of the weight of its nearest corner, but every
+            # grid point gets kernel_eps, which matters between the nodes.
+            nodes = slice(0, 20)
+            for j in range(2):
+                assert approx_equal(
+                    inits["grid"][j][nodes], inits["dense"][j][nodes], 1e-10
+                )
+                assert approx_equal(inits["grid"][j], inits["dense"][j], 1e-6)
+            assert approx_equal(inits["grid_np"], inits["grid"][1], 1e-10)
+            assert approx_equal(inits["dense_np"], inits["dense"][1], 1e-10)
+    finally:
+        systems.warm_start = warm_start
+    return None
+
+
+def T_x_tf_np(system, _Z):
+    tf.reset_default_graph()
+    Z = tf.placeholder(DTYPE, (1, None, system.D))
+    T_x = system.compute_suff_stats(Z)
+    with tf.Session() as sess:
+        initialize_graph_arrays(sess)
+        _T_x = sess.run(T_x, {Z: np.expand_dims(_Z, 0)})
+    return _T_x[0], system.compute_suff_stats_np(_Z, chunk_size=7)
+
+
+def test_LowRankRNN_np():
+    np.random.seed(0)
+    M = 20
+
+    # struct_chaos (no input)
+    behavior = {
+        "type": "struct_chaos",
+        "means": np.array([0.5, 0.5, 0.5]),
+        "variances": np.array([0.01, 0.01, 0.01]),
+    }
+    model_opts = {"rank": 1, "input_type": "spont"}
+    system = LowRankRNN({}, behavior, model_opts=model_opts, solve_its=200)
+    _Z = np.random.uniform(0.0, 1.0, (M, 4)) * np.array([2.0, 2.0, 2.0, 1.0])
+    _Z[:, 0] += 2.0
+    _T_x, _T_x_np = T_x_tf_np(system, _Z)
+    # both backends diverge from the default inits on the same networks
+    ok = np.logical_not(np.isnan(_T_x[:, 0]))
+    assert np.array_equal(ok, np.logical_not(np.isnan(_T_x_np[:, 0])))
+    assert np.all(_T_x[ok, 2] > 0.1)
+    assert approx_equal(_T_x_np[ok], _T_x[ok], 1e-8)
+
+    # CDD (rank 2, static)
+    behavior = {"type": "CDD", "means": np.array([0.3]), "variances": np.array([0.1])}
+    model_opts = {"rank": 2, "input_type": "input"}
+    fixed_params = {"betam": 0.6, "betan": 1.0}
+    system = LowRankRNN(fixed_params, behavior, model_opts=model_opts, solve_its=200)
+    _Z = np.random.uniform(system.a, system.b, (M, system.D))
+    _T_x, _T_x_np = T_x_tf_np(system, _Z)
+    assert approx_equal(_T_x_np, _T_x, 1e-8)
+
+    # BI (warm started from a file of plausible inits)
+    ws_dir = tempfile.mkdtemp()
+    warm_start = systems.warm_start
+    try:
+        fname = os.path.join(ws_dir, "ws.npz")
+        grid_vals = 0.5 * np.arange(-10, 11)
+        ones = np.ones(grid_vals.shape)
+        solution_grid = np.stack(
+            (0.2 * grid_vals, 0.2 * grid_vals, 2.0 * ones, 1.0 * ones), axis=1
+        )
+        np.savez(
+            fname,
+            param_grid=np.expand_dims(grid_vals, 0),
+            solution_grid=solution_grid,
+            grid_shape=np.array([grid_vals.shape[0]]),
+            grid_vals=grid_vals,
+        )
+        systems.warm_start = lambda system: (fname, None)
+
+        fixed_params = {"g": 0.8, "Mn": 2.0, "MI": 2.0, "Sm": 1.0, "Sn": 1.0}
+        fixed_params.update({"SmI": 0.0, "SnI": 1.0, "Sperp": 0.0})
+        behavior = {
+            "type": "BI",
+            "prior": np.array([4.0, 1.0]),
+            "variances": np.array([0.1, 0.1]),
+        }
+        model_opts = {"rank": 1, "input_type": "input"}
+        system = LowRankRNN(fixed_params, behavior, model_opts=model_opts)
+        assert system.free_params == ["Mm"]
+        _Z = np.random.uniform(system.a, system.b, (M, system.D))
+        _T_x, _T_x_np = T_x_tf_np(system, _Z)
+        assert approx_equal(_T_x_np, _T_x, 1e-8)
+    finally:
+        systems.warm_start = warm_start
+        shutil.rmtree(ws_dir)
+
+    # unsupported systems are rejected before solving
+    behavior = {"type": "ND", "means": np.array([0.6]), "variances": np.array([0.01])}
+    model_opts = {"rank": 1, "input_type": "input"}
+    fixed_params = {"MI": 0.0, "SmI": 0.0, "Sperp": 0.0}
+    for behavior_type in ["ND", "struct_chaos"]:
+        behavior["type"] = behavior_type
+        if behavior_type == "struct_chaos":
+            behavior["means"] = np.array([0.5, 0.5, 0.5])
+            behavior["variances"] = np.array([0.01, 0.01, 0.01])
+        system = LowRankRNN(fixed_params, behavior, model_opts=model_opts)
+        try:
+            system.compute_suff_stats_np(np.zeros((1, system.D)))
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    return None
+
+
 if __name__ == "__main__":
-     test_LowRankRNN()
+    test_LowRankRNN()
+    test_warm_start_lookup()
+    test_LowRankRNN_np()
@@ -124,6 +124,9 @@ def test_Linear2D():
             _T_x_true[i, :] = true_sys.compute_suff_stats(tau[0, i], A[0, i], mu1)
         _T_x = sess.run(T_x, {Z: _Z})
         assert approx_equal(_T_x[0, :, :], _T_x_true, EPS)
+        _T_x_np = sys.compute_suff_stats_np(_Z[0], chunk_size=7)
+        assert approx_equal(_T_x_np, _T_x[0], EPS)
+        assert approx_equal(_T_x_np, _T_x_true, EPS)
     return None
 
 
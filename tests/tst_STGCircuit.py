@@ -10,6 +10,7 @@ from dsn.util.systems import (
     SCCircuit,
     LowRankRNN,
 )
+from dsn.util.tf_graph_util import initialize_graph_arrays
 import matplotlib.pyplot as plt
 
 # import dsn.lib.LowRank.Fig1_Spontaneous.fct_mf as mf
@@ -246,6 +247,7 @@ def test_STGCircuit():
     T_x = system.compute_suff_stats(Z)
     x_t = system.simulate(Z, db=True)
     with tf.Session() as sess:
+        initialize_graph_arrays(sess)
         _x_t, _T_x = sess.run([x_t, T_x], {Z: _Z / 1.0e-9})
     print('_T_x', np.sum(np.isnan(_T_x)))
 
@@ -257,6 +259,9 @@ def test_STGCircuit():
     assert approx_equal(np.transpose(_x_t, [1, 2, 0]), x_true, EPS)
     assert approx_equal(_T_x[0], T_x_true, EPS, allow_special=True)
 
+    _T_x_np = system.compute_suff_stats_np(_Z[0] / 1.0e-9, chunk_size=128)
+    assert approx_equal(_T_x_np, _T_x[0], 1e-10, allow_special=True)
+
     return None
 
 
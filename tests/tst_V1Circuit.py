@@ -181,6 +181,8 @@ def test_V1Circuit():
     var_true = np.square(r_ss - np.expand_dims(system.mu[:4], 0))
     T_x_true = np.concatenate((mean_true, var_true), axis=1)
     assert(approx_equal(_T_x, np.expand_dims(T_x_true, 0), 1e-6))
+    _T_x_np = system.compute_suff_stats_np(_Z[0], chunk_size=32)
+    assert(approx_equal(_T_x_np, _T_x[0], 1e-10))
 
     # Check that mu matches data
     # Local test. Cant put this data on github.
@@ -269,6 +271,8 @@ def test_V1Circuit():
         var_true = np.square(mean_true - system.mu[0])
         T_x_true = np.concatenate((mean_true, var_true), axis=1)
         assert(approx_equal(_T_x, np.expand_dims(T_x_true, 0), 1e-6))
+        _T_x_np = system.compute_suff_stats_np(_Z[0], chunk_size=32)
+        assert(approx_equal(_T_x_np, _T_x[0], 1e-10))
 
 
     return None
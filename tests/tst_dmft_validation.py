@@ -0,0 +1,94 @@
+import numpy as np
+from tf_util.stat_util import approx_equal
+from dsn.util.dmft_validation import (
+    RANK1_PARAMS,
+    VALIDATION_STATS,
+    fit_inverse_N,
+    validate_rank1_dmft,
+    summary_table,
+)
+
+
+def test_fit_inverse_N():
+    Ns = [100, 200, 400, 800]
+    a = np.random.normal(0.0, 1.0, (3, 2))
+    b = np.random.normal(0.0, 10.0, (3, 2))
+    errs = np.expand_dims(a, 2) + np.expand_dims(b, 2) / np.array(Ns)
+    coeffs, r2 = fit_inverse_N(Ns, errs)
+    assert coeffs.shape == (3, 2, 2)
+    assert np.allclose(coeffs[:, :, 0], a)
+    assert np.allclose(coeffs[:, :, 1], b)
+    assert np.allclose(r2, 1.0)
+    return None
+
+
+def test_validate_rank1_dmft():
+    # static (g < 1) networks with input
+    params = np.array(
+        [
+            [0.5, 1.5, 1.0, 0.5, 1.0, 1.0, 0.2, 0.3, 0.5],
+            [0.3, -1.0, 1.0, 0.2, 0.5, 1.0, 0.0, 0.0, 0.5],
+        ]
+    )
+    assert params.shape[1] == len(RANK1_PARAMS)
+    Ns = [100, 3200]
+    results = validate_rank1_dmft(
+        params, Ns, num_reps=2, T=300, t_start=100, dt=0.2, num_procs=2
+    )
+    num_stats = len(VALIDATION_STATS)
+    assert results["sims"].shape == (2, 2, 2, num_stats)
+    assert results["errs"].shape == (2, 2, num_stats)
+    assert results["fit"].shape == (num_stats, 2)
+
+    # simulations agree with DMFT, better at larger N
+    assert np.all(results["errs"][:, -1, :3] < 0.15)
+    assert np.mean(results["errs"][:, -1]) < np.mean(results["errs"][:, 0])
+    # static networks
+    assert np.all(results["sims"][:, :, :, 3] < 1e-6)
+    assert len(summary_table(results).split("\n")) == num_stats + 2
+
+    # dense networks simulated together match the matrix-free ones
+    sims = []
+    for matrix_free_N in [None, 0]:
+        results = validate_rank1_dmft(
+            params,
+            Ns[:1],
+            num_reps=2,
+            T=300,
+            t_start=100,
+            dt=0.2,
+            num_procs=2,
+            matrix_free_N=matrix_free_N,
+        )
+        sims.append(results["sims"])
+    assert approx_equal(sims[0], sims[1], 1e-10)
+    return None
+
+
+def test_validate_rank1_dmft_chaotic():
+    # chaotic (g > 1) networks without input
+    params = np.array(
+        [
+            [1.5, 0.5, 2.0, 0.0, 1.0, 1.0, 0.0, 0.0, 0.0],
+            [2.0, 0.3, 1.0, 0.0, 1.0, 1.0, 0.0, 0.0, 0.0],
+        ]
+    )
+    Ns = [200, 1600]
+    results = validate_rank1_dmft(
+        params, Ns, num_reps=2, T=1500, t_start=500, dt=0.2, num_procs=2
+    )
+    delta_T = results["dmft"][:, 3]
+    assert np.all(delta_T > 0.5)
+    # small networks may settle on a fixed point or cycle, large ones stay chaotic
+    assert np.all(results["sims"][:, -1, :, 3] > 0.5 * np.expand_dims(delta_T, 1))
+
+    # the temporal variance approaches DMFT with N
+    assert np.all(results["errs"][:, -1, 3] < 0.1 * delta_T)
+    assert np.all(results["errs"][:, -1, 3] < results["errs"][:, 0, 3])
+    return None
+
+
+if __name__ == "__main__":
+    test_fit_inverse_N()
+    test_validate_rank1_dmft()
+    test_validate_rank1_dmft_chaotic()
@@ -1,7 +1,8 @@
 import tensorflow as tf
 import numpy as np
 from tf_util.stat_util import approx_equal
-from dsn.util.dsn_util import check_convergence
+from dsn.util.dsn_util import check_convergence, get_perturbs, continuation_perturbs
+from dsn.util.tf_langevin import fixed_point_solve
 
 DTYPE = tf.float64
 EPS = 1e-16
@@ -46,5 +47,64 @@ def test_check_convergence():
         assert not check_convergence(cost_grads, cur_ind, lag, alpha)
 
 
+class CubicFold:
+    # x^3 - x + z = 0 has a fold of its upper branch at z = 2/(3 sqrt(3))
+    def __init__(self,):
+        self.D = 1
+        self.num_suff_stats = 2
+        self.solver_states = {}
+
+    def build(self, Z):
+        z = Z[0, :, :]
+        x_init = tf.placeholder_with_default(1.5 + 0.0 * z, (None, 1))
+
+        def f(x):
+            return x ** 3 + z
+
+        x = fixed_point_solve(
+            f, x_init, 0.5, 100, [False], solver="newton", tol=1e-12, implicit_grad=True
+        )
+        residual = tf.abs(x ** 3 - x + z)[:, 0]
+        self.solver_states["cubic"] = {
+            "init": x_init,
+            "solution": x,
+            "residual": residual,
+        }
+        return tf.expand_dims(tf.concat((x, tf.square(x)), axis=1), 0)
+
+
+def test_continuation_perturbs():
+    system = CubicFold()
+    Z = tf.placeholder(DTYPE, (1, None, 1))
+    T_x = system.build(Z)
+
+    n = 21
+    z0 = np.zeros((1, 1, 1))
+    V = np.array([[1.0, 0.5]])
+    T_x_perturbs, delta, Z_perturbs, folds, num_solves = continuation_perturbs(
+        system, V, z0, n, 1.0, Z=Z, T_x=T_x
+    )
+    z_fold = 2.0 / (3.0 * np.sqrt(3.0))
+    for j in range(2):
+        z = Z_perturbs[j, :, 0]
+        x = T_x_perturbs[j, :, 0]
+        assert approx_equal(x ** 3 - x + z, 0.0, 1e-8)
+        # one fold, right after the upper branch ends
+        assert np.sum(folds[j]) == 1
+        i_fold = np.argmax(folds[j])
+        assert z[i_fold - 1] < z_fold and z[i_fold] > z_fold
+        assert np.all(x[:i_fold] > 0.5) and np.all(x[i_fold:] < -1.0)
+        assert num_solves[j, i_fold] > 1
+
+    # same lines as get_perturbs, which solves each point on its own
+    T_x_perturbs, delta_direct, Z_direct = get_perturbs(
+        system, V, z0, n, 1.0, Z=Z, T_x=T_x
+    )
+    assert approx_equal(delta_direct, delta, 1e-16)
+    assert approx_equal(Z_direct, Z_perturbs, 1e-16)
+    return None
+
+
 if __name__ == "__main__":
     test_check_convergence()
+    test_continuation_perturbs()
@@ -1,8 +1,15 @@
 import dsn.util.tf_integrals as tfi
 import dsn.util.fct_integrals as fcti
+import dsn.util.np_moment_tables as npmt
+import dsn.util.tf_moment_tables as tfmt
+from dsn.util.np_moments import gaussian_moments
 import numpy as np
 import tensorflow as tf
 from tf_util.stat_util import approx_equal
+from dsn.util.tf_graph_util import initialize_graph_arrays
+import tempfile
+import shutil
+import os
 
 # Checks tensorflow implementation (and coarser approximations)
 # against original numpy code from M&0 2018
@@ -240,6 +247,99 @@ def test_IntPrimePrime():
     return None
 
 
+def test_quadrature_sharing():
+    tf.reset_default_graph()
+    mu = tf.placeholder(dtype=DTYPE, shape=(num_mus,))
+    delta0 = tf.placeholder(dtype=DTYPE, shape=(num_mus,))
+
+    def body(i, x):
+        return i + 1, tfi.Phi(x, delta0, 50) + tfi.Prime(x, delta0, 50)
+
+    tf.while_loop(lambda i, x: i < 10, body, [tf.constant(0), mu])
+    tfi.PhiSq(mu, delta0, 50)
+    tfi.IntPhiPhi(mu, delta0, delta0, 50)
+    quadrature = tfi.get_quadrature(50, dtype=DTYPE)
+    assert quadrature is tfi.get_quadrature(50, dtype=DTYPE)
+    # created once per (num_pts, double), outside of the while loop
+    consts = [
+        op
+        for op in tf.get_default_graph().get_operations()
+        if op.name.startswith("gauss_quadrature_50")
+    ]
+    assert len(consts) == 6
+    assert quadrature[1].op._control_flow_context is None
+    return None
+
+
+def test_moment_tables():
+    moments = npmt.SINGLE_TABLE_MOMENTS + npmt.NESTED_TABLE_MOMENTS
+    tables = npmt.load_moment_tables(50)
+
+    # interpolation error bounds against 50-point quadrature for delta0 < 20
+    errors = npmt.table_errors(tables, 50, delta0_max=20.0)
+    bounds = {
+        "Phi": 1e-3,
+        "Prime": 1e-3,
+        "PhiSq": 1e-3,
+        "PrimSq": 1e-2,
+        "IntPhiPhi": 1e-2,
+        "IntPrimPrim": 1e-2,
+    }
+    for moment in moments:
+        print("%s max abs error (delta0 < 20): %.2E" % (moment, errors[moment]))
+        assert errors[moment] < bounds[moment]
+    # report over the whole table
+    errors = npmt.table_errors(tables, 50)
+    for moment in moments:
+        print("%s max abs error: %.2E" % (moment, errors[moment]))
+
+    # tensorflow interpolation matches numpy
+    _delta0, _mu = np.meshgrid(delta0s, mus)
+    _mu = np.reshape(_mu, (num_mus * num_delta0s,))
+    _delta0 = np.reshape(_delta0, (num_mus * num_delta0s,))
+    _deltainf = 0.5 * _delta0
+    y_np = npmt.gaussian_moments(_mu, _delta0, _deltainf, moments, 50)
+
+    tf.reset_default_graph()
+    mu = tf.placeholder(dtype=DTYPE, shape=(None,))
+    delta0 = tf.placeholder(dtype=DTYPE, shape=(None,))
+    deltainf = tf.placeholder(dtype=DTYPE, shape=(None,))
+    y = tfmt.gaussian_moments(mu, delta0, deltainf, moments, 50)
+    grads = tf.gradients(tf.reduce_sum(y), [mu, delta0, deltainf])
+    with tf.Session() as sess:
+        initialize_graph_arrays(sess)
+        feed_dict = {mu: _mu, delta0: _delta0, deltainf: _deltainf}
+        _y, _grads = sess.run([y, grads], feed_dict)
+    for i in range(len(moments)):
+        assert np.allclose(_y[i], y_np[i], rtol=1e-10, atol=1e-10)
+    for grad in _grads:
+        assert np.all(np.isfinite(grad))
+    return None
+
+
+def test_moment_tables_file():
+    tables_dir, table_grid = npmt.MOMENT_TABLES_DIR, dict(npmt.TABLE_GRID)
+    npmt.MOMENT_TABLES_DIR = os.path.join(tempfile.mkdtemp(), "")
+    npmt.TABLE_GRID.update({"u": 9, "v": 7, "r": 5})
+    try:
+        fname = npmt.get_moment_tables_file(20)
+        tables = npmt.load_moment_tables(20)
+        assert tables["single"].shape == (11, 9, 4)
+        # written atomically, no temporary files are left
+        assert os.listdir(npmt.MOMENT_TABLES_DIR) == [os.path.basename(fname)]
+
+        # a different grid gets its own file
+        npmt.TABLE_GRID["r"] = 6
+        assert npmt.get_moment_tables_file(20) != fname
+        assert npmt.get_moment_tables_file(30) != fname
+    finally:
+        shutil.rmtree(npmt.MOMENT_TABLES_DIR)
+        npmt.MOMENT_TABLES_DIR = tables_dir
+        npmt.TABLE_GRID.update(table_grid)
+        npmt._moment_tables.pop(20, None)
+    return None
+
+
 if __name__ == "__main__":
     test_Prim()
     test_Phi()
@@ -256,3 +356,6 @@ if __name__ == "__main__":
     test_IntPrimPrim()
     test_IntPhiPhi()
     test_IntPrimePrime()
+    test_quadrature_sharing()
+    test_moment_tables()
+    test_moment_tables_file()
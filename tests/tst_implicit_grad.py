@@ -0,0 +1,127 @@
+import numpy as np
+import tensorflow as tf
+from tf_util.stat_util import approx_equal
+from dsn.util.tf_langevin import (
+    bounded_langevin_dyn,
+    fixed_point_solve,
+    implicit_fixed_point,
+)
+from dsn.util.tf_DMFT_solvers import rank1_spont_static_solve
+
+DTYPE = tf.float64
+
+n = 200
+
+
+def test_implicit_fixed_point():
+    d = 3
+    x0 = tf.placeholder(dtype=DTYPE, shape=(n, d))
+    W = tf.placeholder(dtype=DTYPE, shape=(n, d, d))
+    b = tf.placeholder(dtype=DTYPE, shape=(n, d))
+
+    def f(x):
+        return tf.reduce_sum(W * tf.expand_dims(tf.tanh(x), 1), axis=2) + b
+
+    eps = 0.5
+    num_its = 1000
+    non_neg = [False, False, True]
+
+    _x0 = np.random.normal(0.0, 5.0, (n, d))
+    # contractive, so the unrolled dynamics converge
+    _W = np.random.uniform(-0.3, 0.3, (n, d, d))
+    _b = np.random.normal(0.0, 1.0, (n, d))
+    # half of the samples have the last coordinate at its bound
+    _b[: n // 2, 2] = -2.0
+    _b[n // 2 :, 2] = 2.0
+    _c = np.random.normal(0.0, 1.0, (n, d))
+    feed_dict = {x0: _x0, W: _W, b: _b}
+
+    x_unrolled = bounded_langevin_dyn(f, x0, eps, num_its, non_neg)
+    loss_unrolled = tf.reduce_sum(_c * x_unrolled)
+    grads_unrolled = tf.gradients(loss_unrolled, [W, b])
+
+    grads = []
+    for solver in ["langevin", "while", "newton"]:
+        x_implicit = fixed_point_solve(
+            f, x0, eps, num_its, non_neg, solver=solver, tol=1e-12, implicit_grad=True
+        )
+        loss_implicit = tf.reduce_sum(_c * x_implicit)
+        grads.append([x_implicit] + tf.gradients(loss_implicit, [W, b]))
+        # no gradient flows to the initialization
+        assert tf.gradients(loss_implicit, x0)[0] is None
+
+    # a fixed point that stops just short of the bound
+    x_near = tf.placeholder(dtype=DTYPE, shape=(n, d))
+    loss_near = tf.reduce_sum(_c * implicit_fixed_point(f, x_near, non_neg))
+    grads_near = tf.gradients(loss_near, [W, b])
+
+    with tf.Session() as sess:
+        _x_unrolled, _grads_unrolled = sess.run([x_unrolled, grads_unrolled], feed_dict)
+        _grads = sess.run(grads, feed_dict)
+        feed_dict[x_near] = _x_unrolled + 1e-13 * (_x_unrolled == 0.0)
+        _grads.append([_x_unrolled] + sess.run(grads_near, feed_dict))
+
+    assert np.all(_x_unrolled[: n // 2, 2] == 0.0)
+    for _x_implicit, _dW, _db in _grads:
+        assert approx_equal(_x_implicit, _x_unrolled, 1e-9)
+        assert approx_equal(_dW, _grads_unrolled[0], 1e-8)
+        assert approx_equal(_db, _grads_unrolled[1], 1e-8)
+        # clipped coordinates do not respond to parameter changes
+        assert np.all(_db[: n // 2, 2] == 0.0)
+    return None
+
+
+def test_rank1_spont_static_implicit_grad():
+    _g = np.random.uniform(0.1, 0.8, n)
+    _mu_init = np.random.uniform(0.01, 5.0, n)
+    _delta_0_init = np.random.uniform(0.01, 5.0, n)
+    _Mm = np.random.uniform(-0.8, 0.8, (n,))
+    _Mn = np.random.uniform(-0.8, 0.8, (n,))
+    _Sm = np.random.uniform(0.01, 1.0, n)
+
+    mu_init = tf.placeholder(dtype=DTYPE, shape=(n,))
+    delta_0_init = tf.placeholder(dtype=DTYPE, shape=(n,))
+    g = tf.placeholder(dtype=DTYPE, shape=(n,))
+    Mm = tf.placeholder(dtype=DTYPE, shape=(n,))
+    Mn = tf.placeholder(dtype=DTYPE, shape=(n,))
+    Sm = tf.placeholder(dtype=DTYPE, shape=(n,))
+    params = [g, Mm, Mn, Sm]
+
+    num_its = 500
+    eps = 0.2
+    outs = []
+    for implicit_grad in [False, True]:
+        mu, delta_0 = rank1_spont_static_solve(
+            mu_init,
+            delta_0_init,
+            g,
+            Mm,
+            Mn,
+            Sm,
+            num_its,
+            eps,
+            gauss_quad_pts=50,
+            implicit_grad=implicit_grad,
+        )
+        loss = tf.reduce_sum(mu) + tf.reduce_sum(tf.square(delta_0))
+        outs.append([mu, delta_0] + tf.gradients(loss, params))
+
+    feed_dict = {
+        mu_init: _mu_init,
+        delta_0_init: _delta_0_init,
+        g: _g,
+        Mm: _Mm,
+        Mn: _Mn,
+        Sm: _Sm,
+    }
+    with tf.Session() as sess:
+        _outs_unrolled, _outs_implicit = sess.run(outs, feed_dict)
+
+    for _y_unrolled, _y_implicit in zip(_outs_unrolled, _outs_implicit):
+        assert approx_equal(_y_implicit, _y_unrolled, 1e-6)
+    return None
+
+
+if __name__ == "__main__":
+    test_implicit_fixed_point()
+    test_rank1_spont_static_implicit_grad()
@@ -4,6 +4,10 @@ from dsn.util.tf_langevin import (
     langevin_dyn,
     bounded_langevin_dyn,
     bounded_langevin_dyn_np,
+    bounded_langevin_dyn_while,
+    active_set_langevin_np,
+    anderson_solve,
+    newton_solve,
 )
 from tf_util.stat_util import approx_equal
 
@@ -138,6 +142,175 @@ def test_bounded_langevin_dyn():
     assert(approx_equal(_x[:,1,-1], 0.0*np.ones((n,)), EPS))
     return None
 
+
+def test_bounded_langevin_dyn_while():
+    x0 = tf.placeholder(dtype=tf.float64, shape=(n, 3))
+    a = tf.placeholder(dtype=tf.float64, shape=(n,))
+
+    # per-sample contraction rate
+    def f(x):
+        f1 = a * x[:, 1] + 1.0
+        f2 = a * x[:, 0] - 2.0
+        f3 = 0.0 * x[:, 2] - 1.0
+        return tf.stack([f1, f2, f3], axis=1)
+
+    eps = 0.5
+    num_its = 500
+    tol = 1e-10
+    non_neg = [False, False, True]
+
+    _x0 = np.random.normal(0.0, 10.0, (n, 3))
+    _a = np.random.uniform(0.0, 0.8, (n,))
+    x_ss, its, xs = bounded_langevin_dyn_while(
+        f, x0, eps, num_its, non_neg, tol=tol, db=True, db_stride=10
+    )
+    x_ss_unrolled = bounded_langevin_dyn(f, x0, eps, num_its, non_neg)
+
+    with tf.Session() as sess:
+        _x_ss, _its, _xs, _x_ss_unrolled = sess.run(
+            [x_ss, its, xs, x_ss_unrolled], {x0: _x0, a: _a}
+        )
+
+    x_ss_true = np.stack(
+        [(1.0 - 2.0 * _a) / (1.0 - _a ** 2), (_a - 2.0) / (1.0 - _a ** 2), 0.0 * _a],
+        axis=1,
+    )
+    assert approx_equal(_x_ss, x_ss_true, 1e-8)
+    assert approx_equal(_x_ss, _x_ss_unrolled, 1e-8)
+
+    # slowly contracting samples need more iterations
+    assert np.all(_its < num_its)
+    assert np.mean(_its[_a > 0.5]) > np.mean(_its[_a < 0.3])
+
+    # strided history ends at the solution
+    assert _xs.shape[0] == n and _xs.shape[1] == 3
+    assert _xs.shape[2] == (np.max(_its) - 1) // 10 + 2
+    assert approx_equal(_xs[:, :, 0], _x0, EPS)
+    assert approx_equal(_xs[:, :, -1], _x_ss, EPS)
+    return None
+
+
+def test_anderson_newton_solve():
+    d = 3
+    x0 = tf.placeholder(dtype=tf.float64, shape=(n, d))
+    W = tf.placeholder(dtype=tf.float64, shape=(n, d, d))
+    b = tf.placeholder(dtype=tf.float64, shape=(n, d))
+
+    def f(x):
+        return tf.reduce_sum(W * tf.expand_dims(tf.tanh(x), 1), axis=2) + b
+
+    eps = 0.2
+    num_its = 2000
+    tol = 1e-12
+    non_neg = [False, False, True]
+
+    _x0 = np.random.normal(0.0, 5.0, (n, d))
+    # contractive, so the fixed point is unique
+    _W = np.random.uniform(-0.3, 0.3, (n, d, d))
+    _b = np.random.normal(0.0, 1.0, (n, d))
+    feed_dict = {x0: _x0, W: _W, b: _b}
+
+    x_while, its_while = bounded_langevin_dyn_while(f, x0, eps, num_its, non_neg, tol)
+    x_and, its_and = anderson_solve(f, x0, eps, num_its, non_neg, tol=tol)
+    x_and0, its_and0 = anderson_solve(f, x0, eps, num_its, non_neg, mem=0, tol=tol)
+    x_newt, its_newt, xs_newt = newton_solve(
+        f, x0, eps, num_its, non_neg, tol=tol, db=True, db_stride=1
+    )
+
+    with tf.Session() as sess:
+        _x_while, _its_while = sess.run([x_while, its_while], feed_dict)
+        _x_and, _its_and, _x_and0 = sess.run([x_and, its_and, x_and0], feed_dict)
+        _x_newt, _its_newt, _xs_newt = sess.run([x_newt, its_newt, xs_newt], feed_dict)
+
+    assert approx_equal(_x_and, _x_while, 1e-9)
+    assert approx_equal(_x_and0, _x_while, 1e-9)
+    assert approx_equal(_x_newt, _x_while, 1e-9)
+    assert np.all(_x_newt[:, 2] >= 0.0)
+    assert np.all(_its_and < num_its) and np.all(_its_newt < num_its)
+    assert np.mean(_its_and) < np.mean(_its_while)
+    assert np.mean(_its_newt) < np.mean(_its_and)
+
+    # newton steps onto the bound rather than approaching it
+    assert np.all(_x_newt[_x_while[:, 2] == 0.0, 2] == 0.0)
+
+    # quadratic convergence of newton (from far initializations it takes a
+    # few steps to get close)
+    residuals = np.max(np.abs(_xs_newt - np.expand_dims(_x_newt, 2)), axis=1)
+    r_k, r_k1 = residuals[:, :-1], residuals[:, 1:]
+    close = np.logical_and(r_k > 1e-6, r_k < 1e-2)
+    assert np.all(r_k1[close] <= 10.0 * np.square(r_k[close]))
+    assert np.max(residuals[:, min(6, residuals.shape[1] - 1)]) < 1e-10
+    return None
+
+
+def test_active_set_langevin_np():
+    _a = np.random.uniform(0.0, 0.8, (n,))
+    num_evals = []
+
+    def f_np(x, inds):
+        a = _a[inds]
+        num_evals.append(x.shape[0])
+        f1 = a * x[:, 1] + 1.0
+        f2 = a * x[:, 0] - 2.0
+        f3 = 0.0 * x[:, 2] - 1.0
+        return np.stack([f1, f2, f3], axis=1)
+
+    eps = 0.5
+    num_its = 500
+    tol = 1e-10
+    non_neg = [False, False, True]
+
+    _x0 = np.random.normal(0.0, 10.0, (n, 3))
+    x_ss, its, xs = active_set_langevin_np(
+        f_np, _x0, eps, num_its, non_neg, tol=tol, db=True, db_stride=10
+    )
+    active_evals = list(num_evals)
+    x_ss_all = bounded_langevin_dyn_np(
+        lambda x: f_np(x, slice(None)), _x0, eps, num_its, non_neg
+    )
+
+    x_ss_true = np.stack(
+        [(1.0 - 2.0 * _a) / (1.0 - _a ** 2), (_a - 2.0) / (1.0 - _a ** 2), 0.0 * _a],
+        axis=1,
+    )
+    assert approx_equal(x_ss, x_ss_true, 1e-8)
+    assert approx_equal(x_ss, x_ss_all, 1e-8)
+
+    # converged samples leave the active set
+    assert np.all(its < num_its)
+    assert len(active_evals) == np.max(its)
+    assert active_evals[-1] < n
+    assert sum(active_evals) == np.sum(its)
+    assert xs.shape == (n, 3, (np.max(its) - 1) // 10 + 2)
+    assert approx_equal(xs[:, :, 0], _x0, EPS)
+    assert approx_equal(xs[:, :, -1], x_ss, EPS)
+
+    # a diverging sample stays active and is not reported as converged
+    def f_nan(x, inds):
+        f_x = f_np(x, inds)
+        f_x[np.arange(n)[inds] == 0] = np.nan
+        return f_x
+
+    x_ss, its = active_set_langevin_np(f_nan, _x0, eps, num_its, non_neg, tol=tol)
+    assert np.all(np.isnan(x_ss[0]))
+    assert its[0] == num_its
+    assert approx_equal(x_ss[1:], x_ss_true[1:], 1e-8)
+    assert np.all(its[1:] < num_its)
+
+    # the arrays returned by f are not modified
+    const = np.tile(np.array([[1.0, -2.0, 0.5]]), [n, 1])
+
+    def f_const(x, inds):
+        return const[inds]
+
+    x_ss, its = active_set_langevin_np(f_const, _x0, eps, 2, non_neg)
+    assert np.all(const == np.array([[1.0, -2.0, 0.5]]))
+    return None
+
+
 if __name__ == "__main__":
     test_langevin_dyn()
     test_bounded_langevin_dyn()
+    test_bounded_langevin_dyn_while()
+    test_anderson_newton_solve()
+    test_active_set_langevin_np()
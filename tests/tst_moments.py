@@ -0,0 +1,73 @@
+import dsn.util.tf_integrals as tfi
+import dsn.util.np_integrals as npi
+import dsn.util.tf_moments as tfm
+import dsn.util.np_moments as npm
+import numpy as np
+import tensorflow as tf
+
+# Checks the fused moment kernels against the individual integrals.
+
+DTYPE = tf.float64
+EPS = 1e-12
+num_pts = 50
+
+single_moments = list(npm.SINGLE_INTEGRANDS.keys())
+nested_moments = list(npm.NESTED_INTEGRANDS.keys())
+
+mus = np.array([-10.0, -1.0, -1e-6, 0.0, 1e-6, 0.5, 3.0, 10.0])
+delta0s = np.array([0.0, 1e-6, 0.5, 1.0, 2.0, 5.0, 10.0, 50.0])
+deltainfs = np.array([0.0, 0.0, 0.25, 0.5, 1.0, 4.0, 2.0, 25.0])
+
+
+def test_np_moments():
+    moments = single_moments + nested_moments
+    values = npm.gaussian_moments(mus, delta0s, deltainfs, moments, num_pts)
+    for moment, value in zip(moments, values):
+        # np_integrals.PrimeSq does not expand dims and
+        # np_integrals.IntPrimePrime calls tf.expand_dims
+        if moment in ["PrimeSq", "IntPrimePrime"]:
+            continue
+        if moment in nested_moments:
+            y = getattr(npi, moment)(mus, delta0s, deltainfs, num_pts)
+        else:
+            y = getattr(npi, moment)(mus, delta0s, num_pts)
+        assert np.allclose(value, y, rtol=EPS, atol=EPS)
+
+    # order of requested moments
+    Phi, IntPhiPhi, Prime = npm.gaussian_moments(
+        mus, delta0s, deltainfs, ["Phi", "IntPhiPhi", "Prime"], num_pts
+    )
+    assert np.allclose(Phi, npi.Phi(mus, delta0s, num_pts))
+    assert np.allclose(IntPhiPhi, npi.IntPhiPhi(mus, delta0s, deltainfs, num_pts))
+    assert np.allclose(Prime, npi.Prime(mus, delta0s, num_pts))
+    return None
+
+
+def test_tf_moments():
+    tf.reset_default_graph()
+    mu = tf.placeholder(dtype=DTYPE, shape=(None,))
+    delta0 = tf.placeholder(dtype=DTYPE, shape=(None,))
+    deltainf = tf.placeholder(dtype=DTYPE, shape=(None,))
+    moments = single_moments + nested_moments
+    values = tfm.gaussian_moments(mu, delta0, deltainf, moments, num_pts)
+    ys = []
+    for moment in moments:
+        if moment in nested_moments:
+            ys.append(getattr(tfi, moment)(mu, delta0, deltainf, num_pts))
+        else:
+            ys.append(getattr(tfi, moment)(mu, delta0, num_pts))
+
+    feed_dict = {mu: mus, delta0: delta0s, deltainf: deltainfs}
+    with tf.Session() as sess:
+        _values, _ys = sess.run([values, ys], feed_dict)
+    for moment, value, y in zip(moments, _values, _ys):
+        assert np.allclose(value, y, rtol=EPS, atol=EPS)
+
+    # without nested moments deltainf is not needed
+    tfm.gaussian_moments(mu, delta0, None, ["Phi", "PrimSq"], num_pts)
+    return None
+
+
+if __name__ == "__main__":
+    test_np_moments()
+    test_tf_moments()
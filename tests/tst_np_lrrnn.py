@@ -0,0 +1,153 @@
+import numpy as np
+from dsn.util.np_lrrnn import (
+    sample_LRRNN,
+    sample_LRRNN_batch,
+    sim_RNN,
+    sim_RNN_batch,
+    MatrixFreeConnectivity,
+    rnn_accumulators,
+    measure_accumulated,
+    measure_vars,
+)
+
+EPS = 1e-10
+
+
+def approx_equal(a, b, eps):
+    return np.max(np.abs(a - b)) < eps
+
+
+def test_sim_RNN_batch():
+    np.random.seed(0)
+    B = 4
+    N = 200
+    T = 100
+    dt = 0.1
+    tau = 1.0
+    params = {
+        "nettype": "rank1_input",
+        "g": np.random.uniform(0.5, 2.0, (B,)),
+        "Mm": np.random.uniform(-2.0, 2.0, (B,)),
+        "Mn": np.random.uniform(-2.0, 2.0, (B,)),
+        "MI": np.random.uniform(-1.0, 1.0, (B,)),
+        "Sm": np.random.uniform(0.5, 1.0, (B,)),
+        "Sn": np.random.uniform(0.5, 1.0, (B,)),
+        "SmI": np.random.uniform(0.0, 0.5, (B,)),
+        "SnI": np.random.uniform(0.0, 0.5, (B,)),
+        "Sperp": np.random.uniform(0.0, 1.0, (B,)),
+    }
+    net = sample_LRRNN_batch(N, params)
+    x0 = np.random.normal(0.0, 1.0, (B, N))
+    x, xs = sim_RNN_batch(
+        x0,
+        net["g"],
+        net["xi"],
+        net["m"],
+        net["n"],
+        net["I"],
+        dt,
+        tau,
+        T,
+        record_stride=10,
+    )
+    assert xs.shape == (B, N, T // 10 + 1)
+    for b in range(B):
+        W = net["g"][b] * net["xi"][b] + np.dot(net["m"][b], net["n"][b].T) / N
+        x_b = sim_RNN(x0[b], W, net["I"][b], dt, tau, T)
+        assert np.max(np.abs(x[b] - x_b[:, -1])) < EPS
+        assert np.max(np.abs(xs[b] - x_b[:, ::10])) < EPS
+
+    # single precision
+    net32 = sample_LRRNN_batch(N, params, dtype=np.float32)
+    assert net32["xi"].dtype == np.float32
+    x32 = sim_RNN_batch(
+        x0.astype(np.float32),
+        net["g"],
+        net["xi"],
+        net["m"],
+        net["n"],
+        net["I"],
+        dt,
+        tau,
+        T,
+    )
+    assert x32.dtype == np.float32
+    assert np.max(np.abs(x32 - x)) < 1e-3
+    return None
+
+
+def test_matrix_free_connectivity():
+    np.random.seed(0)
+    N = 600
+    params = {"nettype": "rank1_spont", "g": 1.5, "Mm": 1.0, "Mn": 2.0}
+    params.update({"Sm": 0.5, "Sn": 1.0})
+    net = sample_LRRNN(N, params, matrix_free=True, seed=7)
+    W = net["W"]
+    assert "xi" not in net
+    W_dense = W.dense()
+    assert W_dense.shape == (N, N)
+    # regenerated blocks are identical, and xi has the right scale
+    assert np.all(W.xi_block(1) == W.xi_block(1))
+    assert np.all(W_dense == W.dense())
+    xi = (W_dense - np.dot(net["m"], net["n"].T) / N) / params["g"]
+    assert np.abs(np.std(xi) * np.sqrt(N) - 1.0) < 0.01
+    W2 = MatrixFreeConnectivity(N, params["g"], net["m"], net["n"], seed=8)
+    assert not np.all(W2.xi_block(0) == W.xi_block(0))
+
+    r = np.random.normal(0.0, 1.0, (N, 3))
+    assert np.max(np.abs(W.matvec(r) - np.dot(W_dense, r))) < EPS
+
+    x0 = np.random.normal(0.0, 1.0, (N,))
+    T = 50
+    x = sim_RNN(x0, W, 0.0, 0.1, 1.0, T)
+    x_dense = sim_RNN(x0, W_dense, 0.0, 0.1, 1.0, T)
+    assert np.max(np.abs(x - x_dense)) < EPS
+    return None
+
+
+def test_rnn_accumulators():
+    np.random.seed(0)
+    B = 3
+    N = 300
+    T = 200
+    t_start = 50
+    params = {"nettype": "rank1_spont", "g": np.array([0.5, 1.5, 3.0])}
+    params.update({"Mm": 1.0, "Mn": 2.0, "Sm": 0.5, "Sn": 1.0})
+    net = sample_LRRNN_batch(N, params)
+    x0 = np.random.normal(0.0, 1.0, (B, N))
+    args = [net["g"], net["xi"], net["m"], net["n"], net["I"], 0.1, 1.0, T]
+
+    _, xs = sim_RNN_batch(x0, *args, record_stride=1)
+    accs = rnn_accumulators()
+    x = sim_RNN_batch(x0, *args, accumulators=accs, t_start=t_start)
+    assert approx_equal(x, xs[:, :, -1], EPS)
+    assert accs["x"].count == T + 1 - t_start
+
+    kappa, delta_inf, delta_T = measure_accumulated(accs, net["n"])
+    assert kappa.shape == (B, 1)
+    for b in range(B):
+        xs_b = xs[b, :, t_start:]
+        assert approx_equal(accs["x"].mean[b], np.mean(xs_b, axis=1), EPS)
+        assert approx_equal(accs["x"].var[b], np.var(xs_b, axis=1), EPS)
+        phi_b = np.mean(np.tanh(xs_b), axis=1)
+        assert approx_equal(kappa[b], np.dot(phi_b, net["n"][b]) / N, EPS)
+        delta_inf_b, delta_T_b = measure_vars(xs[b], t_start)
+        assert approx_equal(delta_inf[b], delta_inf_b, EPS)
+        assert approx_equal(delta_T[b], delta_T_b, EPS)
+
+    # single network
+    W = net["g"][1] * net["xi"][1] + np.dot(net["m"][1], net["n"][1].T) / N
+    accs = rnn_accumulators()
+    x = sim_RNN(x0[1], W, 0.0, 0.1, 1.0, T, accumulators=accs, t_start=t_start)
+    assert x.shape == (N,)
+    kappa_1, delta_inf_1, delta_T_1 = measure_accumulated(accs, net["n"][1])
+    assert approx_equal(kappa_1, kappa[1], EPS)
+    assert approx_equal(delta_inf_1, delta_inf[1], EPS)
+    assert approx_equal(delta_T_1, delta_T[1], EPS)
+    return None
+
+
+if __name__ == "__main__":
+    test_sim_RNN_batch()
+    test_matrix_free_connectivity()
+    test_rnn_accumulators()
@@ -0,0 +1,134 @@
+import tensorflow as tf
+import numpy as np
+from dsn.util.systems import LowRankRNN
+from dsn.util.dsn_util import get_system_from_template
+from dsn.util.tf_DMFT_solvers import rank1_spont_chaotic_solve
+from dsn.util.tf_graph_util import initialize_graph_arrays
+from dsn.util.tf_precision import set_sim_dtype, sim_suff_stats, REDUCE_DTYPE
+
+DTYPE = tf.float64
+EPS = 1e-16
+
+
+def sample_Z(system, M):
+    if system.density_network_bounds is None:
+        return np.random.normal(0.0, 1.0, (1, M, system.D))
+    a, b = system.density_network_bounds
+    a = np.maximum(a, -10.0)
+    b = np.minimum(b, 10.0)
+    return np.random.uniform(a, b, (1, M, system.D))
+
+
+def T_x_by_precision(sysname, param_dict, M=50, make_system=None):
+    if make_system is None:
+        make_system = lambda: get_system_from_template(sysname, param_dict)
+    T_xs = []
+    for dtype in [tf.float64, tf.float32]:
+        set_sim_dtype(dtype)
+        np.random.seed(0)
+        system = make_system()
+        assert system.dtype == dtype
+        _Z = sample_Z(system, M)
+
+        tf.reset_default_graph()
+        Z = tf.placeholder(DTYPE, (1, None, system.D))
+        T_x = sim_suff_stats(system, Z)
+        assert T_x.dtype == REDUCE_DTYPE
+        with tf.Session() as sess:
+            initialize_graph_arrays(sess)
+            T_xs.append(sess.run(T_x, {Z: _Z}))
+    set_sim_dtype(tf.float64)
+    return T_xs[0], T_xs[1]
+
+
+def check_close(T_x_64, T_x_32, rtol, atol):
+    finite = np.logical_and(np.isfinite(T_x_64), np.isfinite(T_x_32))
+    assert np.all(np.isfinite(T_x_64) == np.isfinite(T_x_32))
+    assert np.allclose(T_x_32[finite], T_x_64[finite], rtol=rtol, atol=atol)
+    return None
+
+
+def test_Linear2D_precision():
+    param_dict = {"omega": 1.0, "d_std": 1.0, "omega_std": 1.0}
+    T_x_64, T_x_32 = T_x_by_precision("Linear2D", param_dict)
+    check_close(T_x_64, T_x_32, 1e-4, 1e-4)
+    return None
+
+
+def test_STGCircuit_precision():
+    param_dict = {"freq": "med"}
+    T_x_64, T_x_32 = T_x_by_precision("STGCircuit", param_dict)
+    # the frequency readout is a soft argmax over 0.01 Hz bins
+    check_close(T_x_64, T_x_32, 0.0, 1e-2)
+    return None
+
+
+def test_V1Circuit_precision():
+    param_dict = {"behavior_type": "ISN_coeff"}
+    T_x_64, T_x_32 = T_x_by_precision("V1Circuit", param_dict)
+    check_close(T_x_64, T_x_32, 1e-3, 1e-4)
+    return None
+
+
+def test_SCCircuit_precision():
+    param_dict = {
+        "behavior_type": "WTA",
+        "p": 0.7,
+        "var": 0.05 ** 2,
+        "inact_str": "NI",
+        "N": 50,
+    }
+    T_x_64, T_x_32 = T_x_by_precision("SCCircuit", param_dict)
+    check_close(T_x_64, T_x_32, 1e-3, 1e-4)
+    return None
+
+
+def test_LowRankRNN_precision():
+    fixed_params = {"betam": 0.6, "betan": 1.0}
+    behavior = {
+        "type": "CDD",
+        "means": np.array([0.3]),
+        "variances": np.array([0.001]),
+    }
+    model_opts = {"rank": 2, "input_type": "input"}
+    make_system = lambda: LowRankRNN(
+        fixed_params, behavior, model_opts=model_opts, solve_its=100, solve_eps=0.2
+    )
+    T_x_64, T_x_32 = T_x_by_precision("LowRankRNN", None, make_system=make_system)
+    check_close(T_x_64, T_x_32, 1e-3, 1e-3)
+    return None
+
+
+def test_DMFT_solver_precision():
+    np.random.seed(0)
+    M = 50
+    g = np.random.uniform(0.5, 3.0, (M,))
+    Mm = np.random.uniform(-3.0, 3.0, (M,))
+    Mn = np.random.uniform(-3.0, 3.0, (M,))
+    Sm = np.random.uniform(0.0, 3.0, (M,))
+
+    xs = []
+    for dtype in [tf.float64, tf.float32]:
+        tf.reset_default_graph()
+        args = [tf.constant(x, dtype=dtype) for x in [g, Mm, Mn, Sm]]
+        mu_init = 5.0 * tf.ones((M,), dtype=dtype)
+        delta_0_init = 5.0 * tf.ones((M,), dtype=dtype)
+        delta_inf_init = 4.0 * tf.ones((M,), dtype=dtype)
+        x = rank1_spont_chaotic_solve(
+            mu_init, delta_0_init, delta_inf_init, *args, 200, 0.2
+        )
+        for x_i in x:
+            assert x_i.dtype == dtype
+        with tf.Session() as sess:
+            xs.append(np.stack(sess.run(x), axis=1))
+    check_close(xs[0], xs[1], 1e-3, 1e-3)
+    return None
+
+
+if __name__ == "__main__":
+    test_Linear2D_precision()
+    test_STGCircuit_precision()
+    test_V1Circuit_precision()
+    test_SCCircuit_precision()
+    test_LowRankRNN_precision()
+    test_DMFT_solver_precision()
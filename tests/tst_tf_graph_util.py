@@ -0,0 +1,119 @@
+import tensorflow as tf
+import numpy as np
+import tempfile
+import os
+from tf_util.stat_util import approx_equal
+from dsn.util.dsn_util import get_system_from_template
+from dsn.util.tf_graph_util import (
+    graph_array,
+    initialize_graph_arrays,
+    cached_suff_stats,
+    system_graph_key,
+    save_graph_arrays,
+    restore_graph_arrays,
+    GRAPH_ARRAYS_FILE,
+    GRAPH_ARRAY_MIN_SIZE,
+)
+
+DTYPE = tf.float64
+EPS = 1e-16
+
+
+def test_graph_array():
+    tf.reset_default_graph()
+    np.random.seed(0)
+    _A = np.random.normal(0.0, 1.0, (200, 300))
+    A = graph_array(_A, "A")
+    x = tf.placeholder(DTYPE, (300, 1))
+    y = tf.matmul(A, x)
+
+    # arrays are not baked into the graph def
+    assert tf.get_default_graph().as_graph_def().ByteSize() < _A.nbytes
+    assert A not in tf.global_variables()
+
+    _x = np.random.normal(0.0, 1.0, (300, 1))
+    with tf.Session() as sess:
+        initialize_graph_arrays(sess)
+        _y = sess.run(y, {x: _x})
+    assert approx_equal(_y, np.dot(_A, _x), 1e-10)
+    return None
+
+
+def test_restore_graph_arrays():
+    tf.reset_default_graph()
+    np.random.seed(0)
+    savedir = tempfile.mkdtemp() + "/"
+    _A = np.random.normal(0.0, 1.0, (200, 300))
+    _b = np.random.normal(0.0, 1.0, (200, 1))
+    A = graph_array(_A, "A")
+    # small arrays are embedded
+    b = graph_array(_b, "b")
+    assert _b.size < GRAPH_ARRAY_MIN_SIZE
+    assert b.op.type == "Const"
+    theta = tf.get_variable("theta", (300, 1), DTYPE)
+    y = tf.identity(tf.matmul(A, theta) + b, name="y")
+
+    saver = tf.train.Saver()
+    save_graph_arrays(savedir + GRAPH_ARRAYS_FILE)
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer())
+        initialize_graph_arrays(sess)
+        _y, _theta = sess.run([y, theta])
+        saver.save(sess, savedir + "model", global_step=0)
+    assert approx_equal(_y, np.dot(_A, _theta) + _b, 1e-12)
+
+    tf.reset_default_graph()
+    with tf.Session() as sess:
+        new_saver = tf.train.import_meta_graph(savedir + "model-0.meta")
+        new_saver.restore(sess, savedir + "model-0")
+        restore_graph_arrays(sess, savedir + GRAPH_ARRAYS_FILE)
+        _y_restored = sess.run("y:0")
+    assert approx_equal(_y_restored, _y, EPS)
+    return None
+
+
+def test_cached_suff_stats():
+    M = 20
+    cache_dir = tempfile.mkdtemp()
+    param_dict = {"freq": "med"}
+    np.random.seed(0)
+    system = get_system_from_template("STGCircuit", param_dict)
+
+    np.random.seed(1)
+    _Z = np.zeros((1, M, system.D))
+    _Z[0, :, 0] = np.random.uniform(4.0, 8.0, (M,))
+    _Z[0, :, 1] = np.random.uniform(0.01, 4.0, (M,))
+
+    tf.reset_default_graph()
+    Z = tf.placeholder(DTYPE, (1, None, system.D))
+    T_x = system.compute_suff_stats(Z)
+    with tf.Session() as sess:
+        initialize_graph_arrays(sess)
+        _T_x = sess.run(T_x, {Z: _Z})
+
+    # miss then hit
+    for i in range(2):
+        tf.reset_default_graph()
+        Z = tf.placeholder(DTYPE, (1, None, system.D))
+        T_x_cached = cached_suff_stats(system, Z, cache_dir=cache_dir)
+        with tf.Session() as sess:
+            initialize_graph_arrays(sess)
+            _T_x_cached = sess.run(T_x_cached, {Z: _Z})
+        assert approx_equal(_T_x_cached, _T_x, EPS, allow_special=True)
+        # the meta graph and its arrays, without temporary files
+        cache_files = os.listdir(cache_dir)
+        assert len(cache_files) == 2
+        assert not any(["_tmp" in fname for fname in cache_files])
+
+    # the key changes with the configuration
+    key = system_graph_key(system)
+    system_high = get_system_from_template("STGCircuit", {"freq": "high"})
+    assert system_graph_key(system_high) != key
+    assert system_graph_key(system) == key
+    return None
+
+
+if __name__ == "__main__":
+    test_graph_array()
+    test_restore_graph_arrays()
+    test_cached_suff_stats()
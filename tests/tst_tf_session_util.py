@@ -0,0 +1,130 @@
+import tensorflow as tf
+import numpy as np
+import os
+from dsn.util import tf_session_util
+from dsn.util.tf_session_util import (
+    session_config,
+    autotune_candidates,
+    autotune_exec_profile,
+    get_exec_profile,
+    set_exec_profile,
+    exec_profile_scope,
+    available_cpus,
+)
+
+DTYPE = tf.float64
+
+
+def test_autotune_candidates():
+    assert autotune_candidates(8) == [(8, 1), (8, 2), (4, 2), (2, 4)]
+    assert autotune_candidates(4) == [(4, 1), (4, 2), (2, 2), (1, 4)]
+    # duplicates are dropped and every pool has at least one thread
+    assert autotune_candidates(1) == [(1, 1), (1, 2), (1, 4)]
+    assert autotune_candidates(2) == [(2, 1), (2, 2), (1, 2), (1, 4)]
+    for intra_op, inter_op in autotune_candidates():
+        assert intra_op >= 1 and inter_op >= 1
+    return None
+
+
+def test_session_config():
+    # tensorflow decides and shares its global pools
+    config = session_config(exec_profile={"intra_op": 0, "inter_op": 0})
+    assert config.intra_op_parallelism_threads == 0
+    assert config.inter_op_parallelism_threads == 0
+    assert not config.use_per_session_threads
+
+    # explicit thread counts get pools of their own
+    config = session_config(exec_profile={"intra_op": 3, "inter_op": 2})
+    assert config.intra_op_parallelism_threads == 3
+    assert config.inter_op_parallelism_threads == 2
+    assert config.use_per_session_threads
+
+    # xla='auto' cannot enable CPU auto-clustering after the first session
+    xla_flags = os.environ.pop("TF_XLA_FLAGS", None)
+    try:
+        session_config(xla="auto")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    os.environ["TF_XLA_FLAGS"] = "--tf_xla_cpu_global_jit"
+    config = session_config(xla="auto")
+    assert (
+        config.graph_options.optimizer_options.global_jit_level
+        == tf.OptimizerOptions.ON_1
+    )
+    if xla_flags is None:
+        os.environ.pop("TF_XLA_FLAGS")
+    else:
+        os.environ["TF_XLA_FLAGS"] = xla_flags
+    return None
+
+
+def test_autotune_exec_profile():
+    profile = get_exec_profile()
+    tf.reset_default_graph()
+    np.random.seed(0)
+    x = tf.placeholder(DTYPE, (50, 50))
+    y = tf.reduce_sum(tf.matmul(x, x))
+    feed_dict = {x: np.random.normal(0.0, 1.0, (50, 50))}
+
+    # every candidate is timed in a session with its own pools
+    configs = []
+    session = tf.Session
+
+    def config_session(config=None):
+        configs.append(config)
+        return session(config=config)
+
+    tf_session_util.tf.Session = config_session
+    try:
+        candidates = [(1, 1), (2, 1), (1, 2)]
+        best_profile = autotune_exec_profile(
+            [y], feed_dict, candidates=candidates, num_steps=2
+        )
+    finally:
+        tf_session_util.tf.Session = session
+
+    assert len(configs) == len(candidates)
+    for config, (intra_op, inter_op) in zip(configs, candidates):
+        assert config.use_per_session_threads
+        assert config.intra_op_parallelism_threads == intra_op
+        assert config.inter_op_parallelism_threads == inter_op
+
+    # the fastest profile becomes the current one, other settings are kept
+    best = (best_profile["intra_op"], best_profile["inter_op"])
+    assert best in candidates
+    assert best_profile["cpus"] == profile["cpus"]
+    assert get_exec_profile() == best_profile
+    assert session_config().use_per_session_threads
+
+    set_exec_profile(**profile)
+    return None
+
+
+def test_exec_profile_scope():
+    profile = get_exec_profile()
+    cpus = available_cpus()
+    exec_profile = {"intra_op": 2, "inter_op": 1, "cpus": cpus[:1]}
+    with exec_profile_scope(exec_profile):
+        assert get_exec_profile()["intra_op"] == 2
+        assert available_cpus() == cpus[:1]
+        set_exec_profile(intra_op=3)  # e.g. autotuning
+    assert get_exec_profile() == profile
+    assert available_cpus() == cpus
+
+    # also restored when the block raises
+    try:
+        with exec_profile_scope(exec_profile):
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+    assert get_exec_profile() == profile
+    assert available_cpus() == cpus
+    return None
+
+
+if __name__ == "__main__":
+    test_autotune_candidates()
+    test_session_config()
+    test_autotune_exec_profile()
+    test_exec_profile_scope()
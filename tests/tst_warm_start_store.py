@@ -0,0 +1,125 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import dsn.util.warm_start_store as wss
+from dsn.util.warm_start_store import (
+    open_store,
+    lattice_range,
+    overlapping_blocks,
+    missing_blocks,
+    block_lattice,
+    save_block,
+    add_block,
+    assemble_box,
+)
+from dsn.util.tf_DMFT_solvers import get_warm_start_key, get_warm_start_dir
+
+
+def fake_solutions(lattice, step):
+    x = step * lattice
+    return np.stack([x[0] + 10.0 * x[1], x[0] * x[1]], axis=1)
+
+
+def test_warm_start_store():
+    store_root = tempfile.mkdtemp()
+    wss.WS_STORE_DIR = os.path.join(store_root, "")
+    step = 0.5
+    block_size = 3
+    key = {"rank": 1, "behavior_type": "BI", "eps": 0.2}
+    store_dir, manifest = open_store(key, step, block_size)
+    assert manifest["blocks"] == {}
+
+    # the second box overlaps the first
+    boxes = [([-1.2, 0.0], [1.0, 2.0]), ([-0.5, 0.4], [2.6, 1.1])]
+    num_solved = []
+    for a, b in boxes:
+        k_lo, k_hi = lattice_range(a, b, step)
+        assert np.all(step * k_lo <= np.array(a))
+        assert np.all(step * k_hi >= np.array(b))
+        blocks = overlapping_blocks(k_lo, k_hi, block_size)
+        todo = missing_blocks(store_dir, blocks)
+        num_solved.append(len(todo))
+        for block in todo:
+            lattice = block_lattice(block, block_size)
+            save_block(store_dir, block, fake_solutions(lattice, step))
+            add_block(store_dir, block, block_size, step, False)
+
+        solutions = assemble_box(store_dir, k_lo, k_hi, block_size)
+        axes = [step * np.arange(lo, hi + 1) for lo, hi in zip(k_lo, k_hi)]
+        grid = np.meshgrid(*axes, indexing="ij")
+        grid = np.stack([vals.flatten() for vals in grid], axis=0)
+        assert np.allclose(solutions, fake_solutions(grid / step, step))
+        assert missing_blocks(store_dir, blocks) == []
+
+    assert num_solved == [4, 4]
+
+    # same key, same store
+    store_dir2, manifest = open_store(key, step, 5)
+    assert store_dir2 == store_dir
+    assert manifest["block_size"] == block_size
+    assert len(manifest["blocks"]) == 8
+    # different key, new store
+    key["eps"] = 0.1
+    store_dir3, manifest = open_store(key, step, block_size)
+    assert store_dir3 != store_dir
+    assert manifest["blocks"] == {}
+    # a store is only valid for the step it was solved on
+    try:
+        open_store(key, 2.0 * step, block_size)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+    shutil.rmtree(store_root)
+    return None
+
+
+class fake_system:
+    def __init__(self, step):
+        self.model_opts = {"rank": 1}
+        self.behavior = {"type": "BI"}
+        self.all_params = ["g", "Mm", "Mn", "MI"]
+        self.free_params = ["g", "Mm", "Mn"]
+        self.fixed_params = {"MI": 2.0}
+        self.solve_eps = 0.2
+        self.warm_start_grid_step = step
+        self.a = np.array([0.0, -1.0, -1.0])
+        self.b = np.array([1.0, 1.0, 1.0])
+
+
+def test_warm_start_step():
+    store_root = tempfile.mkdtemp()
+    wss.WS_STORE_DIR = os.path.join(store_root, "")
+    block_size = 3
+    system1, system2 = fake_system(0.5), fake_system(0.25)
+
+    # systems differing only in the lattice step get separate stores
+    key1, key2 = get_warm_start_key(system1), get_warm_start_key(system2)
+    assert key1 != key2
+    store_dir1, manifest1 = open_store(key1, 0.5, block_size)
+    store_dir2, manifest2 = open_store(key2, 0.25, block_size)
+    assert store_dir1 != store_dir2
+    assert manifest1["step"] == 0.5
+    assert manifest2["step"] == 0.25
+    assert get_warm_start_dir(system1) != get_warm_start_dir(system2)
+
+    # and the blocks of one step are never read on the other lattice
+    block = (0, 0, 0)
+    for store_dir, step in [(store_dir1, 0.5), (store_dir2, 0.25)]:
+        lattice = block_lattice(block, block_size)
+        save_block(store_dir, block, fake_solutions(lattice, step))
+        add_block(store_dir, block, block_size, step, False)
+    for store_dir, step in [(store_dir1, 0.5), (store_dir2, 0.25)]:
+        k_lo, k_hi = np.zeros((3,), np.int64), 2 * np.ones((3,), np.int64)
+        solutions = assemble_box(store_dir, k_lo, k_hi, block_size)
+        lattice = block_lattice(block, block_size)
+        assert np.allclose(solutions, fake_solutions(lattice, step))
+
+    shutil.rmtree(store_root)
+    return None
+
+
+if __name__ == "__main__":
+    test_warm_start_store()
+    test_warm_start_step()